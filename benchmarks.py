@@ -0,0 +1,300 @@
+'''
+Benchmarks for the loaders, plots and preprocessing stages on synthetic data.
+
+Run with, for example:
+
+    python benchmarks.py --cases 5 20 --samples 3000 --coils 8 --json bench.json
+
+The preprocessing stages follow pre_processing.process_sensor_file on a synthetic sensor csv: csv parsing,
+relative time, the coordinate transform, shaping the rows into a CoilArray (what data_to_shape does),
+smoothing every coil (what averager_coils does) and rasterizing the animation frames.
+
+Every benchmark is timed on a freshly written synthetic dataset of each size. Wall time is the best
+of --repeat runs and peak memory is the tracemalloc peak of one run (NumPy buffers included).
+
+Worker startup is measured separately: a fresh Python process imports a module set, as a batch worker
+does, and reports its import time and peak resident memory (RSS).
+'''
+
+import os
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+
+import plot_scripts as ps
+import sensor_io
+import coil_render
+import density
+import filters
+import synthetic_data
+from coil_array import CoilArray
+
+
+# Render every RENDER_STEP-th frame in the animation benchmark
+RENDER_STEP = 10
+
+# The moving average window of the smoothing benchmark, in samples
+SMOOTH_WINDOW = 20
+
+
+def measure(function, repeat=3):
+    """
+    Time a function and record its peak memory.
+
+    Parameters:
+    function (callable): The function to run, without arguments.
+    repeat (int): The number of timed runs.
+
+    Returns:
+    tuple: The best wall time in seconds and the peak traced memory in bytes.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def get_benchmarks(source_path, case_ids, cache_dir, sensor_path, work_dir):
+    """
+    Build the benchmark functions for one synthetic dataset.
+
+    Returns:
+    list: (name, unit, items, function) tuples. Throughput is reported as items per second.
+    """
+    paths = [os.path.join(source_path, case_id) for case_id in case_ids]
+    T_lists = [ps.get_all_lists_from_path(path)[3] for path in paths]
+    samples = sum(len(T_list) for T_list in T_lists)
+
+    def load_text():
+        for path in paths:
+            ps.get_all_lists_from_path(path)
+
+    def load_cached():
+        for path in paths:
+            X, Y, Z, T = ps.get_all_lists_from_path(path, cache_dir)
+            X[:, 0].sum()
+
+    def landmarks_cold():
+        ps.clear_timeline_cache()
+        for path, T_list in zip(paths, T_lists):
+            ps.get_landmark_indexes(path, T_list)
+
+    def events_cold():
+        ps.clear_timeline_cache()
+        for path, T_list in zip(paths, T_lists):
+            ps.get_event_indexes(path, T_list)
+
+    pooled = []
+    for path in paths:
+        X, Y, Z, T = ps.get_all_lists_from_path(path, cache_dir)
+        pooled.append(np.column_stack([-np.asarray(Z[:, 0]), -np.asarray(Y[:, 0])]))
+    pooled = np.concatenate(pooled)
+
+    def kde_heatmap():
+        density.kde_grid(pooled[:, 0], pooled[:, 1], gridsize=400)
+
+    def tip_path_plot():
+        import usage_examples
+        current_dir = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            usage_examples.plot_multiple_case_tip_paths(source_path, os.path.join(work_dir, 'plots'), cache_dir)
+        finally:
+            os.chdir(current_dir)
+
+    sensor_data = sensor_io.load_sensor_csv(sensor_path)
+    sensor_samples = len(sensor_data)
+
+    def read_csv():
+        sensor_io.load_sensor_csv(sensor_path)
+
+    def relative_time():
+        sensor_io.relative_time_ms(sensor_data[:, 0].astype(np.int64))
+
+    def transform():
+        sensor_io.transform_coordinates(sensor_data[:, 1:], 1.05, 12.5)
+
+    coord_columns = list(range(1, sensor_data.shape[1]))
+    sensor_coils = CoilArray.from_rows(sensor_data, coord_columns, time_column=0)
+    render_frames = len(range(0, sensor_samples, RENDER_STEP))
+
+    def render():
+        for _ in coil_render.rasterize_frames(sensor_coils, step=RENDER_STEP):
+            pass
+
+    def from_rows():
+        CoilArray.from_rows(sensor_data, coord_columns, time_column=0)
+
+    def smooth():
+        filters.smooth_coil_array(sensor_coils, 'moving_average', window_size=SMOOTH_WINDOW, edge='zeros')
+
+    return [
+        ('get_all_lists_from_path (text)', 'samples', samples, load_text),
+        ('get_all_lists_from_path (cache)', 'samples', samples, load_cached),
+        ('get_landmark_indexes', 'cases', len(paths), landmarks_cold),
+        ('get_event_indexes', 'cases', len(paths), events_cold),
+        ('kde heatmap 400x400', 'points', len(pooled), kde_heatmap),
+        ('tip path plot', 'samples', samples, tip_path_plot),
+        ('preprocessing: read csv', 'rows', sensor_samples, read_csv),
+        ('preprocessing: relative time', 'rows', sensor_samples, relative_time),
+        ('preprocessing: transform', 'rows', sensor_samples, transform),
+        ('preprocessing: CoilArray.from_rows', 'rows', sensor_samples, from_rows),
+        ('preprocessing: smooth_coil_array', 'rows', sensor_samples, smooth),
+        ('preprocessing: render frames', 'frames', render_frames, render),
+    ]
+
+
+# What a worker imports: the headless core, the plotting layer, and the libraries plot_scripts used to import eagerly
+STARTUP_IMPORTS = [
+    ('python only', 'pass'),
+    ('core', 'import core'),
+    ('plot_scripts', 'import plot_scripts'),
+    ('cv2, PIL, matplotlib, scipy', 'import cv2, PIL, matplotlib.pyplot, scipy.signal, scipy.stats'),
+]
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+import json, instrumentation
+max_rss = instrumentation.get_max_rss()
+try:
+    # On Linux ru_maxrss starts from the RSS of the parent at fork, VmHWM is the peak of this process only
+    with open('/proc/self/status') as status:
+        max_rss = next(int(line.split()[1]) * 1024 for line in status if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    pass
+print(json.dumps({{'import_seconds': seconds, 'max_rss_bytes': max_rss}}))
+"""
+
+
+def measure_worker_startup(statement, repeat=3):
+    """
+    Start a fresh Python process that runs an import statement, and measure it.
+
+    Parameters:
+    statement (str): The import statement, such as 'import core'.
+    repeat (int): The number of processes started.
+
+    Returns:
+    dict: The best 'seconds' (process start to exit), the best 'import_seconds' and the largest 'max_rss_bytes'.
+    """
+    script = STARTUP_SCRIPT.format(statement=statement)
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = {'seconds': float('inf'), 'import_seconds': float('inf'), 'max_rss_bytes': 0}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', script], cwd=here, capture_output=True, text=True, check=True).stdout
+        seconds = time.perf_counter() - start
+        measured = json.loads(output.strip().splitlines()[-1])
+        best['seconds'] = min(best['seconds'], seconds)
+        best['import_seconds'] = min(best['import_seconds'], measured['import_seconds'])
+        best['max_rss_bytes'] = max(best['max_rss_bytes'], measured['max_rss_bytes'] or 0)
+    return best
+
+
+def run_startup_benchmarks(repeat=3):
+    """
+    Measure worker startup for every entry of STARTUP_IMPORTS. Entries whose libraries are not installed are skipped.
+
+    Returns:
+    list: One result dictionary per import set.
+    """
+    results = []
+    for name, statement in STARTUP_IMPORTS:
+        try:
+            measured = measure_worker_startup(statement, repeat)
+        except subprocess.CalledProcessError:
+            continue
+        results.append({'benchmark': f'worker startup: {name}', **measured})
+    return results
+
+
+def run_benchmarks(case_counts=(5, 20), n_samples=3000, n_coils=8, repeat=3, seed=0):
+    """
+    Write synthetic datasets of several sizes and run every benchmark on each.
+
+    Parameters:
+    case_counts (list): The dataset sizes, in cases.
+    n_samples (int): The number of samples per case (and rows per sensor csv).
+    n_coils (int): The number of coils per case.
+    repeat (int): The number of timed runs per benchmark.
+    seed (int): The random seed of the synthetic data.
+
+    Returns:
+    list: One result dictionary per benchmark and dataset size.
+    """
+    results = []
+    for n_cases in case_counts:
+        work_dir = tempfile.mkdtemp(prefix='colon_bench_')
+        try:
+            source_path, meta_path = synthetic_data.write_dataset(work_dir, n_cases, n_samples, n_coils, seed=seed)
+            sensor_path = os.path.join(work_dir, 'sensor.csv')
+            synthetic_data.write_sensor_csv(sensor_path, n_samples * n_cases, 3 * n_coils, np.random.default_rng(seed))
+            case_ids = [case_id for ids in ps.read_simmeta(meta_path).values() for case_id in ids]
+
+            for name, unit, items, function in get_benchmarks(source_path, case_ids, os.path.join(work_dir, 'cache'), sensor_path, work_dir):
+                seconds, peak = measure(function, repeat)
+                results.append({
+                    'benchmark': name,
+                    'cases': n_cases,
+                    'seconds': seconds,
+                    'throughput': items / seconds if seconds > 0 else float('inf'),
+                    'unit': unit,
+                    'peak_bytes': peak
+                })
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def print_results(results):
+    """
+    Print benchmark results as a table, with worker startup results in a second table.
+    """
+    startup = [result for result in results if 'max_rss_bytes' in result]
+    print(f"{'benchmark':<34} {'cases':>6} {'seconds':>10} {'throughput':>22} {'peak MB':>9}")
+    for result in results:
+        if 'max_rss_bytes' in result:
+            continue
+        throughput = f"{result['throughput']:,.0f} {result['unit']}/s"
+        print(f"{result['benchmark']:<34} {result['cases']:>6} {result['seconds']:>10.4f} {throughput:>22} {result['peak_bytes'] / 1e6:>9.1f}")
+    if startup:
+        print()
+        print(f"{'benchmark':<48} {'process s':>10} {'import s':>10} {'max RSS MB':>11}")
+        for result in startup:
+            print(f"{result['benchmark']:<48} {result['seconds']:>10.3f} {result['import_seconds']:>10.3f} {result['max_rss_bytes'] / 1e6:>11.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the loaders, plots and preprocessing on synthetic data.')
+    parser.add_argument('--cases', type=int, nargs='+', default=[5, 20], help='dataset sizes, in cases')
+    parser.add_argument('--samples', type=int, default=3000, help='samples per case')
+    parser.add_argument('--coils', type=int, default=8, help='coils per case')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the synthetic data')
+    parser.add_argument('--json', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.cases, args.samples, args.coils, args.repeat, args.seed)
+    results += run_startup_benchmarks(args.repeat)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
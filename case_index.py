@@ -0,0 +1,370 @@
+'''
+A SQLite index of the case metadata, so cohort selection is a query instead of a scan of every case.
+
+build_case_index reads SIMMETA.txt once and stores, per case, its group key, source, line in SIMMETA.txt,
+sample count, duration and landmark frames in the cases table, and every logged event with its aligned
+frame in the events table. Later builds only re-read cases whose T.txt, LogFile_P.txt or SIMMETA.txt
+line changed. Cases that cannot be read are listed in the failures table instead.
+
+query_cases selects cases by group, duration and logged events, and query_events selects events
+across the cohort, both in SIMMETA.txt order.
+'''
+
+import os
+import sqlite3
+import core
+
+
+# The default file name of the index, created next to SIMMETA.txt
+DEFAULT_DB_NAME = 'case_index.db'
+
+# Stored as the user_version of the database; an index of another version is rebuilt
+SCHEMA_VERSION = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY,
+    group_key TEXT NOT NULL,
+    source_root TEXT,
+    source_file TEXT,
+    meta_line INTEGER,
+    case_dir TEXT NOT NULL,
+    samples INTEGER,
+    duration_ms REAL,
+    cecum_index INTEGER,
+    flexur_L_index INTEGER,
+    flexur_R_index INTEGER,
+    end_index INTEGER,
+    start_index INTEGER,
+    signature TEXT
+);
+CREATE INDEX IF NOT EXISTS cases_group ON cases (group_key);
+CREATE INDEX IF NOT EXISTS cases_duration ON cases (duration_ms);
+CREATE TABLE IF NOT EXISTS events (
+    case_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    time REAL,
+    frame INTEGER,
+    PRIMARY KEY (case_id, position)
+);
+CREATE INDEX IF NOT EXISTS events_event ON events (event, case_id);
+CREATE TABLE IF NOT EXISTS failures (
+    case_id TEXT PRIMARY KEY,
+    group_key TEXT,
+    meta_line INTEGER,
+    error TEXT
+);
+'''
+
+
+def connect(db_path):
+    """
+    Open the case index database, creating the tables if needed.
+    An index written with another SCHEMA_VERSION is emptied, so the next build re-reads every case.
+
+    Parameters:
+    db_path (str): The path of the SQLite file.
+
+    Returns:
+    sqlite3.Connection: The open connection, returning rows as sqlite3.Row.
+    """
+    connection = sqlite3.connect(db_path)
+    connection.row_factory = sqlite3.Row
+    if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        connection.executescript('DROP TABLE IF EXISTS cases; DROP TABLE IF EXISTS events; DROP TABLE IF EXISTS failures;')
+        connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_default_db_path(meta_path='SIMMETA.txt'):
+    """
+    Return the path of the case index kept next to a SIMMETA.txt file.
+
+    Parameters:
+    meta_path (str): The path of SIMMETA.txt.
+
+    Returns:
+    str: The path of DEFAULT_DB_NAME in the directory of meta_path.
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(meta_path)), DEFAULT_DB_NAME)
+
+
+def get_case_signature(path, group_key=None, source_root=None, source_file=None, meta_line=None):
+    """
+    Describe a case by the modification time and size of its T.txt and LogFile_P.txt files,
+    and by its SIMMETA.txt line.
+
+    Parameters:
+    path (str): The directory of the case.
+    group_key (str, optional): The group key of the case.
+    source_root (str, optional): The raw data directory from SIMMETA.txt.
+    source_file (str, optional): The raw sensor file from SIMMETA.txt.
+    meta_line (int, optional): The line number of the case in SIMMETA.txt.
+
+    Returns:
+    str: A signature that changes whenever one of the files or the SIMMETA.txt line changes.
+    """
+    parts = []
+    for file_path in (core.get_all_coord_paths(path)[3], os.path.join(path, 'LogFile_P.txt')):
+        stat = os.stat(file_path)
+        parts.append(f'{stat.st_mtime_ns}:{stat.st_size}')
+    parts.append(repr((group_key, source_root, source_file, meta_line)))
+    return ';'.join(parts)
+
+
+def read_simmeta_lines(file_path):
+    """
+    Read SIMMETA.txt into (group key, case ID, source root, source file, line number) tuples.
+
+    Parameters:
+    file_path (str): The path of the metadata file.
+
+    Returns:
+    list: One tuple per valid line, in file order. Line numbers start at 0.
+    """
+    entries = []
+    with open(file_path, 'r') as file:
+        for line_no, line in enumerate(file):
+            parts = line.strip().split(';')
+            key = core.get_group_key(line)
+            value = core.process_line(line)
+            if key and value:
+                entries.append((key, value, parts[0], parts[1], line_no))
+    return entries
+
+
+def index_case(connection, group_key, case_id, source_path, source_root=None, source_file=None, meta_line=None):
+    """
+    Read one case and write its metadata, landmarks and events to the index.
+
+    Parameters:
+    connection (sqlite3.Connection): The open case index.
+    group_key (str): The group key of the case.
+    case_id (str): The case ID, which is also the name of its directory.
+    source_path (str): The base directory containing the case directories.
+    source_root (str, optional): The raw data directory from SIMMETA.txt.
+    source_file (str, optional): The raw sensor file from SIMMETA.txt.
+    meta_line (int, optional): The line number of the case in SIMMETA.txt.
+    """
+    path = os.path.join(source_path, case_id)
+    signature = get_case_signature(path, group_key, source_root, source_file, meta_line)
+    T_list = [item[0] for item in core.get_list_from_txt(core.get_all_coord_paths(path)[3])]
+    landmarks = core.get_landmark_indexes(path, T_list)
+    timeline = core.get_case_timeline(path, T_list)
+
+    connection.execute('DELETE FROM events WHERE case_id = ?', (case_id,))
+    connection.execute(
+        'INSERT OR REPLACE INTO cases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (case_id, group_key, source_root, source_file, meta_line, os.path.abspath(path), len(T_list), T_list[-1] - T_list[0])
+        + tuple(int(index) for index in landmarks) + (signature,)
+    )
+    connection.execute('DELETE FROM failures WHERE case_id = ?', (case_id,))
+    connection.executemany(
+        'INSERT INTO events VALUES (?, ?, ?, ?, ?)',
+        [
+            (case_id, position, event.strip(), None if time != time else float(time), int(frame))
+            for position, (event, time, frame) in enumerate(zip(timeline['event'], timeline['time'], timeline['frame']))
+        ]
+    )
+
+
+def build_case_index(db_path, source_path, meta_path='SIMMETA.txt', verbose=True):
+    """
+    Build or update the case index from SIMMETA.txt and the case directories.
+
+    Cases whose T.txt, LogFile_P.txt and SIMMETA.txt line (group key, source and line number) are
+    unchanged since the last build are skipped, and cases no longer listed in SIMMETA.txt are removed.
+    A case that fails to index is removed from the cases and events tables and listed in the failures
+    table with its error, see get_failures.
+
+    Parameters:
+    db_path (str): The path of the SQLite file.
+    source_path (str): The base directory containing the case directories.
+    meta_path (str): The path of SIMMETA.txt.
+    verbose (bool): Print a line for every case that fails to index.
+
+    Returns:
+    dict: Counts of 'indexed', 'unchanged', 'removed' and 'failed' cases.
+    """
+    counts = {'indexed': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+    entries = read_simmeta_lines(meta_path)
+
+    with connect(db_path) as connection:
+        known = {row['case_id']: row['signature'] for row in connection.execute('SELECT case_id, signature FROM cases')}
+
+        for group_key, case_id, source_root, source_file, meta_line in entries:
+            path = os.path.join(source_path, case_id)
+            try:
+                if known.get(case_id) == get_case_signature(path, group_key, source_root, source_file, meta_line):
+                    counts['unchanged'] += 1
+                    continue
+                index_case(connection, group_key, case_id, source_path, source_root, source_file, meta_line)
+                counts['indexed'] += 1
+            except (OSError, ValueError, IndexError) as error:
+                # Never leave the rows of an older build behind for a case that can no longer be read
+                connection.execute('DELETE FROM cases WHERE case_id = ?', (case_id,))
+                connection.execute('DELETE FROM events WHERE case_id = ?', (case_id,))
+                connection.execute('INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?)', (case_id, group_key, meta_line, f'{type(error).__name__}: {error}'))
+                counts['failed'] += 1
+                if verbose:
+                    print(f'Could not index {case_id}: {error}')
+
+        listed = {entry[1] for entry in entries}
+        for case_id in set(known) - listed:
+            connection.execute('DELETE FROM cases WHERE case_id = ?', (case_id,))
+            connection.execute('DELETE FROM events WHERE case_id = ?', (case_id,))
+            counts['removed'] += 1
+        for row in connection.execute('SELECT case_id FROM failures').fetchall():
+            if row['case_id'] not in listed:
+                connection.execute('DELETE FROM failures WHERE case_id = ?', (row['case_id'],))
+
+    connection.close()
+    return counts
+
+
+def query_cases(db_path, group=None, min_duration=None, max_duration=None, has_event=None):
+    """
+    Select cases from the index.
+
+    Parameters:
+    db_path (str): The path of the SQLite file.
+    group (str or list, optional): Only cases of this group key (or of any of these keys).
+    min_duration (float, optional): Only cases lasting at least this many milliseconds.
+    max_duration (float, optional): Only cases lasting at most this many milliseconds.
+    has_event (str or list, optional): Only cases with this logged event (or with all of these events).
+
+    Returns:
+    list: One dictionary per case with the columns of the cases table, in SIMMETA.txt order.
+    """
+    conditions = []
+    parameters = []
+
+    if group is not None:
+        groups = [group] if isinstance(group, str) else list(group)
+        conditions.append(f"group_key IN ({', '.join('?' * len(groups))})")
+        parameters.extend(groups)
+    if min_duration is not None:
+        conditions.append('duration_ms >= ?')
+        parameters.append(min_duration)
+    if max_duration is not None:
+        conditions.append('duration_ms <= ?')
+        parameters.append(max_duration)
+    if has_event is not None:
+        for event in [has_event] if isinstance(has_event, str) else has_event:
+            conditions.append('EXISTS (SELECT 1 FROM events WHERE events.case_id = cases.case_id AND events.event = ?)')
+            parameters.append(event)
+
+    query = 'SELECT * FROM cases'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY meta_line'
+
+    connection = connect(db_path)
+    try:
+        return [dict(row) for row in connection.execute(query, parameters)]
+    finally:
+        connection.close()
+
+
+def get_groups(db_path):
+    """
+    Return the case IDs per group key, as core.read_simmeta does, from the index.
+    Cases that failed to index are left out, see get_failures.
+
+    Parameters:
+    db_path (str): The path of the SQLite file.
+
+    Returns:
+    dict: A dictionary mapping each group key to the list of its case IDs.
+    """
+    results = {}
+    for row in query_cases(db_path):
+        results.setdefault(row['group_key'], []).append(row['case_id'])
+    return results
+
+
+def get_failures(db_path):
+    """
+    Return the cases listed in SIMMETA.txt that could not be indexed in the last build.
+
+    Parameters:
+    db_path (str): The path of the SQLite file.
+
+    Returns:
+    list: One dictionary per case with 'case_id', 'group_key', 'meta_line' and 'error', in SIMMETA.txt order.
+    """
+    connection = connect(db_path)
+    try:
+        return [dict(row) for row in connection.execute('SELECT * FROM failures ORDER BY meta_line')]
+    finally:
+        connection.close()
+
+
+def get_case_events(db_path, case_id, event=None):
+    """
+    Return the logged events of a case with their aligned frames.
+
+    Parameters:
+    db_path (str): The path of the SQLite file.
+    case_id (str): The case ID.
+    event (str, optional): Only events with exactly this text.
+
+    Returns:
+    list: One (event, time, frame) tuple per event, in log order.
+    """
+    query = 'SELECT event, time, frame FROM events WHERE case_id = ?'
+    parameters = [case_id]
+    if event is not None:
+        query += ' AND event = ?'
+        parameters.append(event)
+    connection = connect(db_path)
+    try:
+        return [tuple(row) for row in connection.execute(query + ' ORDER BY position', parameters)]
+    finally:
+        connection.close()
+
+
+def query_events(db_path, event=None, contains=None, group=None):
+    """
+    Select logged events of every case in the index, with their aligned frames.
+
+    Parameters:
+    db_path (str): The path of the SQLite file.
+    event (str or list, optional): Only events with exactly this text (or any of these texts).
+    contains (str, optional): Only events whose text contains this string, such as 'Polyp'.
+    group (str or list, optional): Only events of cases of this group key (or of any of these keys).
+
+    Returns:
+    list: One dictionary per event with 'case_id', 'group_key', 'case_dir', 'position', 'event', 'time'
+          (seconds in the log) and 'frame', in SIMMETA.txt order and then log order.
+    """
+    conditions = []
+    parameters = []
+
+    if event is not None:
+        events = [event] if isinstance(event, str) else list(event)
+        conditions.append(f"events.event IN ({', '.join('?' * len(events))})")
+        parameters.extend(events)
+    if contains is not None:
+        conditions.append("instr(events.event, ?) > 0")
+        parameters.append(contains)
+    if group is not None:
+        groups = [group] if isinstance(group, str) else list(group)
+        conditions.append(f"cases.group_key IN ({', '.join('?' * len(groups))})")
+        parameters.extend(groups)
+
+    query = (
+        'SELECT events.case_id, cases.group_key, cases.case_dir, events.position, events.event, events.time, events.frame '
+        'FROM events JOIN cases ON cases.case_id = events.case_id'
+    )
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    query += ' ORDER BY cases.meta_line, events.position'
+
+    connection = connect(db_path)
+    try:
+        return [dict(row) for row in connection.execute(query, parameters)]
+    finally:
+        connection.close()
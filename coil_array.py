@@ -0,0 +1,140 @@
+import numpy as np
+
+
+AXIS_INDEX = {'X': 0, 'Y': 1, 'Z': 2}
+
+
+class CoilArray:
+    """
+    The coil positions of a case as one contiguous (frames, coils, 3) array plus a shared (frames,) time vector.
+
+    Views per coil, per axis and per frame range share memory with the array, so nothing is copied
+    when a stage only needs part of the data. Coil 0 is the tip.
+
+    Parameters:
+    coords (np.array): The (frames, coils, 3) X, Y, Z positions.
+    time (np.array): The (frames,) sample times in ms.
+    dtype (np.dtype, optional): Convert coords to this type (float32 halves the memory).
+    """
+
+    def __init__(self, coords, time, dtype=None):
+        coords = np.asarray(coords, dtype=dtype)
+        if coords.ndim != 3 or coords.shape[2] != 3:
+            raise ValueError(f'coords should have shape (frames, coils, 3), not {coords.shape}')
+        time = np.asarray(time, dtype=np.float64)
+        if time.shape != coords.shape[:1]:
+            raise ValueError(f'time should have shape ({coords.shape[0]},), not {time.shape}')
+        self.coords = coords
+        self.time = time
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+    def __repr__(self):
+        return f'CoilArray(frames={self.n_frames}, coils={self.n_coils}, dtype={self.coords.dtype})'
+
+    @property
+    def n_frames(self):
+        return self.coords.shape[0]
+
+    @property
+    def n_coils(self):
+        return self.coords.shape[1]
+
+    @property
+    def nbytes(self):
+        return self.coords.nbytes + self.time.nbytes
+
+    def coil(self, coil_no):
+        """
+        Return a (frames, 3) view of one coil.
+        """
+        return self.coords[:, coil_no, :]
+
+    def axis(self, name):
+        """
+        Return a (frames, coils) view of one axis ('X', 'Y' or 'Z').
+        """
+        return self.coords[:, :, AXIS_INDEX[name]]
+
+    def frames(self, start=None, stop=None, step=None):
+        """
+        Return a CoilArray viewing a range of frames.
+        """
+        window = slice(start, stop, step)
+        return CoilArray(self.coords[window], self.time[window])
+
+    @property
+    def tip(self):
+        """
+        A (frames, 3) view of the tip coil.
+        """
+        return self.coil(0)
+
+    @classmethod
+    def from_lists(cls, X, Y, Z, T, dtype=np.float64):
+        """
+        Build a CoilArray from the (frames, coils) X, Y, Z and (frames,) T of ps.get_all_lists_from_path.
+        """
+        coords = np.empty((len(T), len(X[0]) if len(T) else 0, 3), dtype=dtype)
+        for index, values in enumerate((X, Y, Z)):
+            coords[:, :, index] = values
+        return cls(coords, T)
+
+    @classmethod
+    def from_dict(cls, datadict, dtype=np.float64):
+        """
+        Build a CoilArray from a {coil_no: {'T': [], 'X': [], 'Y': [], 'Z': []}} dictionary.
+        The time vector is taken from coil 0.
+        """
+        coil_numbers = sorted(datadict)
+        coords = np.empty((len(datadict[coil_numbers[0]]['X']), len(coil_numbers), 3), dtype=dtype)
+        for column, coil_no in enumerate(coil_numbers):
+            for name, index in AXIS_INDEX.items():
+                coords[:, column, index] = datadict[coil_no][name]
+        return cls(coords, datadict[coil_numbers[0]]['T'])
+
+    @classmethod
+    def from_rows(cls, data, coord_columns, time_column=0, dtype=np.float64):
+        """
+        Build a CoilArray from a 2D sample array, one row per sample.
+
+        Parameters:
+        data (np.array): The samples, such as the output of pre_processing.coiler.
+        coord_columns (list): The columns holding X, Y, Z of coil 0, then of coil 1, and so on.
+        time_column (int): The column holding the time in ms.
+        dtype (np.dtype): The type of the coordinates.
+        """
+        data = np.asarray(data)
+        coords = np.ascontiguousarray(data[:, coord_columns], dtype=dtype).reshape(len(data), -1, 3)
+        return cls(coords, data[:, time_column])
+
+    def to_dict(self):
+        """
+        Return the {coil_no: {'T': [], 'X': [], 'Y': [], 'Z': []}} dictionary used before CoilArray.
+        """
+        time = self.time.tolist()
+        return {
+            coil_no: {'T': list(time), **{name: self.coords[:, coil_no, index].tolist() for name, index in AXIS_INDEX.items()}}
+            for coil_no in range(self.n_coils)
+        }
+
+    def astype(self, dtype):
+        """
+        Return a copy with coordinates of another type.
+        """
+        return CoilArray(self.coords.astype(dtype), self.time)
+
+    def save(self, path):
+        """
+        Save to a .npy-based .npz file.
+        """
+        np.savez(path, coords=self.coords, time=self.time)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a CoilArray saved with save().
+        """
+        with np.load(path) as data:
+            return cls(data['coords'], data['time'])
@@ -0,0 +1,152 @@
+import os
+import shutil
+import subprocess
+import time
+import cv2
+import numpy as np
+from coil_array import CoilArray
+
+
+# Panels as in pre_processing.save_animation: (horizontal axis, vertical axis, x limits, y limits, BGR colour, title)
+PANELS = (
+    ('X', 'Y', (-250, 250), (-250, 250), (0, 0, 0), 'XY'),
+    ('Z', 'Y', (0, 500), (-250, 250), (255, 0, 0), 'ZY'),
+)
+
+
+def get_coil_axis(datadict, axis):
+    """
+    Return one axis of every coil as a (frames, coils) array.
+
+    Parameters:
+    datadict (CoilArray or dict): The coil positions, or a dictionary {coil_no: {'X': [...], 'Y': [...], 'Z': [...]}}.
+    axis (str): 'X', 'Y' or 'Z'.
+
+    Returns:
+    np.array: A float array with one column per coil, in coil number order.
+    """
+    if isinstance(datadict, CoilArray):
+        return datadict.axis(axis)
+    return np.column_stack([np.asarray(datadict[coil_no][axis], dtype=float) for coil_no in sorted(datadict)])
+
+
+def to_pixels(values, limits, size, flip=False):
+    """
+    Map data coordinates to pixel coordinates of a panel.
+
+    Parameters:
+    values (np.array): The data coordinates.
+    limits (tuple): The (min, max) data range shown in the panel.
+    size (int): The panel size in pixels.
+    flip (bool): True for the vertical axis, where pixel rows grow downwards.
+
+    Returns:
+    np.array: An int32 array of pixel coordinates.
+    """
+    scaled = (values - limits[0]) / (limits[1] - limits[0]) * (size - 1)
+    if flip:
+        scaled = (size - 1) - scaled
+    return np.round(scaled).astype(np.int32)
+
+
+def draw_background(panel_size):
+    """
+    Draw the empty two-panel frame with panel borders and titles.
+
+    Parameters:
+    panel_size (int): The width and height of each panel in pixels.
+
+    Returns:
+    np.array: A (panel_size, 2 * panel_size, 3) uint8 BGR image.
+    """
+    background = np.full((panel_size, 2 * panel_size, 3), 255, dtype=np.uint8)
+    for panel_no, panel in enumerate(PANELS):
+        x0 = panel_no * panel_size
+        cv2.rectangle(background, (x0, 0), (x0 + panel_size - 1, panel_size - 1), (0, 0, 0), 1)
+        cv2.putText(background, panel[5], (x0 + panel_size // 2 - 12, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 1, cv2.LINE_AA)
+    return background
+
+
+def rasterize_frames(datadict, panel_size=500, step=1):
+    """
+    Yield rendered frames with the coil polyline drawn in the XY and ZY panels.
+
+    The negated Y axis is drawn upwards, as in save_animation.
+
+    Parameters:
+    datadict (CoilArray or dict): The coil positions, or a dictionary {coil_no: {'X': [...], 'Y': [...], 'Z': [...]}}.
+    panel_size (int): The width and height of each panel in pixels.
+    step (int): Render every step-th sample only.
+
+    Yields:
+    np.array: One (panel_size, 2 * panel_size, 3) uint8 BGR image per rendered sample.
+    """
+    background = draw_background(panel_size)
+    frame = np.empty_like(background)
+
+    # Convert every sample of every coil to pixels in one go, per panel
+    panel_points = []
+    for panel_no, (h_axis, v_axis, h_limits, v_limits, colour, _) in enumerate(PANELS):
+        h_pixels = to_pixels(get_coil_axis(datadict, h_axis)[::step], h_limits, panel_size) + panel_no * panel_size
+        v_pixels = to_pixels(-get_coil_axis(datadict, v_axis)[::step], v_limits, panel_size, flip=True)
+        panel_points.append((np.stack([h_pixels, v_pixels], axis=-1), colour))
+
+    for frame_no in range(panel_points[0][0].shape[0]):
+        np.copyto(frame, background)
+        for points, colour in panel_points:
+            cv2.polylines(frame, [points[frame_no]], False, colour, 2, cv2.LINE_AA)
+        yield frame
+
+
+def render_animation(datadict, savep, fps=5, step=1, panel_size=500, verbose=True):
+    """
+    Render the coil animation of a case to an MP4 file through an ffmpeg pipe.
+
+    Frames are rasterized with OpenCV and streamed to ffmpeg as raw BGR video. When ffmpeg
+    is not installed, the frames are written as PNG images to a directory next to savep instead.
+
+    Parameters:
+    datadict (CoilArray or dict): The coil positions, or a dictionary {coil_no: {'X': [...], 'Y': [...], 'Z': [...]}}.
+    savep (str): The path of the MP4 file to write.
+    fps (int): The frame rate of the video.
+    step (int): Render every step-th sample only (frame decimation).
+    panel_size (int): The width and height of each panel in pixels, rounded up to an even number.
+    verbose (bool): Print the rendering throughput.
+
+    Returns:
+    dict: Rendering statistics with 'frames', 'seconds', 'fps' and 'output' (the file or directory written).
+    """
+    panel_size += panel_size % 2
+    start = time.perf_counter()
+    frame_count = 0
+
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is not None:
+        output = savep
+        command = [
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{2 * panel_size}x{panel_size}', '-r', str(fps), '-i', '-',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', savep
+        ]
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            for frame in rasterize_frames(datadict, panel_size, step):
+                process.stdin.write(frame.tobytes())
+                frame_count += 1
+        finally:
+            process.stdin.close()
+            returncode = process.wait()
+        if returncode != 0:
+            raise RuntimeError(f'ffmpeg exited with code {returncode} while writing {savep}')
+    else:
+        output = os.path.splitext(savep)[0] + '_frames'
+        os.makedirs(output, exist_ok=True)
+        for frame in rasterize_frames(datadict, panel_size, step):
+            cv2.imwrite(os.path.join(output, f'frame_{frame_count:06d}.png'), frame)
+            frame_count += 1
+
+    seconds = time.perf_counter() - start
+    stats = {'frames': frame_count, 'seconds': seconds, 'fps': frame_count / seconds if seconds > 0 else 0.0, 'output': output}
+    if verbose:
+        print(f"Rendered {frame_count} frames in {seconds:.2f} s ({stats['fps']:.1f} frames/s) to {output}")
+    return stats
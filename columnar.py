@@ -0,0 +1,265 @@
+'''
+Export a whole processed delivery to one columnar file, and read it back.
+
+The case directories hold four text files and a log each, so a cohort scan opens about six files per case
+and parses text. The columnar file holds the same data as binary column blocks:
+
+- one column per coil and axis ('X0', 'Y0', 'Z0' for the tip, 'X1', ... for the next coils) and 'T',
+  each a single contiguous block with the samples of every case, one case after the other;
+- a JSON footer with, for every case, its group key, its sample range in the columns, its landmarks and
+  its logged events with their aligned frames.
+
+Cases are ordered by group key and then by SIMMETA.txt order, so a group is one contiguous range and a case
+is a range inside it. The reader memory-maps the file and reads only the columns and cases asked for:
+the tip of the whole cohort is three sequential reads.
+
+Layout: MAGIC, the column blocks (64-byte aligned), the JSON footer, the footer length as uint64, MAGIC.
+'''
+
+import os
+import json
+import shutil
+import struct
+import tempfile
+import numpy as np
+import core
+from dataset import LANDMARK_NAMES
+
+
+MAGIC = b'COLCOORD'
+ALIGNMENT = 64
+
+
+def get_column_names(n_coils):
+    """
+    Return the column names of a store with n_coils coils: X, Y, Z per coil, then T.
+    """
+    return [f'{axis}{coil}' for coil in range(n_coils) for axis in 'XYZ'] + ['T']
+
+
+def export_columnar(source_path, out_path, meta_path='SIMMETA.txt', dtype=np.float32, cache_dir=None, verbose=True):
+    """
+    Pack every case in SIMMETA.txt into one columnar file.
+
+    Cases are streamed: each column is appended to its own temporary file and the temporary files are
+    copied into the output at the end, so only one case is in memory at a time.
+
+    Parameters:
+    source_path (str): The base directory containing the case directories.
+    out_path (str): The file to write.
+    meta_path (str): The path of SIMMETA.txt.
+    dtype (np.dtype): The type of the coordinate columns. T is always float64.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    verbose (bool): Print progress.
+
+    Returns:
+    dict: The footer that was written.
+    """
+    groups = core.read_simmeta(meta_path)
+    cases = []
+    column_names = None
+    offset = 0
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(out_path))) as tmp_dir:
+        column_files = {}
+        try:
+            for group_key in sorted(groups):
+                for case_id in groups[group_key]:
+                    path = os.path.join(source_path, case_id)
+                    X, Y, Z, T = (np.asarray(values) for values in core.get_all_lists_from_path(path, cache_dir))
+                    if column_names is None:
+                        column_names = get_column_names(X.shape[1])
+                        column_files = {name: open(os.path.join(tmp_dir, name), 'wb') for name in column_names}
+                    if X.shape[1] * 3 + 1 != len(column_names):
+                        raise ValueError(f'Case {case_id} has {X.shape[1]} coils, the store has {(len(column_names) - 1) // 3}')
+
+                    for coil in range(X.shape[1]):
+                        for axis, values in zip('XYZ', (X, Y, Z)):
+                            np.ascontiguousarray(values[:, coil], dtype=dtype).tofile(column_files[f'{axis}{coil}'])
+                    np.asarray(T, dtype=np.float64).tofile(column_files['T'])
+
+                    timeline = core.get_case_timeline(path, T)
+                    cases.append({
+                        'case_id': case_id,
+                        'group_key': group_key,
+                        'start': offset,
+                        'length': len(T),
+                        'landmarks': dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(path, T))),
+                        'end_time': float(timeline['end_time']),
+                        'events': [
+                            [None if np.isnan(time) else float(time), str(event), int(frame)]
+                            for time, event, frame in zip(timeline['time'], timeline['event'], timeline['frame'])
+                        ]
+                    })
+                    offset += len(T)
+                    if verbose:
+                        print(f'Exported {case_id} ({len(cases)} cases, {offset} samples)')
+        finally:
+            for file in column_files.values():
+                file.close()
+
+        column_names = column_names or ['T']
+        footer = {'version': 1, 'n_samples': offset, 'columns': {}, 'cases': cases}
+        tmp_path = out_path + '.tmp'
+        with open(tmp_path, 'wb') as output:
+            output.write(MAGIC)
+            for name in column_names:
+                output.write(b'\0' * (-output.tell() % ALIGNMENT))
+                footer['columns'][name] = {'offset': output.tell(), 'dtype': np.dtype(np.float64 if name == 'T' else dtype).str}
+                column_path = os.path.join(tmp_dir, name)
+                if os.path.exists(column_path):
+                    with open(column_path, 'rb') as column_file:
+                        shutil.copyfileobj(column_file, output, 16 * 1024 * 1024)
+            footer_bytes = json.dumps(footer).encode()
+            output.write(footer_bytes)
+            output.write(struct.pack('<Q', len(footer_bytes)))
+            output.write(MAGIC)
+        os.replace(tmp_path, out_path)
+
+    return footer
+
+
+class ColumnarReader:
+    """
+    Read a file written by export_columnar, with column and case filters.
+
+    Parameters:
+    path (str): The columnar file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a columnar coordinate file')
+            file.seek(-(len(MAGIC) + 8), os.SEEK_END)
+            footer_length = struct.unpack('<Q', file.read(8))[0]
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is truncated')
+            file.seek(-(len(MAGIC) + 8 + footer_length), os.SEEK_END)
+            self.footer = json.loads(file.read(footer_length))
+        self.cases = {case['case_id']: case for case in self.footer['cases']}
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.cases)
+
+    def __contains__(self, case_id):
+        return case_id in self.cases
+
+    @property
+    def case_ids(self):
+        return list(self.cases)
+
+    @property
+    def column_names(self):
+        return list(self.footer['columns'])
+
+    @property
+    def n_coils(self):
+        return (len(self.footer['columns']) - 1) // 3
+
+    @property
+    def groups(self):
+        """
+        A dictionary mapping each group key to the list of its case IDs, as core.read_simmeta returns.
+        """
+        results = {}
+        for case in self.footer['cases']:
+            results.setdefault(case['group_key'], []).append(case['case_id'])
+        return results
+
+    def column(self, name):
+        """
+        Return a whole column as a read-only memory-mapped array, with the samples of every case.
+        """
+        array = self._columns.get(name)
+        if array is None:
+            info = self.footer['columns'][name]
+            array = np.memmap(self.path, dtype=np.dtype(info['dtype']), mode='r', offset=info['offset'], shape=(self.footer['n_samples'],))
+            self._columns[name] = array
+        return array
+
+    def select_cases(self, case_ids=None, groups=None):
+        """
+        Return the footer entries of the selected cases, in file order.
+
+        Parameters:
+        case_ids (list, optional): Keep only these cases.
+        groups (list, optional): Keep only the cases of these group keys.
+        """
+        case_ids = None if case_ids is None else set(case_ids)
+        groups = None if groups is None else set(groups)
+        return [
+            case for case in self.footer['cases']
+            if (case_ids is None or case['case_id'] in case_ids) and (groups is None or case['group_key'] in groups)
+        ]
+
+    def read(self, columns=None, case_ids=None, groups=None):
+        """
+        Read columns of the selected cases. Consecutive cases are read as one range.
+
+        Parameters:
+        columns (list, optional): The column names, such as ['X0', 'Y0', 'Z0'] for the tip. Defaults to all.
+        case_ids (list, optional): Read only these cases.
+        groups (list, optional): Read only the cases of these group keys.
+
+        Returns:
+        dict: One array per column with the samples of the selected cases, one case after the other,
+              and 'offsets', the (cases + 1,) start of every case in those arrays.
+        """
+        columns = self.column_names if columns is None else list(columns)
+        selected = self.select_cases(case_ids, groups)
+
+        # Merge the sample ranges of cases that follow each other in the file
+        ranges = []
+        for case in selected:
+            if ranges and ranges[-1][1] == case['start']:
+                ranges[-1][1] += case['length']
+            else:
+                ranges.append([case['start'], case['start'] + case['length']])
+
+        result = {}
+        for name in columns:
+            array = self.column(name)
+            result[name] = np.concatenate([array[start:stop] for start, stop in ranges]) if ranges else np.zeros(0, dtype=array.dtype)
+        result['offsets'] = np.concatenate([[0], np.cumsum([case['length'] for case in selected])]).astype(np.int64)
+        return result
+
+    def read_case(self, case_id, coils=None):
+        """
+        Read one case in the layout of core.get_all_lists_from_path with a cache.
+
+        Parameters:
+        case_id (str): The case ID.
+        coils (list, optional): Read only these coils. Defaults to all.
+
+        Returns:
+        tuple: Arrays X, Y, Z of shape (frames, coils) and T of shape (frames,). X, Y and Z are copies,
+               T is a read-only view of the file.
+        """
+        case = self.cases[case_id]
+        window = slice(case['start'], case['start'] + case['length'])
+        coils = range(self.n_coils) if coils is None else coils
+        X, Y, Z = (np.column_stack([self.column(f'{axis}{coil}')[window] for coil in coils]) for axis in 'XYZ')
+        return X, Y, Z, self.column('T')[window]
+
+    def get_landmark_indexes(self, case_id):
+        """
+        Return the stored landmarks of a case in the order of core.get_landmark_indexes.
+        """
+        landmarks = self.cases[case_id]['landmarks']
+        return tuple(landmarks[name] for name in LANDMARK_NAMES)
+
+    def get_events(self, case_id):
+        """
+        Return the stored log of a case as the table of core.get_case_timeline.
+        """
+        case = self.cases[case_id]
+        events = case['events']
+        return {
+            'time': np.array([np.nan if time is None else time for time, _, _ in events], dtype=np.float64),
+            'event': np.array([event for _, event, _ in events], dtype=str),
+            'end_time': case['end_time'],
+            'frame': np.array([frame for _, _, frame in events], dtype=np.int64)
+        }
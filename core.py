@@ -0,0 +1,483 @@
+'''
+Headless data access: the case loaders, the binary case cache, event alignment and SIMMETA.txt metadata.
+
+This module only needs NumPy, so batch workers and analysis scripts can import it without loading the
+plotting, video and KDE libraries. plot_scripts re-exports everything defined here.
+'''
+
+import os
+import json
+import hashlib
+import numpy as np
+import instrumentation
+from coil_array import CoilArray
+
+
+def process_line(line):
+    """
+    Process a line of text by splitting and extracting specific parts.
+
+    Parameters:
+    line (str): The input line of text.
+
+    Returns:
+    str or None: The extracted value or None if the line is improperly formatted.
+    """
+    parts = line.strip().split(';')
+    if len(parts) < 3:
+        return None
+    index_2 = parts[2]
+    return index_2
+
+
+def get_group_key(line):
+    """
+    Extract the group key of a SIMMETA.txt line: the last three characters of the source directory.
+
+    Parameters:
+    line (str): The input line of text.
+
+    Returns:
+    str: The group key (empty if the line has no source directory).
+    """
+    return line.strip().split(';')[0].split('//')[-1][-3:]
+
+
+def read_simmeta(file_path='SIMMETA.txt'):
+    """
+    Read SIMMETA.txt and group the case IDs by group key.
+
+    Parameters:
+    file_path (str): The path of the metadata file.
+
+    Returns:
+    dict: A dictionary mapping each group key to the list of its case IDs, in file order.
+    """
+    results = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            key = get_group_key(line)
+            value = process_line(line)
+            if key and value:
+                results.setdefault(key, []).append(value)
+    return results
+
+
+def get_list_from_txt(path):
+    """
+    Read a text file and convert its contents to a list of lists of floats.
+
+    Parameters:
+    path (str): The file path to read from.
+
+    Returns:
+    list: A list of lists, where each sublist contains floats.
+    """
+    coord_list = []
+    with open(path, 'r') as file:
+        lines = file.readlines()
+
+    for line in lines:
+        temp_list = [float(i) for i in line.strip().split(';')[:-1]]
+        coord_list.append(temp_list)
+
+    return coord_list
+
+
+def get_all_coord_paths(path):
+    """
+    Generate file paths for coordinate data files (X, Y, Z, T).
+
+    Parameters:
+    path (str): The base directory path.
+
+    Returns:
+    tuple: A tuple containing file paths for X, Y, Z, and T data files.
+    """
+    return (
+        os.path.join(path, 'X.txt'),
+        os.path.join(path, 'Y.txt'),
+        os.path.join(path, 'Z.txt'),
+        os.path.join(path, 'T.txt')
+    )
+
+
+def get_all_lists_from_path(path, cache_dir=None, dtype=np.float64):
+    """
+    Read coordinate data from specified directory and return as lists.
+
+    Parameters:
+    path (str): The base directory path.
+    cache_dir (str, optional): Directory holding a binary cache of the case. When given, the
+                               case is read through the cache and NumPy arrays are returned.
+    dtype (np.dtype): Storage type of the cached X, Y and Z arrays (float64 or float32).
+
+    Returns:
+    tuple: A tuple containing lists of X, Y, Z coordinates and T times.
+           With cache_dir set, X, Y and Z are (frames, coils) arrays and T is a (frames,) array.
+    """
+    if cache_dir is not None:
+        return get_all_arrays_from_cache(path, cache_dir, dtype)
+
+    X_path, Y_path, Z_path, T_path = get_all_coord_paths(path)
+    with instrumentation.stage('load coordinates (text)', case=os.path.basename(os.path.normpath(path)), paths=(X_path, Y_path, Z_path, T_path)):
+        X_list = get_list_from_txt(X_path)
+        Y_list = get_list_from_txt(Y_path)
+        Z_list = get_list_from_txt(Z_path)
+        T_list = [item[0] for item in get_list_from_txt(T_path)]
+
+    return X_list, Y_list, Z_list, T_list
+
+
+def get_times_from_path(path, cache_dir=None):
+    """
+    Read only the sample times of a case, without parsing the coordinate files.
+
+    Parameters:
+    path (str): The base directory path.
+    cache_dir (str, optional): Directory holding a binary cache of the case, see get_all_lists_from_path.
+                               The cache is built if it is missing or stale.
+
+    Returns:
+    np.array: The (frames,) sample times in ms.
+    """
+    if cache_dir is not None:
+        return get_all_arrays_from_cache(path, cache_dir)[3]
+    T_path = get_all_coord_paths(path)[3]
+    with instrumentation.stage('load times (text)', case=os.path.basename(os.path.normpath(path)), paths=[T_path]):
+        return np.array([item[0] for item in get_list_from_txt(T_path)], dtype=np.float64)
+
+
+def get_coil_array_from_path(path, cache_dir=None, dtype=np.float64):
+    """
+    Read coordinate data from specified directory into one (frames, coils, 3) CoilArray.
+
+    Parameters:
+    path (str): The base directory path.
+    cache_dir (str, optional): Directory holding a binary cache of the case, see get_all_lists_from_path.
+    dtype (np.dtype): The type of the coordinates (float32 halves the memory).
+
+    Returns:
+    CoilArray: The coil positions and the shared time vector.
+    """
+    X, Y, Z, T = get_all_lists_from_path(path, cache_dir, dtype)
+    return CoilArray.from_lists(X, Y, Z, T, dtype)
+
+
+def get_source_signature(path):
+    """
+    Collect modification time and size of the coordinate files of a case.
+
+    Parameters:
+    path (str): The base directory path.
+
+    Returns:
+    list: A list of [mtime_ns, size] pairs in X, Y, Z, T order.
+    """
+    signature = []
+    for file_path in get_all_coord_paths(path):
+        stat = os.stat(file_path)
+        signature.append([stat.st_mtime_ns, stat.st_size])
+    return signature
+
+
+def get_case_cache_dir(path, cache_dir):
+    """
+    Return the cache directory used for a case, named after the case directory and a digest of its full path,
+    so cases with the same name under different roots never share a cache.
+
+    Parameters:
+    path (str): The base directory path of the case.
+    cache_dir (str): The root cache directory.
+
+    Returns:
+    str: The directory holding the cached arrays of the case.
+    """
+    path = os.path.abspath(path)
+    digest = hashlib.blake2b(path.encode(), digest_size=4).hexdigest()
+    return os.path.join(cache_dir, f'{os.path.basename(path)}-{digest}')
+
+
+def build_case_cache(path, cache_dir, dtype=np.float64):
+    """
+    Parse the text files of a case once and store them as .npy files in the cache.
+
+    Parameters:
+    path (str): The base directory path of the case.
+    cache_dir (str): The root cache directory.
+    dtype (np.dtype): Storage type of the X, Y and Z arrays. T is always stored as float64.
+
+    Returns:
+    str: The directory holding the cached arrays of the case.
+    """
+    case_cache = get_case_cache_dir(path, cache_dir)
+    os.makedirs(case_cache, exist_ok=True)
+    signature = get_source_signature(path)
+
+    X_list, Y_list, Z_list, T_list = get_all_lists_from_path(path)
+    arrays = {
+        'X': np.array(X_list, dtype=dtype),
+        'Y': np.array(Y_list, dtype=dtype),
+        'Z': np.array(Z_list, dtype=dtype),
+        'T': np.array(T_list, dtype=np.float64)
+    }
+    for name, array in arrays.items():
+        tmp_path = os.path.join(case_cache, name + '.tmp.npy')
+        np.save(tmp_path, array)
+        os.replace(tmp_path, os.path.join(case_cache, name + '.npy'))
+
+    # The meta file is written last, so an interrupted build is never seen as valid
+    meta = {'source': os.path.abspath(path), 'signature': signature, 'dtype': np.dtype(dtype).str}
+    tmp_path = os.path.join(case_cache, 'meta.tmp.json')
+    with open(tmp_path, 'w') as file:
+        json.dump(meta, file)
+    os.replace(tmp_path, os.path.join(case_cache, 'meta.json'))
+
+    return case_cache
+
+
+def is_case_cache_valid(path, cache_dir, dtype=np.float64):
+    """
+    Check whether the cache of a case exists and was built from the current source files of this case.
+
+    Parameters:
+    path (str): The base directory path of the case.
+    cache_dir (str): The root cache directory.
+    dtype (np.dtype): Expected storage type of the X, Y and Z arrays.
+
+    Returns:
+    bool: True if the cached arrays can be used as they are.
+    """
+    meta_path = os.path.join(get_case_cache_dir(path, cache_dir), 'meta.json')
+    try:
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return False
+    return (
+        meta.get('source') == os.path.abspath(path) and meta.get('signature') == get_source_signature(path)
+        and meta.get('dtype') == np.dtype(dtype).str
+    )
+
+
+def get_all_arrays_from_cache(path, cache_dir, dtype=np.float64):
+    """
+    Read coordinate data of a case through the binary cache, rebuilding it if it is missing or stale.
+
+    Parameters:
+    path (str): The base directory path of the case.
+    cache_dir (str): The root cache directory.
+    dtype (np.dtype): Storage type of the X, Y and Z arrays.
+
+    Returns:
+    tuple: Read-only memory-mapped arrays X, Y, Z of shape (frames, coils) and T of shape (frames,).
+    """
+    if not is_case_cache_valid(path, cache_dir, dtype):
+        build_case_cache(path, cache_dir, dtype)
+    case_cache = get_case_cache_dir(path, cache_dir)
+    with instrumentation.stage('load coordinates (cache)', case=os.path.basename(os.path.normpath(path))):
+        return tuple(np.load(os.path.join(case_cache, name + '.npy'), mmap_mode='r') for name in 'XYZT')
+
+
+def nearest_time_indexes(T_list, times):
+    """
+    Find, for every time in times, the index of the closest value in T_list.
+
+    Ties go to the earlier sample and repeated values resolve to their first occurrence, which
+    gives the same result as min(T_list, key=lambda x: abs(x - time)) followed by T_list.index.
+
+    Parameters:
+    T_list (list or np.array): A list of time coordinates, normally in ascending order.
+    times (list or np.array): The times to look up.
+
+    Returns:
+    np.array: An integer array with one index into T_list per time.
+    """
+    T = np.asarray(T_list, dtype=np.float64)
+    times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+
+    if T.size > 1 and np.any(T[1:] < T[:-1]):
+        # Binary search needs a sorted time base; fall back to a full (still vectorized) scan
+        return np.abs(T[np.newaxis, :] - times[:, np.newaxis]).argmin(axis=1)
+
+    right = np.clip(np.searchsorted(T, times, side='left'), 0, T.size - 1)
+    left = np.clip(right - 1, 0, T.size - 1)
+    closest = np.where(np.abs(T[left] - times) <= np.abs(T[right] - times), left, right)
+    return np.searchsorted(T, T[closest], side='left')
+
+
+def align_event_times(event_times, T_list, end_time):
+    """
+    Align log event times (seconds) to indexes in T_list (milliseconds).
+
+    The log and the coordinates share their end point, so every event time is shifted by
+    the offset between the last coordinate time and the end time of the log.
+
+    Parameters:
+    event_times (list or np.array): The event times in seconds, as written in the log file.
+    T_list (list or np.array): A list of time coordinates.
+    end_time (float): The end time from the log file in milliseconds.
+
+    Returns:
+    np.array: An integer array with the index in T_list closest to each event.
+    """
+    end_coordinates_time = float(T_list[-1])
+    event_times = np.asarray(event_times, dtype=np.float64)
+    adjusted_times = end_coordinates_time - (end_time - (event_times * 1000))
+    return nearest_time_indexes(T_list, adjusted_times)
+
+
+_timeline_cache = {}
+TIMELINE_CACHE_SIZE = 4096
+# The number of time bases whose aligned indexes are kept per case
+TIMELINE_TIME_BASES = 4
+
+
+def read_log_file(path):
+    """
+    Read LogFile_P.txt of a case in a single pass into an event table.
+
+    Parameters:
+    path (str): The directory path containing the log file.
+
+    Returns:
+    dict: A dictionary with 'time' (np.array of event times in seconds, NaN where the timestamp is
+          not a number), 'event' (np.array of event texts as written in the log) and 'end_time'
+          (the time of the last log line in milliseconds).
+    """
+    index_path = os.path.join(path, 'LogFile_P.txt')
+    times = []
+    events = []
+
+    with instrumentation.stage('parse log', case=os.path.basename(os.path.normpath(path)), paths=[index_path]), open(index_path, 'r') as file:
+        for line in file:
+            parts = line.split(';')
+            try:
+                times.append(float(parts[0]))
+            except ValueError:
+                times.append(np.nan)
+            events.append(parts[1] if len(parts) > 1 else '')
+
+    if not times or np.isnan(times[-1]):
+        # Every event is aligned against the last log time, so without it no frame would be right
+        raise ValueError(f'The last line of {index_path} has no timestamp')
+
+    return {
+        'time': np.array(times, dtype=np.float64),
+        'event': np.array(events, dtype=str),
+        'end_time': times[-1] * 1000
+    }
+
+
+def get_case_timeline(path, T_list):
+    """
+    Return the event table of a case with every event aligned to an index in T_list.
+
+    The parsed log is cached per case and reused until LogFile_P.txt changes on disk, and the aligned
+    indexes are cached per time base (keyed on a digest of every time in T_list). The returned arrays
+    are copies, so callers may modify them.
+
+    Parameters:
+    path (str): The directory path containing the log file.
+    T_list (list): A list of time coordinates.
+
+    Returns:
+    dict: The table from read_log_file with an added 'frame' entry holding the index in
+          T_list of every event (-1 where the event has no valid time).
+    """
+    index_path = os.path.abspath(os.path.join(path, 'LogFile_P.txt'))
+    stat = os.stat(index_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    entry = _timeline_cache.get(index_path)
+    if entry is None or entry['signature'] != signature:
+        entry = {'signature': signature, 'table': read_log_file(path), 'frames': {}}
+        if len(_timeline_cache) >= TIMELINE_CACHE_SIZE:
+            _timeline_cache.pop(next(iter(_timeline_cache)))
+        _timeline_cache[index_path] = entry
+
+    table = entry['table']
+    T = np.ascontiguousarray(T_list, dtype=np.float64)
+    time_key = hashlib.blake2b(T.tobytes(), digest_size=16).digest()
+    frames = entry['frames'].get(time_key)
+    if frames is None:
+        frames = np.full(table['time'].shape, -1, dtype=np.int64)
+        valid = np.isfinite(table['time'])
+        frames[valid] = align_event_times(table['time'][valid], T, table['end_time'])
+        if len(entry['frames']) >= TIMELINE_TIME_BASES:
+            entry['frames'].pop(next(iter(entry['frames'])))
+        entry['frames'][time_key] = frames
+
+    return {
+        'time': table['time'].copy(),
+        'event': table['event'].copy(),
+        'end_time': table['end_time'],
+        'frame': frames.copy()
+    }
+
+
+def clear_timeline_cache():
+    """
+    Drop all cached event tables.
+    """
+    _timeline_cache.clear()
+
+
+def get_landmark_indexes(path, T_list):
+    """
+    Process a log file and return the indexes of specific landmarks (Cecum, Flexur L, Flexur R, Start, End).
+
+    Parameters:
+    path (str): The directory path containing the log file.
+    T_list (list): A list of time coordinates.
+
+    Returns:
+    tuple: A tuple containing the indexes of the landmarks in the following order:
+           (cecum_index, flexur_L_index, flexur_R_index, end_index, start_index)
+    """
+    timeline = get_case_timeline(path, T_list)
+    events = timeline['event']
+    frames = timeline['frame']
+
+    def contains(text):
+        return np.char.find(events, text) >= 0
+
+    def last_frame(mask):
+        positions = np.flatnonzero(mask)
+        if np.any(frames[positions] < 0):
+            # A landmark line whose time is not a number cannot be aligned
+            raise ValueError(f'A landmark event in the log of {path} has no timestamp')
+        return int(frames[positions[-1]]) if positions.size else 0
+
+    # Flexures only count when they are logged before the first Cecum
+    cecum_positions = np.flatnonzero(contains('Cecum'))
+    before_cecum = np.arange(events.size) < (cecum_positions[0] if cecum_positions.size else events.size)
+
+    cecum_index = last_frame(np.arange(events.size) == cecum_positions[0]) if cecum_positions.size else 0
+    flexur_L_index = last_frame(contains('Fleksur L') & before_cecum)
+    flexur_R_index = last_frame(contains('Fleksur R') & before_cecum)
+    end_index = last_frame(contains('Recording ended') | contains('Endoscopy ended'))
+    start_index = last_frame(contains('Endoscopy started'))
+
+    return (cecum_index, flexur_L_index, flexur_R_index, end_index, start_index)
+
+
+def get_event_indexes(path, T_list):
+    """
+    Process a log file and return the indexes of specific events ('Flush', 'Biopsy', 'Polyp', 'Polypectomi').
+
+    Parameters:
+    path (str): The directory path containing the log file.
+    T_list (list): A list of time coordinates.
+
+    Returns:
+    list: A list of lists where each sublist contains the event name and the corresponding indexes in T_list.
+    """
+    timeline = get_case_timeline(path, T_list)
+    events = timeline['event'][1:]
+    frames = timeline['frame'][1:]
+    event_names = ['Flush', 'Biopsy', 'Polyp', 'Polypectomi']
+    if np.any(frames[np.isin(events, event_names)] < 0):
+        raise ValueError(f'An event in the log of {path} has no timestamp')
+
+    return [[event, [int(index) for index in frames[events == event]]] for event in event_names]
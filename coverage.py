@@ -0,0 +1,274 @@
+'''
+Sparse 3D coverage of the colon: how often, and for how long, the tip was in every voxel.
+
+A VoxelGrid only stores visited voxels, so a cohort grid stays small however large the space is. Grids
+of single cases merge into cohort grids, and a saved cohort grid is updated with new cases only. A grid
+records which phase of the procedure (and which landmarks bound it) its samples come from, so samples of
+different phases are never mixed into one grid.
+'''
+
+import os
+import json
+import numpy as np
+import core
+from dataset import LANDMARK_NAMES
+
+
+AXES = {'x': 0, 'y': 1, 'z': 2}
+
+# The landmarks bounding each phase, None for the first or last frame
+PHASES = {'insertion': ('start', 'cecum'), 'withdrawal': ('cecum', 'end'), 'all': (None, None)}
+
+
+class VoxelGrid:
+    """
+    A sparse 3D occupancy and dwell-time map of tip positions.
+
+    Voxels are kept in a hash map from integer voxel coordinates to [sample count, dwell time in ms],
+    so only visited voxels use memory. Samples can be added one at a time or in arrays, grids of
+    single cases can be merged into cohort grids, and grids can be saved and loaded.
+
+    Parameters:
+    voxel_size (float): The side length of a voxel in mm.
+    selection (dict, optional): Which samples the grid holds, such as {'phase': 'insertion', 'start': 'start',
+                                'stop': 'cecum', 'coil': 0}. Saved with the grid, and grids with different
+                                selections are not merged.
+    """
+
+    def __init__(self, voxel_size=5.0, selection=None):
+        self.voxel_size = float(voxel_size)
+        self.selection = selection
+        self.voxels = {}
+        self.case_ids = set()
+
+    def __len__(self):
+        return len(self.voxels)
+
+    def voxel_of(self, x, y, z):
+        """
+        Return the integer voxel coordinates holding a position.
+        """
+        size = self.voxel_size
+        return (int(np.floor(x / size)), int(np.floor(y / size)), int(np.floor(z / size)))
+
+    def add_sample(self, x, y, z, dwell=0.0):
+        """
+        Add one sample in O(1).
+
+        Parameters:
+        x, y, z (float): The position in mm.
+        dwell (float): The time in ms spent at this sample.
+        """
+        key = self.voxel_of(x, y, z)
+        entry = self.voxels.get(key)
+        if entry is None:
+            self.voxels[key] = [1, float(dwell)]
+        else:
+            entry[0] += 1
+            entry[1] += dwell
+
+    def add_samples(self, points, dwell=None):
+        """
+        Add many samples at once. Work in Python is proportional to the number of distinct voxels visited.
+
+        Parameters:
+        points (np.array): A (samples, 3) array of positions in mm.
+        dwell (np.array, optional): The time in ms spent at each sample. Defaults to zero.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        if points.size == 0:
+            return
+        keys = np.floor(points / self.voxel_size).astype(np.int64)
+        unique_keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        counts = np.bincount(inverse, minlength=len(unique_keys))
+        dwells = np.zeros(len(unique_keys)) if dwell is None else np.bincount(inverse, weights=np.asarray(dwell, dtype=np.float64), minlength=len(unique_keys))
+
+        for key, count, total in zip(map(tuple, unique_keys.tolist()), counts.tolist(), dwells.tolist()):
+            entry = self.voxels.get(key)
+            if entry is None:
+                self.voxels[key] = [count, total]
+            else:
+                entry[0] += count
+                entry[1] += total
+
+    def add_case(self, X, Y, Z, T, start=None, stop=None, coil=0, case_id=None):
+        """
+        Add the samples of one coil of a case between two frames, with the time until the next sample as dwell time.
+
+        Parameters:
+        X, Y, Z (list or np.array): The (frames, coils) coordinates.
+        T (list or np.array): The (frames,) sample times in ms.
+        start (int, optional): The first frame.
+        stop (int, optional): The frame after the last one.
+        coil (int): The coil to add, 0 being the tip.
+        case_id (str, optional): Recorded so the case is not added twice by update_cohort_grid.
+        """
+        window = slice(start, stop)
+        points = np.column_stack([np.asarray(values)[window, coil] for values in (X, Y, Z)])
+        times = np.asarray(T, dtype=np.float64)[window]
+        dwell = np.append(np.diff(times), 0.0) if times.size else times
+        self.add_samples(points, dwell)
+        if case_id is not None:
+            self.case_ids.add(case_id)
+
+    def merge(self, other):
+        """
+        Add the counts and dwell times of another grid with the same voxel size to this one.
+
+        Returns:
+        VoxelGrid: This grid.
+        """
+        if other.voxel_size != self.voxel_size:
+            raise ValueError(f'Cannot merge grids with voxel sizes {self.voxel_size} and {other.voxel_size}')
+        if other.selection != self.selection:
+            raise ValueError(f'Cannot merge grids of different samples: {self.selection} and {other.selection}')
+        for key, (count, dwell) in other.voxels.items():
+            entry = self.voxels.get(key)
+            if entry is None:
+                self.voxels[key] = [count, dwell]
+            else:
+                entry[0] += count
+                entry[1] += dwell
+        self.case_ids |= other.case_ids
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def to_arrays(self):
+        """
+        Return the grid as arrays.
+
+        Returns:
+        tuple: (voxels, 3) int64 voxel coordinates, (voxels,) int64 counts and (voxels,) float64 dwell times.
+        """
+        if not self.voxels:
+            return np.zeros((0, 3), dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        keys = np.array(list(self.voxels.keys()), dtype=np.int64)
+        values = np.array(list(self.voxels.values()), dtype=np.float64)
+        return keys, values[:, 0].astype(np.int64), values[:, 1]
+
+    def save(self, path):
+        """
+        Save the grid to a .npz file.
+        """
+        keys, counts, dwells = self.to_arrays()
+        np.savez(
+            path, voxel_size=self.voxel_size, keys=keys, counts=counts, dwells=dwells,
+            case_ids=np.array(sorted(self.case_ids), dtype=str), selection=json.dumps(self.selection)
+        )
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a grid saved with save().
+        """
+        with np.load(path) as data:
+            selection = json.loads(str(data['selection'])) if 'selection' in data.files else None
+            grid = cls(float(data['voxel_size']), selection)
+            for key, count, dwell in zip(map(tuple, data['keys'].tolist()), data['counts'].tolist(), data['dwells'].tolist()):
+                grid.voxels[key] = [count, dwell]
+            grid.case_ids = set(data['case_ids'].tolist())
+        return grid
+
+    def get_bounds(self):
+        """
+        Return the smallest and largest voxel coordinates, as two (3,) arrays.
+        """
+        keys = self.to_arrays()[0]
+        if keys.size == 0:
+            raise ValueError('An empty grid has no bounds')
+        return keys.min(axis=0), keys.max(axis=0)
+
+    def project(self, axis='x', value='count', reduce='sum'):
+        """
+        Project the grid onto the plane perpendicular to an axis, for plotting with imshow.
+
+        Parameters:
+        axis (str): The axis projected away: 'x', 'y' or 'z'.
+        value (str): 'count' for samples, 'dwell' for dwell time in ms, or 'occupied' for visited voxels.
+        reduce (str): 'sum' or 'max' along the projected axis.
+
+        Returns:
+        tuple: A 2D array indexed [first remaining axis, second remaining axis] and its
+               (min, max, min, max) extent in mm, in the order of the remaining axes.
+               An empty grid gives a (0, 0) array and a zero extent.
+        """
+        if not self.voxels:
+            return np.zeros((0, 0)), (0.0, 0.0, 0.0, 0.0)
+        keys, counts, dwells = self.to_arrays()
+        values = {'count': counts.astype(np.float64), 'dwell': dwells, 'occupied': np.ones(len(counts))}[value]
+        kept = [index for index in range(3) if index != AXES[axis]]
+        low, high = self.get_bounds()
+        shape = tuple(high[kept] - low[kept] + 1)
+        rows, columns = (keys[:, kept] - low[kept]).T
+
+        image = np.zeros(shape)
+        if reduce == 'sum':
+            np.add.at(image, (rows, columns), values)
+        else:
+            np.maximum.at(image, (rows, columns), values)
+        size = self.voxel_size
+        extent = (float(low[kept[0]] * size), float((high[kept[0]] + 1) * size), float(low[kept[1]] * size), float((high[kept[1]] + 1) * size))
+        return image, extent
+
+    def slice(self, axis='x', position=0.0, value='count'):
+        """
+        Return the voxels in the layer that contains position along an axis, as a 2D array.
+
+        Parameters:
+        axis (str): The axis the slice is perpendicular to.
+        position (float): The position of the slice in mm.
+        value (str): 'count', 'dwell' or 'occupied'.
+
+        Returns:
+        tuple: A 2D array and its extent, as for project().
+        """
+        layer = int(np.floor(position / self.voxel_size))
+        selected = VoxelGrid(self.voxel_size, self.selection)
+        selected.voxels = {key: entry for key, entry in self.voxels.items() if key[AXES[axis]] == layer}
+        return selected.project(axis, value)
+
+
+def update_cohort_grid(source_path, meta_path='SIMMETA.txt', grid_path=None, voxel_size=5.0, phase='insertion', cache_dir=None):
+    """
+    Build the coverage grid of the cohort, or update a saved one with the cases it does not hold yet.
+
+    Parameters:
+    source_path (str): The base directory containing the case directories.
+    meta_path (str): The path of SIMMETA.txt.
+    grid_path (str, optional): A .npz grid to update and save back. It must have been built with the same
+                               voxel_size and phase, otherwise a ValueError is raised.
+    voxel_size (float): The voxel size in mm.
+    phase (str): 'insertion' (start to cecum), 'withdrawal' (cecum to end) or 'all', see PHASES.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+
+    Returns:
+    VoxelGrid: The cohort grid.
+    """
+    start, stop = PHASES[phase]
+    selection = {'phase': phase, 'start': start, 'stop': stop, 'coil': 0}
+
+    if grid_path is not None and os.path.exists(grid_path):
+        grid = VoxelGrid.load(grid_path)
+        if grid.voxel_size != float(voxel_size):
+            raise ValueError(f'{grid_path} has voxel size {grid.voxel_size}, not {float(voxel_size)}')
+        if grid.selection != selection:
+            raise ValueError(f'{grid_path} holds {grid.selection}, not {selection}')
+    else:
+        grid = VoxelGrid(voxel_size, selection)
+
+    for case_ids in core.read_simmeta(meta_path).values():
+        for case_id in case_ids:
+            if case_id in grid.case_ids:
+                continue
+            path = os.path.join(source_path, case_id)
+            X, Y, Z, T = core.get_all_lists_from_path(path, cache_dir)
+            landmarks = dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(path, T)))
+            window = [None if name is None else landmarks[name] for name in (start, stop)]
+            grid.add_case(X, Y, Z, T, *window, case_id=case_id)
+
+    if grid_path is not None:
+        grid.save(grid_path)
+    return grid
@@ -0,0 +1,322 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import core
+from coil_array import CoilArray
+
+
+LANDMARK_NAMES = ('cecum', 'flexur_L', 'flexur_R', 'end', 'start')
+
+
+def get_nbytes(data):
+    """
+    The memory held by the coordinate and time arrays of loaded case data.
+    """
+    return sum(data[name].nbytes for name in 'XYZT')
+
+
+class Case:
+    """
+    One processed case. Coordinates, times, landmarks and events are read on first access.
+
+    Parameters:
+    case_id (str): The case ID, which is also the name of the case directory.
+    path (str): The directory of the case.
+    group_key (str, optional): The group key from SIMMETA.txt.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    dataset (Dataset, optional): The dataset whose LRU cache holds the loaded data.
+    """
+
+    def __init__(self, case_id, path, group_key=None, cache_dir=None, dataset=None):
+        self.case_id = case_id
+        self.path = path
+        self.group_key = group_key
+        self.cache_dir = cache_dir
+        self.dataset = dataset
+        self._data = None
+        # Held while the case is read, so threads loading the same case read it once
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'Case({self.case_id!r}, group_key={self.group_key!r}, loaded={self.is_loaded})'
+
+    @property
+    def is_loaded(self):
+        return self._data is not None
+
+    def load(self):
+        """
+        Read the case from disk if it is not loaded, and return its data.
+
+        Returns:
+        dict: 'X', 'Y', 'Z' as (frames, coils) arrays, 'T' as a (frames,) array, 'landmarks' as a dictionary
+              of landmark indexes and 'events' as a dictionary of event indexes.
+        """
+        data = self._data
+        if data is None:
+            with self._lock:
+                data = self._data
+                if data is None:
+                    X, Y, Z, T = core.get_all_lists_from_path(self.path, self.cache_dir)
+                    X, Y, Z, T = (np.asarray(values, dtype=np.float64) if self.cache_dir is None else values for values in (X, Y, Z, T))
+                    data = {
+                        'X': X,
+                        'Y': Y,
+                        'Z': Z,
+                        'T': T,
+                        'landmarks': dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(self.path, T))),
+                        'events': dict(core.get_event_indexes(self.path, T))
+                    }
+                    self._data = data
+        # The dataset lock is only taken after the case lock is released
+        if self.dataset is not None:
+            self.dataset._touch(self, get_nbytes(data))
+        return data
+
+    def unload(self):
+        """
+        Drop the loaded data. It is read again on the next access.
+        """
+        if self.dataset is not None:
+            self.dataset._forget(self)
+        self._data = None
+
+    @property
+    def nbytes(self):
+        """
+        The memory held by the loaded coordinate and time arrays (0 when not loaded).
+        """
+        data = self._data
+        return 0 if data is None else get_nbytes(data)
+
+    @property
+    def X(self):
+        return self.load()['X']
+
+    @property
+    def Y(self):
+        return self.load()['Y']
+
+    @property
+    def Z(self):
+        return self.load()['Z']
+
+    @property
+    def T(self):
+        return self.load()['T']
+
+    @property
+    def landmarks(self):
+        return self.load()['landmarks']
+
+    @property
+    def events(self):
+        return self.load()['events']
+
+    @property
+    def coil_array(self):
+        """
+        The coordinates and times as a (frames, coils, 3) CoilArray.
+        """
+        data = self.load()
+        return CoilArray.from_lists(data['X'], data['Y'], data['Z'], data['T'])
+
+    def get_tip(self, start=None, stop=None):
+        """
+        Return the tip (first coil) coordinates between two frame indexes.
+
+        Parameters:
+        start (int or str, optional): The first frame, or a landmark name such as 'start'.
+        stop (int or str, optional): The frame after the last one, or a landmark name such as 'cecum'.
+
+        Returns:
+        np.array: A (frames, 3) array of X, Y, Z tip coordinates.
+        """
+        data = self.load()
+        start = data['landmarks'][start] if isinstance(start, str) else start
+        stop = data['landmarks'][stop] if isinstance(stop, str) else stop
+        return np.column_stack([data[name][start:stop, 0] for name in 'XYZ'])
+
+
+def prefetch_cases(cases, depth=2, workers=2, memory_cap=None):
+    """
+    Iterate over cases while the next ones are read in background threads.
+
+    Cases are yielded loaded and in the order given, whatever order the threads finish in. Reading a case
+    is mostly waiting for the disk, so the next cases are read while the consumer works on the current one.
+
+    Parameters:
+    cases (iterable): The Case objects, read lazily, so a generator keeps only the read-ahead cases in memory.
+    depth (int): The number of cases read ahead of the consumer. 0 reads each case when it is reached.
+    workers (int): The number of reading threads.
+    memory_cap (int, optional): Stop reading ahead while the read-ahead cases hold this many bytes. Cases
+                                still being read count as the average size of the cases read so far.
+
+    Returns:
+    generator: The loaded cases. An error while reading a case is raised when that case is reached.
+    """
+    if depth <= 0:
+        for case in cases:
+            case.load()
+            yield case
+        return
+
+    cases = iter(cases)
+    pending = deque()
+    loaded_sizes = []
+
+    def estimate_bytes():
+        average = sum(loaded_sizes) / len(loaded_sizes) if loaded_sizes else 0
+        return sum(case.nbytes if future.done() else average for case, future in pending)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def fill():
+            while len(pending) < depth:
+                # At least one case is always read ahead, even when a single case exceeds the cap
+                if memory_cap is not None and pending and estimate_bytes() >= memory_cap:
+                    return
+                case = next(cases, None)
+                if case is None:
+                    return
+                pending.append((case, executor.submit(case.load)))
+
+        try:
+            fill()
+            while pending:
+                case, future = pending.popleft()
+                future.result()
+                loaded_sizes.append(case.nbytes)
+                fill()
+                yield case
+        finally:
+            # When the consumer stops early, cases that have not started are not read
+            for _, future in pending:
+                future.cancel()
+
+
+class Dataset:
+    """
+    A processed delivery directory, iterated as Case objects.
+
+    The loaded data of recently used cases is kept in an LRU cache. When the loaded arrays
+    exceed memory_budget bytes, the least recently used cases are unloaded.
+
+    Parameters:
+    source_path (str): The base directory containing the case directories.
+    meta_path (str, optional): The path of SIMMETA.txt. When it does not exist, every directory in
+                               source_path holding a T.txt is a case, without a group key.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    memory_budget (int): The maximum number of bytes of loaded arrays kept in memory.
+    """
+
+    def __init__(self, source_path, meta_path='SIMMETA.txt', cache_dir=None, memory_budget=2 * 1024 ** 3):
+        self.source_path = source_path
+        self.cache_dir = cache_dir
+        self.memory_budget = memory_budget
+        self._loaded = OrderedDict()
+        self._loaded_bytes = 0
+        self._lock = threading.Lock()
+
+        if meta_path is not None and os.path.exists(meta_path):
+            groups = core.read_simmeta(meta_path)
+        else:
+            groups = {None: sorted(
+                name for name in os.listdir(source_path) if os.path.exists(os.path.join(source_path, name, 'T.txt'))
+            )}
+
+        self.cases = OrderedDict()
+        for group_key, case_ids in groups.items():
+            for case_id in case_ids:
+                self.cases[case_id] = Case(case_id, os.path.join(source_path, case_id), group_key, cache_dir, self)
+
+    def __len__(self):
+        return len(self.cases)
+
+    def __iter__(self):
+        return iter(self.cases.values())
+
+    def __getitem__(self, case_id):
+        return self.cases[case_id]
+
+    def __contains__(self, case_id):
+        return case_id in self.cases
+
+    @property
+    def groups(self):
+        """
+        A dictionary mapping each group key to the list of its case IDs.
+        """
+        results = {}
+        for case in self.cases.values():
+            results.setdefault(case.group_key, []).append(case.case_id)
+        return results
+
+    def by_group(self, group_key):
+        """
+        Return the cases of one group, in SIMMETA.txt order.
+        """
+        return [case for case in self.cases.values() if case.group_key == group_key]
+
+    def prefetch(self, case_ids=None, depth=2, workers=2, memory_cap=None):
+        """
+        Iterate over cases with the next ones read in background threads, see prefetch_cases.
+
+        Parameters:
+        case_ids (list, optional): The cases to iterate over, in this order. Defaults to all, group by group as read_simmeta returns them.
+        depth (int): The number of cases read ahead of the consumer.
+        workers (int): The number of reading threads.
+        memory_cap (int, optional): The maximum number of bytes held by the read-ahead cases.
+
+        Returns:
+        generator: The loaded cases.
+        """
+        case_ids = list(self.cases) if case_ids is None else case_ids
+        return prefetch_cases((self.cases[case_id] for case_id in case_ids), depth, workers, memory_cap)
+
+    @property
+    def loaded_bytes(self):
+        """
+        The memory currently held by loaded cases.
+        """
+        with self._lock:
+            return self._loaded_bytes
+
+    def _touch(self, case, nbytes):
+        """
+        Mark a case as most recently used and unload the oldest cases while over the memory budget.
+        The case just used is never unloaded, even when it alone exceeds the budget.
+
+        The size of a case is recorded when it is admitted and subtracted again when it leaves,
+        so the total stays right however the case is unloaded.
+        """
+        with self._lock:
+            if case.case_id in self._loaded:
+                self._loaded.move_to_end(case.case_id)
+                return
+            self._loaded[case.case_id] = (case, nbytes)
+            self._loaded_bytes += nbytes
+            while self._loaded_bytes > self.memory_budget and len(self._loaded) > 1:
+                _, (oldest, oldest_bytes) = self._loaded.popitem(last=False)
+                self._loaded_bytes -= oldest_bytes
+                oldest._data = None
+
+    def _forget(self, case):
+        """
+        Remove a case that is being unloaded from the LRU cache.
+        """
+        with self._lock:
+            entry = self._loaded.pop(case.case_id, None)
+            if entry is not None:
+                self._loaded_bytes -= entry[1]
+
+    def clear(self):
+        """
+        Unload every loaded case.
+        """
+        with self._lock:
+            for case, _ in self._loaded.values():
+                case._data = None
+            self._loaded.clear()
+            self._loaded_bytes = 0
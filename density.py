@@ -0,0 +1,178 @@
+import numpy as np
+
+
+# The kernel is cut off at this many standard deviations
+KERNEL_TRUNCATE = 4.0
+
+# The binned grid is padded by at most this many grid widths per side
+MAX_PADDING = 2
+
+
+def kde_bandwidth_factor(n, bw_method=None, dimensions=2):
+    """
+    Return the bandwidth factor used by scipy.stats.gaussian_kde.
+
+    Parameters:
+    n (int): The number of data points.
+    bw_method (str, float or None): 'scott' (default), 'silverman' or a fixed factor.
+    dimensions (int): The number of dimensions of the data.
+
+    Returns:
+    float: The factor the data covariance is scaled by (squared) to get the kernel covariance.
+    """
+    if bw_method is None or bw_method == 'scott':
+        return n ** (-1. / (dimensions + 4))
+    if bw_method == 'silverman':
+        return (n * (dimensions + 2) / 4.) ** (-1. / (dimensions + 4))
+    if np.isscalar(bw_method) and not isinstance(bw_method, str):
+        return float(bw_method)
+    raise ValueError("bw_method should be 'scott', 'silverman' or a number")
+
+
+def get_grid_extent(x, y, extent=None):
+    """
+    Return the (x_min, x_max, y_min, y_max) extent of the grid, defaulting to the data range.
+
+    Parameters:
+    x (np.array): The horizontal coordinates.
+    y (np.array): The vertical coordinates.
+    extent (tuple, optional): A fixed extent to use instead of the data range.
+
+    Returns:
+    tuple: The extent, widened by 0.5 on both sides of an axis with zero range.
+    """
+    if extent is None:
+        extent = (np.min(x), np.max(x), np.min(y), np.max(y))
+    x_min, x_max, y_min, y_max = (float(value) for value in extent)
+    if x_max == x_min:
+        x_min, x_max = x_min - 0.5, x_max + 0.5
+    if y_max == y_min:
+        y_min, y_max = y_min - 0.5, y_max + 0.5
+    return x_min, x_max, y_min, y_max
+
+
+def bin_points(x, y, gridsize, extent):
+    """
+    Spread points linearly over the four surrounding nodes of a regular grid.
+
+    Parameters:
+    x (np.array): The horizontal coordinates.
+    y (np.array): The vertical coordinates.
+    gridsize (tuple): The number of grid nodes (nx, ny).
+    extent (tuple): The (x_min, x_max, y_min, y_max) position of the outer grid nodes.
+
+    Returns:
+    np.array: A (nx, ny) array of point weights. Points outside the extent are dropped.
+    """
+    nx, ny = gridsize
+    x_min, x_max, y_min, y_max = extent
+    gx = (x - x_min) / (x_max - x_min) * (nx - 1)
+    gy = (y - y_min) / (y_max - y_min) * (ny - 1)
+    inside = (gx >= 0) & (gx <= nx - 1) & (gy >= 0) & (gy <= ny - 1)
+    gx, gy = gx[inside], gy[inside]
+
+    ix = np.minimum(np.floor(gx).astype(np.int64), nx - 2)
+    iy = np.minimum(np.floor(gy).astype(np.int64), ny - 2)
+    fx = gx - ix
+    fy = gy - iy
+
+    weights = np.zeros(nx * ny)
+    for dx, dy, w in ((0, 0, (1 - fx) * (1 - fy)), (1, 0, fx * (1 - fy)), (0, 1, (1 - fx) * fy), (1, 1, fx * fy)):
+        weights += np.bincount((ix + dx) * ny + (iy + dy), weights=w, minlength=nx * ny)
+    return weights.reshape(nx, ny)
+
+
+def gaussian_kernel_grid(covariance, spacing, gridsize, truncate=KERNEL_TRUNCATE):
+    """
+    Sample a 2D Gaussian density on grid offsets around its centre.
+
+    Parameters:
+    covariance (np.array): The 2x2 kernel covariance.
+    spacing (tuple): The grid spacing (dx, dy).
+    gridsize (tuple): The number of grid nodes (nx, ny), which bounds the kernel size.
+    truncate (float): The kernel is cut off at this many standard deviations.
+
+    Returns:
+    np.array: A (2 * Lx + 1, 2 * Ly + 1) array of kernel values.
+    """
+    sigma = np.sqrt(np.diag(covariance))
+    half = [int(min(n - 1, np.ceil(truncate * s / d))) for s, d, n in zip(sigma, spacing, gridsize)]
+    ox = np.arange(-half[0], half[0] + 1) * spacing[0]
+    oy = np.arange(-half[1], half[1] + 1) * spacing[1]
+    offsets = np.stack(np.meshgrid(ox, oy, indexing='ij'), axis=-1)
+
+    inverse = np.linalg.inv(covariance)
+    exponent = np.einsum('...i,ij,...j->...', offsets, inverse, offsets)
+    return np.exp(-0.5 * exponent) / (2 * np.pi * np.sqrt(np.linalg.det(covariance)))
+
+
+def fft_convolve_same(image, kernel):
+    """
+    Convolve an image with an odd-sized kernel through FFT, keeping the image size (zero padded).
+
+    Parameters:
+    image (np.array): The 2D image.
+    kernel (np.array): The 2D kernel with odd side lengths.
+
+    Returns:
+    np.array: The convolved image with the shape of image.
+    """
+    lx, ly = kernel.shape[0] // 2, kernel.shape[1] // 2
+    shape = (image.shape[0] + 2 * lx, image.shape[1] + 2 * ly)
+    spectrum = np.fft.rfft2(image, shape) * np.fft.rfft2(kernel, shape)
+    full = np.fft.irfft2(spectrum, shape)
+    return full[lx:lx + image.shape[0], ly:ly + image.shape[1]]
+
+
+def kde_grid(x, y, gridsize=400, bw_method=None, extent=None, exact=False):
+    """
+    Estimate a 2D Gaussian kernel density on a regular grid.
+
+    The kernel matches scipy.stats.gaussian_kde (full data covariance scaled by the bandwidth
+    factor). By default the points are binned onto the grid and convolved with the kernel
+    through FFT, which costs O(points + grid log grid). exact=True evaluates gaussian_kde
+    on every grid node instead, for validation.
+
+    With an extent narrower than the data, the binned grid is padded by the kernel radius
+    (KERNEL_TRUNCATE standard deviations, at most MAX_PADDING grid widths per side), so points
+    outside the extent still add their tails near the edges, as in the exact KDE.
+
+    Parameters:
+    x (list or np.array): The horizontal coordinates.
+    y (list or np.array): The vertical coordinates.
+    gridsize (int or tuple): The number of grid nodes per axis, or (nx, ny), at least 2.
+    bw_method (str, float or None): The bandwidth, as for gaussian_kde.
+    extent (tuple, optional): The (x_min, x_max, y_min, y_max) of the grid. Defaults to the data range.
+    exact (bool): Evaluate the exact KDE instead of the binned approximation.
+
+    Returns:
+    tuple: A (nx, ny) density array indexed [x, y] like np.mgrid, and the extent used.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    nx, ny = (gridsize, gridsize) if np.isscalar(gridsize) else gridsize
+    if nx < 2 or ny < 2:
+        raise ValueError(f'gridsize should be at least 2 nodes per axis, not {gridsize}')
+    extent = get_grid_extent(x, y, extent)
+    x_min, x_max, y_min, y_max = extent
+
+    if exact:
+        from scipy.stats import gaussian_kde
+        x_grid, y_grid = np.mgrid[x_min:x_max:complex(nx), y_min:y_max:complex(ny)]
+        kde = gaussian_kde(np.vstack([x, y]), bw_method=bw_method)
+        return np.reshape(kde.evaluate(np.vstack([x_grid.ravel(), y_grid.ravel()])), x_grid.shape), extent
+
+    factor = kde_bandwidth_factor(x.size, bw_method)
+    covariance = np.atleast_2d(np.cov(np.vstack([x, y]))) * factor ** 2
+    spacing = ((x_max - x_min) / (nx - 1), (y_max - y_min) / (ny - 1))
+
+    # Bin onto a grid padded by the kernel radius, so points outside an explicit extent still add their tails
+    sigma = np.sqrt(np.diag(covariance))
+    pad_x, pad_y = (int(min(np.ceil(KERNEL_TRUNCATE * s / d), MAX_PADDING * (n - 1))) for s, d, n in zip(sigma, spacing, (nx, ny)))
+    padded_size = (nx + 2 * pad_x, ny + 2 * pad_y)
+    padded_extent = (x_min - pad_x * spacing[0], x_max + pad_x * spacing[0], y_min - pad_y * spacing[1], y_max + pad_y * spacing[1])
+
+    weights = bin_points(x, y, padded_size, padded_extent) / x.size
+    kernel = gaussian_kernel_grid(covariance, spacing, padded_size, KERNEL_TRUNCATE)
+    density = fft_convolve_same(weights, kernel)[pad_x:pad_x + nx, pad_y:pad_y + ny]
+    return np.maximum(density, 0), extent
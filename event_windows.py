@@ -0,0 +1,79 @@
+'''
+Event-centred sample extraction across the cohort.
+
+The events table of the case index (case_index.build_case_index) holds every logged event of every case
+with its aligned frame. extract_event_windows selects events from it, such as every 'Polyp', and cuts the
+coordinates around each one. The windows are resampled onto one time grid relative to the event, so
+all of them stack into a single (events, samples, coils, 3) array, for example tip coordinates for
+5 s before to 5 s after every Polyp event of every case.
+
+Each case is read once for all of its events. With cache_dir set, the case arrays are memory-mapped and
+only the pages around the events are read. A ColumnarReader (columnar.py) can be given instead to read
+from a single exported file.
+'''
+
+import numpy as np
+import core
+import case_index
+from resampling import interpolate_frames
+
+
+def extract_event_windows(db_path, event=None, contains=None, group=None, before_s=5.0, after_s=5.0, step_ms=50.0,
+                          coils=(0,), cache_dir=None, reader=None):
+    """
+    Extract the coordinates around every selected event of the cohort as one stacked array.
+
+    Parameters:
+    db_path (str): The case index built with case_index.build_case_index.
+    event (str or list, optional): Only events with exactly this text, see case_index.query_events.
+    contains (str, optional): Only events whose text contains this string.
+    group (str or list, optional): Only events of cases of these group keys.
+    before_s (float): Seconds before the event.
+    after_s (float): Seconds after the event.
+    step_ms (float): The spacing of the common time grid in ms.
+    coils (tuple): The coils to extract, 0 being the tip. None extracts all coils.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    reader (ColumnarReader, optional): Read the cases from a columnar export instead of the case directories.
+
+    Returns:
+    dict: 'coords' as an (events, samples, coils, 3) array, NaN where the window runs past the recording,
+          'mask' as the (events, samples) boolean mask of available samples, 'offsets' as the (samples,) grid
+          in ms relative to the event, and 'case_id', 'event', 'time' and 'frame' with one entry per event.
+    """
+    rows = [row for row in case_index.query_events(db_path, event, contains, group) if row['frame'] is not None and row['frame'] >= 0]
+    offsets = np.arange(-before_s * 1000, after_s * 1000 + step_ms / 2, step_ms)
+
+    windows = []
+    masks = []
+    loaded_case = None
+    for row in rows:
+        if loaded_case != row['case_id']:
+            # Rows are ordered by case, so every case is read once
+            if reader is not None:
+                X, Y, Z, T = reader.read_case(row['case_id'])
+            else:
+                X, Y, Z, T = core.get_all_lists_from_path(row['case_dir'], cache_dir)
+            X, Y, Z = (np.asarray(values) for values in (X, Y, Z))
+            T = np.asarray(T, dtype=np.float64)
+            selected = list(range(X.shape[1])) if coils is None else list(coils)
+            loaded_case = row['case_id']
+
+        center = T[row['frame']]
+        # Only the frames inside the window (plus one on each side for interpolation) are read
+        low = max(int(np.searchsorted(T, center + offsets[0], side='left')) - 1, 0)
+        high = min(int(np.searchsorted(T, center + offsets[-1], side='right')) + 1, len(T))
+        points = np.stack([values[low:high][:, selected] for values in (X, Y, Z)], axis=-1)
+        window, mask = interpolate_frames(points, T[low:high] - center, offsets)
+        windows.append(window)
+        masks.append(mask)
+
+    n_coils = len(coils) if coils is not None else (windows[0].shape[1] if windows else 0)
+    return {
+        'coords': np.array(windows).reshape(len(rows), len(offsets), n_coils, 3),
+        'mask': np.array(masks, dtype=bool).reshape(len(rows), len(offsets)),
+        'offsets': offsets,
+        'case_id': np.array([row['case_id'] for row in rows], dtype=str),
+        'event': np.array([row['event'] for row in rows], dtype=str),
+        'time': np.array([np.nan if row['time'] is None else row['time'] for row in rows], dtype=np.float64),
+        'frame': np.array([row['frame'] for row in rows], dtype=np.int64)
+    }
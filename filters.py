@@ -0,0 +1,269 @@
+'''
+Smoothing filters along the time axis of whole coordinate blocks.
+
+Every filter works on an array of any shape along one axis (axis 0 by default), so a (frames, coils, 3)
+CoilArray block is smoothed in one call instead of one call per coil and axis. Edges are handled explicitly:
+
+- 'zeros': samples outside the recording are zero, as np.convolve(..., mode='same') does
+           (this is what pre_processing.running_average has always done, and it pulls the ends towards 0;
+           with fewer samples than the window, np.convolve returns window_size samples, and so does this mode)
+- 'nearest': the first and last sample are repeated
+- 'reflect': the samples are mirrored around the ends
+- 'shrink': the window only averages the samples that exist
+- 'valid': only positions where the whole window fits are returned, as np.convolve(..., mode='valid')
+           (with fewer samples than the window, np.convolve returns window - N + 1 copies of the total
+           over window_size, and so does this mode)
+
+moving_average_time and exponential accept sample times, for recordings with irregular T spacing.
+'''
+
+import numpy as np
+from coil_array import CoilArray
+
+
+EDGE_MODES = ('zeros', 'nearest', 'reflect', 'shrink', 'valid')
+
+
+def _pad(data, before, after, edge):
+    """
+    Pad axis 0 of an array with an edge mode.
+    """
+    pad_width = [(before, after)] + [(0, 0)] * (data.ndim - 1)
+    if edge in ('zeros', 'shrink'):
+        return np.pad(data, pad_width, mode='constant')
+    if edge == 'nearest':
+        return np.pad(data, pad_width, mode='edge')
+    if edge == 'reflect':
+        return np.pad(data, pad_width, mode='symmetric')
+    raise ValueError(f'edge should be one of {EDGE_MODES}, not {edge!r}')
+
+
+def _window_sums(data, window_size):
+    """
+    Sums of every window of window_size consecutive samples along axis 0.
+
+    Short windows add shifted views, which is as exact as np.convolve. Long windows use a cumulative
+    sum, whose rounding error grows with the magnitude of the running total.
+    """
+    count = len(data) - window_size + 1
+    if count <= 0:
+        return np.zeros((0,) + data.shape[1:])
+    if window_size <= 64:
+        sums = data[:count].copy()
+        for shift in range(1, window_size):
+            sums += data[shift:shift + count]
+        return sums
+    cumulative = np.cumsum(data, axis=0)
+    cumulative = np.concatenate([np.zeros((1,) + data.shape[1:]), cumulative])
+    return cumulative[window_size:] - cumulative[:-window_size]
+
+
+def moving_average(data, window_size, axis=0, edge='zeros'):
+    """
+    Centred moving average along one axis, in one pass over the array.
+
+    The window of sample i covers samples i - window_size // 2 to i + (window_size - 1) // 2,
+    the same samples as np.convolve(data, np.ones(window_size) / window_size, mode='same').
+
+    Parameters:
+    data (list or np.array): The samples, for example a (frames, coils, 3) block.
+    window_size (int): The number of samples averaged.
+    axis (int): The time axis.
+    edge (str): How the ends are handled, one of EDGE_MODES.
+
+    Returns:
+    np.array: The smoothed samples, of the same shape as data ('valid' has |len(data) - window_size| + 1 samples,
+              'zeros' has window_size samples when data is shorter than the window).
+    """
+    data = np.moveaxis(np.asarray(data, dtype=np.float64), axis, 0)
+    if edge == 'zeros' and 0 < len(data) < window_size:
+        # np.convolve(..., mode='same') keeps the longer input, the window: the centred window_size samples
+        # of the full convolution
+        first = (len(data) - 1) // 2
+        smoothed = _window_sums(_pad(data, window_size - 1, window_size - 1, edge), window_size)[first:first + window_size] / window_size
+    elif edge == 'valid' and len(data) < window_size:
+        smoothed = np.repeat(data.sum(axis=0, keepdims=True) / window_size, window_size - len(data) + 1, axis=0)
+    elif edge == 'valid':
+        smoothed = _window_sums(data, window_size) / window_size
+    else:
+        before, after = window_size // 2, (window_size - 1) // 2
+        sums = _window_sums(_pad(data, before, after, edge), window_size)
+        if edge == 'shrink':
+            counts = _window_sums(_pad(np.ones(len(data)), before, after, 'zeros'), window_size)
+            smoothed = sums / counts.reshape((-1,) + (1,) * (data.ndim - 1))
+        else:
+            smoothed = sums / window_size
+    return np.moveaxis(smoothed, 0, axis)
+
+
+def moving_average_time(data, T, window_ms, axis=0):
+    """
+    Centred moving average over a time window, for irregularly spaced samples.
+
+    Each sample is replaced by the mean of all samples within window_ms / 2 of it. At the ends
+    the window holds fewer samples ('shrink').
+
+    Parameters:
+    data (np.array): The samples, for example a (frames, coils, 3) block.
+    T (np.array): The ascending sample times in ms, one per sample along axis.
+    window_ms (float): The width of the window in ms.
+    axis (int): The time axis.
+
+    Returns:
+    np.array: The smoothed samples, of the same shape as data.
+    """
+    data = np.moveaxis(np.asarray(data, dtype=np.float64), axis, 0)
+    T = np.asarray(T, dtype=np.float64)
+    low = np.searchsorted(T, T - window_ms / 2, side='left')
+    high = np.searchsorted(T, T + window_ms / 2, side='right')
+    cumulative = np.concatenate([np.zeros((1,) + data.shape[1:]), np.cumsum(data, axis=0)])
+    counts = (high - low).reshape((-1,) + (1,) * (data.ndim - 1))
+    return np.moveaxis((cumulative[high] - cumulative[low]) / counts, 0, axis)
+
+
+def savgol(data, window_size, polyorder=2, axis=0, edge='interp', deriv=0, delta=1.0):
+    """
+    Savitzky-Golay filter along one axis (scipy.signal.savgol_filter).
+
+    Parameters:
+    data (np.array): The samples, for example a (frames, coils, 3) block.
+    window_size (int): The odd number of samples in each fitted window.
+    polyorder (int): The order of the fitted polynomial.
+    axis (int): The time axis.
+    edge (str): 'interp' fits a polynomial to the first and last window_size samples, or one of
+                'zeros', 'nearest' and 'reflect'.
+    deriv (int): The order of the derivative to return, 0 for the smoothed positions.
+    delta (float): The sample spacing, used for derivatives (in ms for velocities in mm/ms).
+
+    Returns:
+    np.array: The filtered samples, of the same shape as data.
+    """
+    from scipy.signal import savgol_filter
+    mode = {'interp': 'interp', 'zeros': 'constant', 'nearest': 'nearest', 'reflect': 'mirror'}[edge]
+    return savgol_filter(np.asarray(data, dtype=np.float64), window_size, polyorder, deriv=deriv, delta=delta, axis=axis, mode=mode)
+
+
+def median(data, window_size, axis=0, edge='nearest'):
+    """
+    Centred running median along one axis (scipy.ndimage.median_filter), robust to single-sample spikes.
+
+    Parameters:
+    data (np.array): The samples, for example a (frames, coils, 3) block.
+    window_size (int): The number of samples in each window.
+    axis (int): The time axis.
+    edge (str): 'zeros', 'nearest' or 'reflect'.
+
+    Returns:
+    np.array: The filtered samples, of the same shape as data.
+    """
+    from scipy.ndimage import median_filter
+    data = np.asarray(data, dtype=np.float64)
+    size = [1] * data.ndim
+    size[axis] = window_size
+    mode = {'zeros': 'constant', 'nearest': 'nearest', 'reflect': 'reflect'}[edge]
+    return median_filter(data, size=size, mode=mode)
+
+
+def _affine_scan(factors, offsets):
+    """
+    Solve y[i] = factors[i] * y[i - 1] + offsets[i] (with y[-1] = 0) for every i, in log2(frames) array passes.
+
+    Each pass composes every step with the one shift steps before it (a Hillis-Steele scan), so after
+    the pass with shift s every entry holds the map of the last 2 * s steps. With factors between 0 and 1,
+    no intermediate grows, so the result is as accurate as the sequential recursion.
+
+    Parameters:
+    factors (np.array): The (frames,) factors.
+    offsets (np.array): The (frames, values) offsets.
+
+    Returns:
+    np.array: The (frames, values) solution.
+    """
+    factors = factors.copy()
+    offsets = offsets.copy()
+    shift = 1
+    while shift < len(factors):
+        offsets[shift:] += factors[shift:, None] * offsets[:-shift]
+        factors[shift:] = factors[shift:] * factors[:-shift]
+        shift *= 2
+    return offsets
+
+
+def exponential(data, alpha=None, tau_ms=None, T=None, axis=0, zero_phase=False):
+    """
+    Exponential moving average along one axis, starting from the first sample.
+
+    With alpha, every step weighs the new sample by alpha (scipy.signal.lfilter). With tau_ms and T, the
+    weight of a step depends on the time since the previous sample, 1 - exp(-dt / tau_ms), so irregular
+    spacing and gaps are handled. That recursion is solved with a scan over the whole block, not frame by frame.
+
+    Parameters:
+    data (np.array): The samples, for example a (frames, coils, 3) block.
+    alpha (float, optional): The weight of each new sample, between 0 and 1.
+    tau_ms (float, optional): The time constant in ms, used with T instead of alpha.
+    T (np.array, optional): The ascending sample times in ms.
+    axis (int): The time axis.
+    zero_phase (bool): Filter forwards and then backwards, which removes the lag of the filter.
+
+    Returns:
+    np.array: The filtered samples, of the same shape as data.
+    """
+    data = np.moveaxis(np.asarray(data, dtype=np.float64), axis, 0)
+    if tau_ms is not None:
+        weights = 1 - np.exp(-np.diff(np.asarray(T, dtype=np.float64)) / tau_ms)
+    elif alpha is not None:
+        weights = None
+    else:
+        raise ValueError('Give alpha, or tau_ms together with T')
+
+    def run(samples, step_weights):
+        if len(samples) == 0:
+            return samples.copy()
+        # Filter every coil and axis as one row of a contiguous (values, frames) block
+        flat = np.ascontiguousarray(samples.reshape(len(samples), -1).T)
+        if step_weights is None:
+            from scipy.signal import lfilter
+            # y[i] = alpha * x[i] + (1 - alpha) * y[i - 1], started at y[0] = x[0]
+            initial = (1 - alpha) * flat[:, :1]
+            smoothed = lfilter([alpha], [1, alpha - 1], flat, axis=-1, zi=initial)[0]
+        else:
+            # y[i] = (1 - w[i]) * y[i - 1] + w[i] * x[i], started at y[0] = x[0]
+            factors = np.concatenate([[0.0], 1 - step_weights])
+            weights = np.concatenate([[1.0], step_weights])
+            smoothed = _affine_scan(factors, weights[:, None] * flat.T).T
+        return smoothed.T.reshape(samples.shape)
+
+    smoothed = run(data, weights)
+    if zero_phase:
+        smoothed = run(smoothed[::-1], None if weights is None else weights[::-1])[::-1]
+    return np.moveaxis(smoothed, 0, axis)
+
+
+FILTERS = {
+    'moving_average': moving_average,
+    'moving_average_time': moving_average_time,
+    'savgol': savgol,
+    'median': median,
+    'exponential': exponential
+}
+
+
+def smooth_coil_array(coil_array, method='moving_average', **kwargs):
+    """
+    Smooth every coil and axis of a CoilArray in one call.
+
+    Parameters:
+    coil_array (CoilArray): The coil positions.
+    method (str): A name in FILTERS.
+    **kwargs: The parameters of the filter, such as window_size or tau_ms. The time-aware filters
+              get the sample times of the CoilArray as T.
+
+    Returns:
+    CoilArray: The smoothed positions, with the same time vector and dtype.
+    """
+    if method == 'moving_average_time' or (method == 'exponential' and 'tau_ms' in kwargs):
+        kwargs.setdefault('T', coil_array.time)
+    smoothed = FILTERS[method](coil_array.coords, **kwargs)
+    if smoothed.shape != coil_array.coords.shape:
+        raise ValueError(f"{method} changes the number of frames, use another edge mode")
+    return CoilArray(smoothed.astype(coil_array.coords.dtype, copy=False), coil_array.time)
@@ -0,0 +1,286 @@
+'''
+Opt-in timing and memory instrumentation for preprocessing and loading stages.
+
+Turn it on with enable() or by setting the environment variable COLON_PROFILE=1 (COLON_PROFILE_OUTPUT
+names a JSON lines file to stream the records to). While it is off, stage() returns a shared no-op
+context manager, so instrumented code pays one function call and one flag check per stage.
+
+    with instrumentation.stage('csv parsing', case=case_id, paths=[csv_path]):
+        data = load_coordinates_raw(csv_path)
+
+Stages may run in several threads at once, as in dataset.prefetch_cases. CPU time is measured per thread
+(time.thread_time), so it covers only the thread running the stage. The tracemalloc peak is process-wide,
+so a stage that overlaps another stage, in another thread or nested in the same one, records None as its
+peak instead of a mixed number.
+
+Process pools that collect records from their workers should start them with init_worker, so forked
+workers do not return the records they inherited from the parent.
+'''
+
+import os
+import json
+import time
+import threading
+import tracemalloc
+import functools
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+_enabled = os.environ.get('COLON_PROFILE', '') not in ('', '0')
+_output = os.environ.get('COLON_PROFILE_OUTPUT') or None
+_trace_memory = False
+_owner_pid = os.getpid()
+_records = []
+
+# The stages measuring memory right now, which share the process-wide tracemalloc peak
+_memory_stages = []
+_memory_lock = threading.Lock()
+
+
+def enable(output=None, trace_memory=False):
+    """
+    Turn instrumentation on for this process and for worker processes started afterwards.
+
+    Parameters:
+    output (str, optional): A JSON lines file each record is appended to, by this process only.
+    trace_memory (bool): Measure the peak Python/NumPy allocation of each stage with tracemalloc.
+                         This is exact but slows allocation-heavy code down noticeably.
+    """
+    global _enabled, _output, _trace_memory, _owner_pid
+    _enabled = True
+    _output = output
+    _trace_memory = trace_memory
+    _owner_pid = os.getpid()
+    os.environ['COLON_PROFILE'] = '1'
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """
+    Turn instrumentation off. Records collected so far are kept.
+    """
+    global _enabled
+    _enabled = False
+    os.environ.pop('COLON_PROFILE', None)
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled():
+    return _enabled
+
+
+def init_worker():
+    """
+    Forget the records inherited from the parent, as the initializer of a worker process.
+    With the fork start method a worker starts with a copy of the parent's records, and
+    pop_records would otherwise hand them back to the parent a second time.
+    """
+    _records.clear()
+
+
+def get_max_rss():
+    """
+    Return the peak resident memory of this process in bytes, or None where it is not available.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if os.uname().sysname == 'Darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class _NullStage:
+    """
+    The stage returned while instrumentation is off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_bytes(self, count):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """
+    Measures one run of a stage and records it on exit.
+    """
+
+    def __init__(self, name, case, paths):
+        self.name = name
+        self.case = case
+        self.paths = paths
+        self.bytes_read = 0
+        self.memory_shared = False
+
+    def add_bytes(self, count):
+        """
+        Add to the bytes read by this stage, for reads not covered by the paths given to stage().
+        """
+        self.bytes_read += count
+
+    def __enter__(self):
+        self._traced = _trace_memory and tracemalloc.is_tracing()
+        if self._traced:
+            with _memory_lock:
+                # Overlapping stages would see each other's allocations in the peak
+                for other in _memory_stages:
+                    other.memory_shared = True
+                self.memory_shared = bool(_memory_stages)
+                _memory_stages.append(self)
+                tracemalloc.reset_peak()
+                self._memory_start = tracemalloc.get_traced_memory()[0]
+        self._cpu_start = time.thread_time()
+        self._wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.thread_time() - self._cpu_start
+
+        peak = None
+        if self._traced:
+            with _memory_lock:
+                _memory_stages.remove(self)
+                if not self.memory_shared and tracemalloc.is_tracing():
+                    peak = tracemalloc.get_traced_memory()[1] - self._memory_start
+
+        bytes_read = self.bytes_read
+        for path in self.paths or ():
+            try:
+                bytes_read += os.path.getsize(path)
+            except OSError:
+                pass
+
+        record({
+            'stage': self.name,
+            'case': self.case,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'bytes_read': bytes_read,
+            'peak_bytes': peak,
+            'max_rss_bytes': get_max_rss(),
+            'pid': os.getpid(),
+            'error': None if exc_type is None else exc_type.__name__
+        })
+        return False
+
+
+def stage(name, case=None, paths=None):
+    """
+    Measure a block of code as one run of a stage.
+
+    Parameters:
+    name (str): The stage name.
+    case (str, optional): The case the stage ran for.
+    paths (list, optional): Files read by the stage. Their sizes are counted as bytes read.
+
+    Returns:
+    A context manager. Inside the block, add_bytes(count) adds to the bytes read.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, case, paths)
+
+
+def timed(name):
+    """
+    Decorate a function so each call is measured as one run of a stage.
+
+    Parameters:
+    name (str): The stage name.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Stage(name, None, None):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(entry):
+    """
+    Store a record and, in the process that enabled instrumentation, append it to the output file.
+    """
+    _records.append(entry)
+    if _output is not None and os.getpid() == _owner_pid:
+        with open(_output, 'a') as file:
+            file.write(json.dumps(entry) + '\n')
+
+
+def get_records():
+    return list(_records)
+
+
+def pop_records():
+    """
+    Return and forget the records of this process, for example to send them from a worker to the parent.
+    """
+    records = list(_records)
+    _records.clear()
+    return records
+
+
+def add_records(records):
+    """
+    Store records collected in another process.
+    """
+    for entry in records:
+        record(entry)
+
+
+def summarize(records=None):
+    """
+    Aggregate records per stage.
+
+    Parameters:
+    records (list, optional): The records to aggregate. Defaults to the records of this process.
+
+    Returns:
+    list: One dictionary per stage with 'stage', 'runs', 'wall_s', 'cpu_s', 'bytes_read' (totals)
+          and 'peak_bytes', 'max_rss_bytes' (maxima), ordered by total wall time.
+    """
+    stages = {}
+    for entry in _records if records is None else records:
+        total = stages.setdefault(entry['stage'], {
+            'stage': entry['stage'], 'runs': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'bytes_read': 0,
+            'peak_bytes': None, 'max_rss_bytes': None
+        })
+        total['runs'] += 1
+        total['wall_s'] += entry['wall_s']
+        total['cpu_s'] += entry['cpu_s']
+        total['bytes_read'] += entry['bytes_read']
+        for key in ('peak_bytes', 'max_rss_bytes'):
+            if entry[key] is not None:
+                total[key] = max(total[key] or 0, entry[key])
+    return sorted(stages.values(), key=lambda total: total['wall_s'], reverse=True)
+
+
+def print_summary(records=None):
+    """
+    Print the per-stage summary as a table.
+    """
+    def megabytes(value):
+        return '-' if value is None else f'{value / 1e6:.1f}'
+
+    print(f"{'stage':<28} {'runs':>6} {'wall s':>10} {'cpu s':>10} {'read MB':>10} {'peak MB':>9} {'max RSS MB':>11}")
+    for total in summarize(records):
+        print(
+            f"{total['stage']:<28} {total['runs']:>6} {total['wall_s']:>10.3f} {total['cpu_s']:>10.3f} "
+            f"{megabytes(total['bytes_read']):>10} {megabytes(total['peak_bytes']):>9} {megabytes(total['max_rss_bytes']):>11}"
+        )
@@ -0,0 +1,163 @@
+'''
+Per-case metrics computed from the tip and coil trajectories between the landmarks of core.get_landmark_indexes.
+
+Two trajectory ratios relate to the ideas behind the Colonoscopy Progression Score and the Colonoscopy
+Retraction Score. The published definitions of those scores are not part of this repository, so the
+ratios are named after what they compute and are not the published scores:
+
+- insertion_tip_shaft_ratio: during insertion (start to cecum), the tip path length divided by the path
+  length of the most proximal coil. Loops make the shaft move without moving the tip, which lowers the ratio.
+- withdrawal_tip_tortuosity: during withdrawal (cecum to end), the tip path length divided by the straight-line
+  distance between the tip at the cecum and at the end. Back-and-forth inspection raises the ratio.
+
+time_to_cecum_s is measured from the start landmark ('Endoscopy started'), which is the first sample
+when the log has no start event.
+
+Coil 0 is the tip and the last coil is the most proximal one, as in the processed X/Y/Z.txt files.
+'''
+
+import os
+import csv
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import core
+
+
+METRIC_NAMES = [
+    'samples', 'duration_s', 'time_to_cecum_s', 'insertion_time_s', 'withdrawal_time_s',
+    'insertion_path_mm', 'withdrawal_path_mm', 'tip_speed_mean', 'tip_speed_p10', 'tip_speed_p50', 'tip_speed_p90',
+    'insertion_tip_shaft_ratio', 'withdrawal_tip_tortuosity'
+]
+
+
+def path_lengths(points):
+    """
+    Return the length of every step of a trajectory.
+
+    Parameters:
+    points (np.array): A (frames, 3) or (frames, coils, 3) array of positions.
+
+    Returns:
+    np.array: The (frames - 1,) or (frames - 1, coils) step lengths.
+    """
+    return np.linalg.norm(np.diff(points, axis=0), axis=-1)
+
+
+def compute_case_metrics(X, Y, Z, T, landmarks):
+    """
+    Compute the metrics of one case with whole-array operations.
+
+    Parameters:
+    X, Y, Z (list or np.array): The (frames, coils) coordinates.
+    T (list or np.array): The (frames,) sample times in milliseconds.
+    landmarks (tuple): (cecum_index, flexur_L_index, flexur_R_index, end_index, start_index), as returned by core.get_landmark_indexes.
+
+    Returns:
+    dict: One value per name in METRIC_NAMES. Times are in seconds, lengths in mm and speeds in mm/s.
+          Metrics of a phase whose landmarks are missing or out of order are NaN.
+    """
+    coords = np.stack([np.asarray(X, dtype=np.float64), np.asarray(Y, dtype=np.float64), np.asarray(Z, dtype=np.float64)], axis=-1)
+    T = np.asarray(T, dtype=np.float64)
+    cecum_index, _, _, end_index, start_index = landmarks
+    tip = coords[:, 0]
+    proximal = coords[:, -1]
+
+    metrics = dict.fromkeys(METRIC_NAMES, np.nan)
+    metrics['samples'] = len(T)
+    metrics['duration_s'] = (T[-1] - T[0]) / 1000
+
+    if start_index < cecum_index:
+        metrics['time_to_cecum_s'] = (T[cecum_index] - T[start_index]) / 1000
+
+    if start_index < cecum_index:
+        insertion = slice(start_index, cecum_index + 1)
+        tip_path = path_lengths(tip[insertion]).sum()
+        shaft_path = path_lengths(proximal[insertion]).sum()
+        metrics['insertion_time_s'] = (T[cecum_index] - T[start_index]) / 1000
+        metrics['insertion_path_mm'] = tip_path
+        metrics['insertion_tip_shaft_ratio'] = tip_path / shaft_path if shaft_path > 0 else np.nan
+
+    if cecum_index < end_index:
+        withdrawal = slice(cecum_index, end_index + 1)
+        tip_path = path_lengths(tip[withdrawal]).sum()
+        net_distance = np.linalg.norm(tip[end_index] - tip[cecum_index])
+        metrics['withdrawal_time_s'] = (T[end_index] - T[cecum_index]) / 1000
+        metrics['withdrawal_path_mm'] = tip_path
+        metrics['withdrawal_tip_tortuosity'] = tip_path / net_distance if net_distance > 0 else np.nan
+
+    if start_index < end_index:
+        procedure = slice(start_index, end_index + 1)
+        steps = path_lengths(tip[procedure])
+        dt = np.diff(T[procedure]) / 1000
+        speeds = steps[dt > 0] / dt[dt > 0]
+        if speeds.size:
+            metrics['tip_speed_mean'] = speeds.mean()
+            metrics['tip_speed_p10'], metrics['tip_speed_p50'], metrics['tip_speed_p90'] = np.percentile(speeds, [10, 50, 90])
+
+    return {name: int(value) if name == 'samples' else float(value) for name, value in metrics.items()}
+
+
+def compute_metrics_from_path(path, cache_dir=None):
+    """
+    Load one case directory and compute its metrics.
+
+    Parameters:
+    path (str): The directory of the case.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+
+    Returns:
+    dict: The metrics of compute_case_metrics.
+    """
+    X, Y, Z, T = core.get_all_lists_from_path(path, cache_dir)
+    landmarks = core.get_landmark_indexes(path, T)
+    return compute_case_metrics(X, Y, Z, T, landmarks)
+
+
+def _case_task(task):
+    """
+    Compute the metrics of one (group_key, case_id, source_path, cache_dir) task, returning an error text instead of raising.
+    """
+    group_key, case_id, source_path, cache_dir = task
+    row = {'group_key': group_key, 'case_id': case_id, 'error': ''}
+    try:
+        row.update(compute_metrics_from_path(os.path.join(source_path, case_id), cache_dir))
+    except (OSError, ValueError, IndexError) as error:
+        row.update(dict.fromkeys(METRIC_NAMES, np.nan))
+        row['error'] = f'{type(error).__name__}: {error}'
+    return row
+
+
+def compute_cohort_metrics(source_path, meta_path='SIMMETA.txt', output_path=None, cache_dir=None, workers=None, chunksize=8):
+    """
+    Compute the metrics of every case in SIMMETA.txt on a process pool and write one results table.
+
+    Parameters:
+    source_path (str): The base directory containing the case directories.
+    meta_path (str): The path of SIMMETA.txt.
+    output_path (str, optional): The CSV file to write, one row per case.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    workers (int, optional): The number of worker processes. 1 computes in this process.
+    chunksize (int): The number of cases sent to a worker at a time.
+
+    Returns:
+    list: One dictionary per case, grouped by group key as core.read_simmeta returns them, with 'group_key', 'case_id', the metrics and 'error'.
+    """
+    tasks = [
+        (group_key, case_id, source_path, cache_dir)
+        for group_key, case_ids in core.read_simmeta(meta_path).items()
+        for case_id in case_ids
+    ]
+
+    if workers == 1:
+        rows = [_case_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = list(executor.map(_case_task, tasks, chunksize=chunksize))
+
+    if output_path is not None:
+        with open(output_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['group_key', 'case_id'] + METRIC_NAMES + ['error'])
+            writer.writeheader()
+            writer.writerows(rows)
+
+    return rows
@@ -25,45 +25,44 @@ Functions changes are marked with
 import os
 import datetime
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 import random
 import string
 import shutil 
 import json
-
-
-def generate_random_string(length=12):
-    """Generate a random string of given length including letters and digits."""
+import traceback
+import functools
+from concurrent.futures import ProcessPoolExecutor
+import sensor_io
+import coil_render
+import instrumentation
+import filters
+from coil_array import CoilArray
+
+
+def generate_random_string(length=12, rng=None):
+    """Generate a random string of given length including letters and digits. Pass a random.Random as rng for reproducible strings."""
     characters = string.ascii_letters + string.digits  
-    return ''.join(random.choices(characters, k=length))
+    return ''.join((rng or random).choices(characters, k=length))
 
 
 def running_average(data, window_size):
     """
     Compute the running average of a 1D numpy array using a specified window size.
+
+    Equal to np.convolve(data, np.ones(window_size) / window_size, mode='same'): samples outside the
+    recording count as zero.
     """
-    # Create a window: an array of ones divided by the window size
-    window = np.ones(window_size) / window_size
-    
-    # Compute the convolution, which applies the running average
-    running_avg = np.convolve(data, window, mode='same')
-    
-    return running_avg
+    return filters.moving_average(data, window_size, edge='zeros')
 
 
 def load_coordinates_raw(filepath):
     """
-    Read csv file, return numpy array.
+    Read csv file, return numpy float array.
+
+    Column 0 holds the timestamp in microseconds since midnight, the following columns
+    hold the sensor values in file order.
     """
-    datalines = []
-    i = 0
-    with open(filepath, "r") as f:
-        for line in f.readlines():
-            if i > 0:
-                datalines.append(line.split(",")[:-1])
-            i += 1
-    return np.array(datalines)
+    return sensor_io.load_sensor_csv(filepath)
 
 
 def parse_time(timestr):
@@ -73,18 +72,11 @@ def parse_time(timestr):
 
 def calculate_relative_time(data):
     """
-    Convert array timestamps to relative times in milliseconds and handle type issues.
+    Convert array timestamps to relative times in milliseconds.
     """
-    modified_data = []
-    first_time = parse_time(data[0][0])
-    
-    for row in data:
-        current_time = parse_time(row[0])
-        time_diff = (current_time - first_time).total_seconds() * 1000
-        new_row = [str(time_diff)] + [str(item) for item in row[1:]]
-        modified_data.append(new_row)
-    
-    return np.array(modified_data)  
+    modified_data = data.copy()
+    modified_data[:, 0] = sensor_io.relative_time_ms(data[:, 0].astype(np.int64))
+    return modified_data
 
 
 def extract_columns(data, N):
@@ -98,31 +90,19 @@ def extract_columns(data, N):
     """
     selected_indices = ------REDACTED------
 
-    # Filter the data to only include the selected columns
-    modified_data = []
-    for row in data:
-        new_row = [float(row[i]) for i in ------REDACTED------]
-        modified_data.append(new_row)
-    
-    return np.array(modified_data)
+    # Select all rows at once, the data is already numeric
+    return data[:, selected_indices]
 
 
 def coiler(data, scale_factor, translation_offset):
-    """Apply a linear transformation"""
-    transformed_data = []
+    """Apply a linear transformation to all rows at once, rounding coordinates to 2 decimals"""
+    transformed_data = np.empty(data.shape, dtype=float)
+    transformed_data[:, ------REDACTED------] = data[:, ------REDACTED------]
 
-    for row in data:
-        new_row = []
-        new_row.append(------REDACTED------)
-        coordinates = np.array(------REDACTED------, dtype=float)
-        
-        scaled = coordinates * scale_factor
-        
-        transformed = scaled + translation_offset
-        new_row.extend([float(f"{coord:.2f}") for coord in transformed])
-        transformed_data.append(new_row)
+    coordinates = data[:, ------REDACTED------]
+    transformed_data[:, ------REDACTED------] = sensor_io.transform_coordinates(coordinates, scale_factor, translation_offset)
 
-    return np.array(transformed_data)
+    return transformed_data
 
 
 def data_to_shape(data):
@@ -131,25 +111,10 @@ def data_to_shape(data):
     REDACTED
     !!!!!!!!!
 
-    Convert an input data array to a dictionary with structured coordinate data.'''
-    output_dict = {}
-
-    # Initialize output dictionary for each coil
-    for coil_no in range(---REDACTED---):
-        output_dict[coil_no] = {'T': [], 'X': [], 'Y': [], 'Z': []}
-
-    # Process each row
-    for row in data:
-        timestamp = row[0]
-        index = ---REDACTED---
-        for coil_no in range(---REDACTED---):
-            if ---REDACTED--- < len(row):
-                output_dict[coil_no]['T'].append(timestamp)
-                output_dict[coil_no]['X'].append(row[---REDACTED---])
-                output_dict[coil_no]['Y'].append(row[---REDACTED---])
-                output_dict[coil_no]['Z'].append(row[---REDACTED---])
-            index += ---REDACTED---  
-    return output_dict
+    Convert an input data array to a CoilArray: one contiguous (frames, coils, 3) block and a shared time vector.'''
+    # X, Y, Z columns of each coil, for the coils present in the data
+    coord_columns = [column for column in ---REDACTED--- if column < data.shape[1]]
+    return CoilArray.from_rows(data, coord_columns, time_column=0)
 
 
 def averager_coils(DDD):
@@ -159,16 +124,8 @@ def averager_coils(DDD):
     REDACTED
     !!!!!!!!!
 
-    Applies running average to dict.'''
-    outd = {}
-    for coil_no in range(---REDACTED---):
-        outd[coil_no] = {'T': [], 'X': [], 'Y': [], 'Z': []}
-
-    for coil_no in range(---REDACTED---):
-        outd[coil_no]["X"] = list(running_average(DDD[coil_no]["X"], ---REDACTED---))
-        outd[coil_no]["Y"] = list(running_average(DDD[coil_no]["Y"], ---REDACTED---))
-        outd[coil_no]["Z"] = list(running_average(DDD[coil_no]["Z"], ---REDACTED---))
-    return outd
+    Applies running average to every coil and axis of a CoilArray, in one call over the whole block.'''
+    return filters.smooth_coil_array(DDD, 'moving_average', window_size=---REDACTED---, edge='zeros')
 
 
 def save_animation(datadict, savep):
@@ -177,6 +134,10 @@ def save_animation(datadict, savep):
     REDACTED
     !!!!!!!!!
 
+    # matplotlib is only needed here, so batch workers that never call save_animation do not import it
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
     # Plot setup
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 5))
     line, = ax1.plot([], [], 'k-')
@@ -197,26 +158,15 @@ def save_animation(datadict, savep):
 
     # Update function for animation
     def update(frame):
-        XX = []
-        YY = []
-        ZZ = []
-
-        for coil_no in range(---REDACTED---):
-            XX.append(datadict[coil_no]["X"][frame])
-            YY.append(datadict[coil_no]["Y"][frame])
-            ZZ.append(datadict[coil_no]["Z"][frame])
+        XX, YY, ZZ = datadict.coords[frame].T
 
-        XX = np.array(XX)
-        YY = np.array(YY)
-        ZZ = np.array(ZZ)
-
-        line.set_data(XX, -np.array(YY))
-        line2.set_data(ZZ, -np.array(YY))
+        line.set_data(XX, -YY)
+        line2.set_data(ZZ, -YY)
 
         return line, line2
 
     # Create animation
-    ani = FuncAnimation(fig, update, frames=len(datadict[0]["T"]), blit=True, interval=200)
+    ani = FuncAnimation(fig, update, frames=len(datadict), blit=True, interval=200)
 
     # Save animation
     ani.save(savep, writer='ffmpeg', fps=5)
@@ -240,31 +190,112 @@ except FileNotFoundError:
 '''
 
 
-for root, dirs, files in os.walk(indir):
-    for filename in files:
-        if filename.endswith(".csv") and "sensor" in filename:
-            random_string = generate_random_string()
-            print("\n\n \t \t", filename, root, random_string)
-            dst_dir = outdir + os.sep + random_string + os.sep
-            os.mkdir(dst_dir)
+def find_sensor_files(indir):
+    """Walk indir and return (root, filename) of every sensor csv file, in a fixed order."""
+    sensor_files = []
+    for root, dirs, files in os.walk(indir):
+        for filename in files:
+            if filename.endswith(".csv") and "sensor" in filename:
+                sensor_files.append((root, filename))
+    return sorted(sensor_files)
+
+
+def process_sensor_file(root, filename, outdir, random_string, render_step=1):
+    """Process one sensor csv file into outdir/random_string, return its SIMMETA.txt line. render_step decimates the animation frames."""
+    print("\n\n \t \t", filename, root, random_string)
+    dst_dir = outdir + os.sep + random_string + os.sep
+    os.mkdir(dst_dir)
+
+    csv_path = root + os.sep + filename
+    with instrumentation.stage("csv parsing", case=random_string, paths=[csv_path]):
+        dataraw = load_coordinates_raw(csv_path)
+    with instrumentation.stage("calculate_relative_time", case=random_string):
+        data_time_rel = calculate_relative_time(dataraw)
+    with instrumentation.stage("extract_columns", case=random_string):
+        data_sel_col = extract_columns(data_time_rel, ---REDACTED---)
+
+    with instrumentation.stage("coiler", case=random_string):
+        data_tf = coiler(data_sel_col, ---REDACTED---, ---REDACTED---)
+
+    with instrumentation.stage("data_to_shape", case=random_string):
+        data_raw = data_to_shape(data_sel_col)
+        data_dict = data_to_shape(data_tf)
+    with instrumentation.stage("averager_coils", case=random_string):
+        data_avg = averager_coils(data_dict)
+    
+    # All coils share one time vector
+    data_dict.time = np.array(---REDACTED---)
+    data_avg.time = np.array(---REDACTED---)
+
+    with instrumentation.stage("render animation", case=random_string):
+        coil_render.render_animation(data_avg, dst_dir + "animation.mp4", fps=5, step=render_step)
+
+    log_path = root + os.sep + "LogFile.txt"
+    with instrumentation.stage("copy LogFile.txt", case=random_string, paths=[log_path]):
+        shutil.copy(log_path, dst_dir + os.sep + "LogFile.txt")
 
-            dataraw = load_coordinates_raw(root + os.sep + filename)
-            data_time_rel = calculate_relative_time(dataraw)
-            data_sel_col = extract_columns(data_time_rel, ---REDACTED---)
+    return f"{root};{filename};{random_string};{dst_dir};\n"
 
-            data_tf = coiler(data_sel_col, ---REDACTED---, ---REDACTED---)
 
-            data_raw = data_to_shape(data_sel_col)
-            data_dict = data_to_shape(data_tf)
-            data_avg = averager_coils(data_dict)
-            
-            for coil_no in range(---REDACTED---):
-                data_dict[---REDACTED---]["T"] = list(np.array(---REDACTED---)
-                data_avg[---REDACTED---]["T"] = list(np.array(---REDACTED---)
+def _process_task(task, collect_records=False):
+    """Run process_sensor_file for one task, returning (line, error, instrumentation records) instead of raising."""
+    try:
+        line, error = process_sensor_file(*task), None
+    except Exception:
+        line, error = None, traceback.format_exc()
+    # Worker processes hand their records to the parent, which is the only one writing them out
+    return line, error, instrumentation.pop_records() if collect_records else []
 
-            save_animation(data_avg, dst_dir + "animation.mp4")
 
-            shutil.copy(root + os.sep + "LogFile.txt", dst_dir + os.sep + "LogFile.txt")
+def run_batch(indir, outdir, workers=None, seed=None, meta_path="SIMMETA.txt", render_step=1):
+    """
+    Process every sensor csv file under indir, spread over a pool of worker processes.
 
-            with open("SIMMETA.txt", 'a') as metafile:
-                metafile.write(f"{root};{filename};{random_string};{dst_dir};\n")
+    Random case IDs are drawn up front in the parent (reproducible when seed is given).
+    Only the parent appends to meta_path, in input order, so lines are never interleaved.
+    A failing file is reported and skipped without stopping the batch.
+    workers=1 processes the files in this process. render_step decimates the animation frames.
+    With instrumentation enabled (instrumentation.enable() or COLON_PROFILE=1), a per-stage summary is printed at the end.
+
+    Returns a list of (root, filename, error) for the files that failed.
+    """
+    rng = random.Random(seed)
+    used_strings = set()
+    tasks = []
+    for root, filename in find_sensor_files(indir):
+        random_string = generate_random_string(rng=rng)
+        while random_string in used_strings:
+            random_string = generate_random_string(rng=rng)
+        used_strings.add(random_string)
+        tasks.append((root, filename, outdir, random_string, render_step))
+
+    if workers == 1:
+        results = map(_process_task, tasks)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=instrumentation.init_worker)
+        results = executor.map(functools.partial(_process_task, collect_records=True), tasks)
+
+    failures = []
+    try:
+        with open(meta_path, 'a') as metafile:
+            for task, (line, error, records) in zip(tasks, results):
+                instrumentation.add_records(records)
+                if error is None:
+                    metafile.write(line)
+                    metafile.flush()
+                else:
+                    print("FAILED", task[1], task[0], "\n", error)
+                    failures.append((task[0], task[1], error))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"Processed {len(tasks) - len(failures)} of {len(tasks)} files")
+    if instrumentation.is_enabled():
+        instrumentation.print_summary()
+    return failures
+
+
+if __name__ == '__main__':
+    run_batch(indir, outdir, workers=os.cpu_count(), seed=None)
@@ -0,0 +1,315 @@
+'''
+Resample cases onto a shared grid and stack them into one (cases, frames, coils, 3) tensor.
+
+Every case has its own irregular T, so cross-case statistics need one loop per case. After resampling
+onto the same grid, they become NumPy reductions over the case axis, for example
+np.nanmean(tensor.coords, axis=0) for the mean path of the cohort.
+
+Two grids are supported:
+
+- 'time': a uniform time grid in ms, counted from a landmark (default 'start') or from the first sample.
+- 'phase': a landmark-normalized grid. The time between consecutive landmarks (default start, cecum, end)
+  is stretched linearly so the landmarks fall on evenly spaced phases between 0 and 1.
+
+Grid points a case does not cover (before its first or after its last sample, or a case whose landmarks
+are missing or out of order) are NaN in coords and False in mask. A case that cannot be read keeps its
+row, all NaN and False, and its error is listed in errors, as metrics.compute_cohort_metrics does.
+'''
+
+import os
+import json
+import numpy as np
+import core
+from dataset import LANDMARK_NAMES
+
+
+def interpolate_frames(coords, T, times):
+    """
+    Linearly interpolate every coil and axis of a case at the given times, in one pass.
+
+    Parameters:
+    coords (np.array): A (frames, ...) array, such as (frames, coils, 3) positions.
+    T (np.array): The (frames,) ascending sample times.
+    times (np.array): The times to interpolate at.
+
+    Returns:
+    tuple: The (len(times), ...) interpolated array, with NaN outside [T[0], T[-1]],
+           and a (len(times),) boolean mask of the covered times.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    T = np.asarray(T, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    output = np.full((times.size,) + coords.shape[1:], np.nan)
+    if T.size == 0:
+        return output, np.zeros(times.size, dtype=bool)
+
+    mask = (times >= T[0]) & (times <= T[-1])
+    if T.size == 1:
+        output[mask] = coords[0]
+        return output, mask
+
+    covered = times[mask]
+    left = np.clip(np.searchsorted(T, covered, side='right') - 1, 0, T.size - 2)
+    span = T[left + 1] - T[left]
+    # Repeated sample times give a zero span, take the left sample there
+    weight = np.divide(covered - T[left], span, out=np.zeros_like(covered), where=span > 0)
+    weight = weight.reshape((-1,) + (1,) * (coords.ndim - 1))
+    output[mask] = coords[left] * (1 - weight) + coords[left + 1] * weight
+    return output, mask
+
+
+def get_phase(T, anchor_indexes):
+    """
+    Map the sample times of a case to landmark-normalized phase.
+
+    Parameters:
+    T (np.array): The (frames,) sample times.
+    anchor_indexes (list): The frame indexes of the anchor landmarks, in order, such as [start, cecum, end].
+
+    Returns:
+    np.array or None: The (frames,) phase of every sample, 0 at the first anchor and 1 at the last,
+                      with the anchors evenly spaced. Samples outside the anchors get phases below 0 or above 1.
+                      None if the anchor times are not strictly increasing.
+    """
+    T = np.asarray(T, dtype=np.float64)
+    anchor_times = T[np.asarray(anchor_indexes)]
+    if np.any(np.diff(anchor_times) <= 0):
+        return None
+    anchor_phases = np.linspace(0, 1, len(anchor_indexes))
+
+    # Piecewise linear between the anchors, extended with the first and last slope outside them
+    segment = np.clip(np.searchsorted(anchor_times, T, side='right') - 1, 0, len(anchor_times) - 2)
+    slope = np.diff(anchor_phases) / np.diff(anchor_times)
+    return anchor_phases[segment] + (T - anchor_times[segment]) * slope[segment]
+
+
+def resample_case(coords, T, landmarks, grid, kind='time', origin='start', anchors=('start', 'cecum', 'end')):
+    """
+    Resample one case onto a time or phase grid.
+
+    Parameters:
+    coords (np.array): The (frames, coils, 3) positions, such as CoilArray.coords.
+    T (np.array): The (frames,) sample times in ms.
+    landmarks (dict): Landmark frame indexes by name, as in dataset.Case.landmarks.
+    grid (np.array): The grid, in ms for 'time' or in phase for 'phase'.
+    kind (str): 'time' or 'phase'.
+    origin (str or None): For 'time', the landmark at time 0, or None to count from the first sample.
+    anchors (tuple): For 'phase', the landmarks placed at evenly spaced phases from 0 to 1.
+
+    Returns:
+    tuple: The (len(grid), coils, 3) resampled positions and the (len(grid),) mask of covered grid points.
+    """
+    T = np.asarray(T, dtype=np.float64)
+    if kind == 'time':
+        offset = T[landmarks[origin]] if origin is not None else T[0]
+        return interpolate_frames(coords, T - offset, grid)
+    if kind == 'phase':
+        phase = get_phase(T, [landmarks[name] for name in anchors])
+        if phase is None:
+            return np.full((len(grid),) + np.shape(coords)[1:], np.nan), np.zeros(len(grid), dtype=bool)
+        return interpolate_frames(coords, phase, grid)
+    raise ValueError("kind should be 'time' or 'phase'")
+
+
+class TrajectoryTensor:
+    """
+    The resampled cases of a cohort, stacked along a leading case axis.
+
+    Parameters:
+    coords (np.array): The (cases, frames, coils, 3) positions, NaN where a case has no data.
+    mask (np.array): The (cases, frames) boolean mask of grid points covered by each case.
+    grid (np.array): The (frames,) grid, in ms for kind 'time' or in phase for kind 'phase'.
+    case_ids (list): The case ID of every row.
+    group_keys (list): The group key of every row.
+    kind (str): 'time' or 'phase'.
+    errors (list, optional): The error text of every row, empty for the cases that were read.
+    """
+
+    def __init__(self, coords, mask, grid, case_ids, group_keys, kind='time', errors=None):
+        self.coords = coords
+        self.mask = mask
+        self.grid = np.asarray(grid, dtype=np.float64)
+        self.case_ids = list(case_ids)
+        self.group_keys = list(group_keys)
+        self.kind = kind
+        self.errors = [''] * len(self.case_ids) if errors is None else list(errors)
+
+    def __len__(self):
+        return self.coords.shape[0]
+
+    def __repr__(self):
+        return f'TrajectoryTensor(kind={self.kind!r}, shape={self.coords.shape}, dtype={self.coords.dtype})'
+
+    @property
+    def tip(self):
+        """
+        A (cases, frames, 3) view of the tip coil.
+        """
+        return self.coords[:, :, 0, :]
+
+    def masked(self):
+        """
+        Return the positions as a masked array, masked where a case has no data.
+        """
+        mask = np.broadcast_to(~self.mask[:, :, None, None], self.coords.shape)
+        return np.ma.MaskedArray(self.coords, mask=mask)
+
+    def group(self, group_key):
+        """
+        Return the rows of one group as a new TrajectoryTensor.
+        """
+        rows = np.array([key == group_key for key in self.group_keys], dtype=bool)
+        return TrajectoryTensor(
+            self.coords[rows], self.mask[rows], self.grid,
+            [case_id for case_id, keep in zip(self.case_ids, rows) if keep], [group_key] * int(rows.sum()), self.kind,
+            [error for error, keep in zip(self.errors, rows) if keep]
+        )
+
+    def save(self, path):
+        """
+        Save to a directory holding coords.npy, mask.npy, grid.npy and meta.json. Written by build_cohort_tensor
+        directly when it is given an output directory.
+        """
+        os.makedirs(path, exist_ok=True)
+        remove_tensor_meta(path)
+        for name in ('coords', 'mask', 'grid'):
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+        write_tensor_meta(path, self.case_ids, self.group_keys, self.kind, self.errors)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """
+        Load a tensor saved with save(). The positions are memory-mapped unless mmap_mode is None.
+        """
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+        coords = np.load(os.path.join(path, 'coords.npy'), mmap_mode=mmap_mode)
+        mask = np.load(os.path.join(path, 'mask.npy'))
+        grid = np.load(os.path.join(path, 'grid.npy'))
+        return cls(coords, mask, grid, meta['case_ids'], meta['group_keys'], meta['kind'], meta.get('errors'))
+
+
+def remove_tensor_meta(path):
+    """
+    Remove the meta.json of a saved TrajectoryTensor before its arrays are rewritten, so an interrupted
+    rewrite is never loaded as a valid tensor.
+    """
+    try:
+        os.remove(os.path.join(path, 'meta.json'))
+    except FileNotFoundError:
+        pass
+
+
+def write_tensor_meta(path, case_ids, group_keys, kind, errors=None):
+    """
+    Write the meta.json of a saved TrajectoryTensor atomically. It is written last, after the arrays.
+    """
+    tmp_path = os.path.join(path, 'meta.tmp.json')
+    with open(tmp_path, 'w') as file:
+        json.dump({
+            'case_ids': list(case_ids), 'group_keys': list(group_keys), 'kind': kind,
+            'errors': [''] * len(case_ids) if errors is None else list(errors)
+        }, file)
+    os.replace(tmp_path, os.path.join(path, 'meta.json'))
+
+
+def build_cohort_tensor(source_path, meta_path='SIMMETA.txt', kind='time', step_ms=100.0, n_frames=1000,
+                        origin='start', anchors=('start', 'cecum', 'end'), grid=None, out_dir=None,
+                        cache_dir=None, dtype=np.float32):
+    """
+    Resample every case in SIMMETA.txt onto one grid and stack them into a TrajectoryTensor.
+
+    Parameters:
+    source_path (str): The base directory containing the case directories.
+    meta_path (str): The path of SIMMETA.txt.
+    kind (str): 'time' for a uniform time grid or 'phase' for a landmark-normalized grid.
+    step_ms (float): For 'time', the grid step in ms. The grid spans from 0 to the longest case.
+    n_frames (int): For 'phase', the number of grid points from phase 0 to phase 1.
+    origin (str or None): For 'time', the landmark at time 0, or None to count from the first sample.
+    anchors (tuple): For 'phase', the landmarks placed at evenly spaced phases, see get_phase.
+    grid (np.array, optional): Use this grid instead of the default one.
+    out_dir (str, optional): Write the tensor to this directory while it is built, memory-mapped, so cohorts
+                             larger than memory can be resampled. Load it again with TrajectoryTensor.load.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    dtype (np.dtype): The type of the stacked positions. float32 halves the size of the tensor.
+
+    Returns:
+    TrajectoryTensor: The stacked cohort, with cases grouped by group key as core.read_simmeta returns them.
+                      A case that cannot be read (or has another number of coils than the cohort) keeps an
+                      all-NaN row and its error in errors.
+    """
+    entries = [(group_key, case_id) for group_key, case_ids in core.read_simmeta(meta_path).items() for case_id in case_ids]
+    errors = {}
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+        remove_tensor_meta(out_dir)
+
+    def read_case(case_id):
+        path = os.path.join(source_path, case_id)
+        coil_array = core.get_coil_array_from_path(path, cache_dir)
+        landmarks = dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(path, coil_array.time)))
+        return coil_array, landmarks
+
+    if grid is None:
+        if kind == 'phase':
+            grid = np.linspace(0, 1, n_frames)
+        else:
+            # The time grid has to cover the longest case, which needs one pass over the times (only T) first
+            longest = 0.0
+            for _, case_id in entries:
+                path = os.path.join(source_path, case_id)
+                try:
+                    T = np.asarray(core.get_times_from_path(path, cache_dir), dtype=np.float64)
+                    landmarks = dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(path, T)))
+                except (OSError, ValueError, IndexError) as error:
+                    errors[case_id] = f'{type(error).__name__}: {error}'
+                    continue
+                offset = T[0] if origin is None else T[landmarks[origin]]
+                longest = max(longest, T[-1] - offset)
+            grid = np.arange(0, longest + step_ms, step_ms)
+    grid = np.asarray(grid, dtype=np.float64)
+
+    n_coils = None
+    coords = None
+    mask = np.zeros((len(entries), grid.size), dtype=bool)
+    for row, (_, case_id) in enumerate(entries):
+        if case_id in errors:
+            if coords is not None:
+                coords[row] = np.nan
+            continue
+        try:
+            coil_array, landmarks = read_case(case_id)
+            if coords is not None and coil_array.n_coils != n_coils:
+                raise ValueError(f'Case {case_id} has {coil_array.n_coils} coils, the cohort has {n_coils}')
+        except (OSError, ValueError, IndexError) as error:
+            errors[case_id] = f'{type(error).__name__}: {error}'
+            if coords is not None:
+                coords[row] = np.nan
+            continue
+        if coords is None:
+            n_coils = coil_array.n_coils
+            shape = (len(entries), grid.size, n_coils, 3)
+            if out_dir is not None:
+                coords = np.lib.format.open_memmap(os.path.join(out_dir, 'coords.npy'), mode='w+', dtype=dtype, shape=shape)
+            else:
+                coords = np.empty(shape, dtype=dtype)
+            # Rows of the cases that failed before the first readable one
+            coords[:row] = np.nan
+        coords[row], mask[row] = resample_case(coil_array.coords, coil_array.time, landmarks, grid, kind, origin, anchors)
+
+    if coords is None:
+        coords = np.zeros((len(entries), grid.size, 0, 3), dtype=dtype)
+
+    tensor = TrajectoryTensor(
+        coords, mask, grid, [case_id for _, case_id in entries], [group_key for group_key, _ in entries], kind,
+        [errors.get(case_id, '') for _, case_id in entries]
+    )
+    if out_dir is not None:
+        if isinstance(coords, np.memmap):
+            coords.flush()
+            np.save(os.path.join(out_dir, 'mask.npy'), mask)
+            np.save(os.path.join(out_dir, 'grid.npy'), grid)
+            write_tensor_meta(out_dir, tensor.case_ids, tensor.group_keys, kind, tensor.errors)
+        else:
+            tensor.save(out_dir)
+    return tensor
@@ -0,0 +1,122 @@
+import io
+import numpy as np
+
+
+def count_fields(filepath):
+    """
+    Count the data fields of a raw sensor csv file, using its first data line.
+
+    Parameters:
+    filepath (str): The path of the csv file.
+
+    Returns:
+    int: The number of fields per line, not counting the empty field after the trailing comma.
+    """
+    with open(filepath, 'r') as file:
+        file.readline()
+        first_line = file.readline()
+    return len(first_line.split(',')) - 1
+
+
+def parse_time_array(timestrs):
+    """
+    Parse '%H:%M:%S:%f' time strings into microseconds since midnight, in one array operation.
+
+    As with datetime.strptime, the fraction field is read as the leading digits of the
+    microseconds, so '5' means 500000 microseconds.
+
+    Parameters:
+    timestrs (list or np.array): The time strings.
+
+    Returns:
+    np.array: An int64 array of microseconds since midnight.
+    """
+    timestrs = np.asarray(timestrs, dtype=str)
+    if timestrs.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    fields = np.loadtxt(io.StringIO('\n'.join(timestrs)), delimiter=':', dtype=str, ndmin=2)
+    hours, minutes, seconds = (fields[:, i].astype(np.int64) for i in range(3))
+    fraction = np.char.ljust(fields[:, 3], 6, '0').astype(np.int64)
+    return ((hours * 60 + minutes) * 60 + seconds) * 10**6 + fraction
+
+
+def relative_time_ms(microseconds):
+    """
+    Convert absolute times in microseconds to milliseconds relative to the first time.
+
+    Uses the same arithmetic as timedelta.total_seconds() * 1000, so the results are identical
+    to subtracting parsed datetime objects one row at a time.
+
+    Parameters:
+    microseconds (np.array): Absolute times in whole microseconds.
+
+    Returns:
+    np.array: A float64 array of relative times in milliseconds.
+    """
+    microseconds = np.asarray(microseconds, dtype=np.int64)
+    return ((microseconds - microseconds[0]) / 10**6) * 1000
+
+
+def load_sensor_csv(filepath, usecols=None):
+    """
+    Read a raw sensor csv file straight into a float array.
+
+    Parameters:
+    filepath (str): The path of the csv file.
+    usecols (list, optional): Indexes of the value columns to read, counted as in the file
+                              (column 0 is the timestamp). Defaults to all value columns.
+
+    Returns:
+    np.array: A float64 array of shape (rows, 1 + columns). Column 0 holds the timestamp in
+              microseconds since midnight, the other columns hold the sensor values.
+    """
+    if usecols is None:
+        usecols = range(1, count_fields(filepath))
+    usecols = list(usecols)
+
+    timestrs = np.loadtxt(filepath, delimiter=',', skiprows=1, usecols=0, dtype=str, ndmin=1)
+    data = np.empty((timestrs.size, 1 + len(usecols)), dtype=np.float64)
+    data[:, 0] = parse_time_array(timestrs)
+    if usecols:
+        data[:, 1:] = np.loadtxt(filepath, delimiter=',', skiprows=1, usecols=usecols, ndmin=2)
+    return data
+
+
+def round_coordinates(values, decimals=2):
+    """
+    Round an array of coordinates the way float(f"{value:.2f}") rounds a single value.
+
+    np.round is used for the whole array. Values that sit on a rounding tie are redone with
+    string formatting, which rounds from the exact binary value.
+
+    Parameters:
+    values (np.array): The coordinates to round.
+    decimals (int): The number of decimals to keep.
+
+    Returns:
+    np.array: A float64 array with the rounded coordinates.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    rounded = np.round(values, decimals)
+    scaled = np.abs(values) * 10**decimals
+    ties = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if np.any(ties):
+        rounded[ties] = [float(f"{value:.{decimals}f}") for value in values[ties]]
+    return rounded
+
+
+def transform_coordinates(coordinates, scale_factor, translation_offset, decimals=2):
+    """
+    Apply a linear transformation to a whole array of coordinates and round the result.
+
+    Parameters:
+    coordinates (np.array): The coordinates, one row per sample.
+    scale_factor (float or np.array): The scale, broadcast over the rows.
+    translation_offset (float or np.array): The offset added after scaling, broadcast over the rows.
+    decimals (int): The number of decimals to keep.
+
+    Returns:
+    np.array: A float64 array of transformed coordinates.
+    """
+    scaled = np.asarray(coordinates, dtype=np.float64) * scale_factor
+    return round_coordinates(scaled + translation_offset, decimals)
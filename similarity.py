@@ -0,0 +1,242 @@
+'''
+Trajectory similarity search with dynamic time warping (DTW).
+
+Tip paths are cut to a landmark segment (default start to cecum) and resampled to the same number of
+points, uniformly in time, so every pair can be compared with a Sakoe-Chiba band and the LB_Keogh lower bound.
+The cost of matching two samples is their Euclidean distance in mm, and the DTW distance is the sum of the
+costs along the best warping path.
+
+DTW is computed for a whole batch of candidates at once. Within a row of the cost matrix, the recurrence
+D[i, j] = c[i, j] + min(D[i - 1, j - 1], D[i - 1, j], D[i, j - 1]) is a running minimum over a cumulative
+sum, so each row is a handful of array operations instead of one Python step per cell.
+
+In top-k search, candidates are visited in order of their lower bound. Once the next lower bound is above
+the k-th best distance found so far, the remaining candidates are pruned without computing their DTW.
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import core
+from dataset import LANDMARK_NAMES
+from resampling import interpolate_frames
+
+
+def load_trajectories(source_path, meta_path='SIMMETA.txt', segment=('start', 'cecum'), length=256, coil=0, cache_dir=None):
+    """
+    Load one coil of every case, cut to a landmark segment and resampled to a fixed number of points.
+
+    Parameters:
+    source_path (str): The base directory containing the case directories.
+    meta_path (str): The path of SIMMETA.txt.
+    segment (tuple): The landmarks at the start and end of the segment, such as ('cecum', 'end') for withdrawal.
+    length (int): The number of points per trajectory, evenly spaced in time.
+    coil (int): The coil, 0 being the tip.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+
+    Returns:
+    tuple: The list of case IDs and a (cases, length, 3) array. Cases whose segment is empty are left out.
+    """
+    case_ids = []
+    trajectories = []
+    for ids in core.read_simmeta(meta_path).values():
+        for case_id in ids:
+            path = os.path.join(source_path, case_id)
+            X, Y, Z, T = core.get_all_lists_from_path(path, cache_dir)
+            T = np.asarray(T, dtype=np.float64)
+            landmarks = dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(path, T)))
+            start, stop = landmarks[segment[0]], landmarks[segment[1]]
+            if T[stop] <= T[start]:
+                continue
+            window = slice(start, stop + 1)
+            points = np.column_stack([np.asarray(values)[window, coil] for values in (X, Y, Z)])
+            resampled, _ = interpolate_frames(points, T[window], np.linspace(T[start], T[stop], length))
+            case_ids.append(case_id)
+            trajectories.append(resampled)
+    return case_ids, np.array(trajectories).reshape(-1, length, 3)
+
+
+def get_band(length, window):
+    """
+    Return the Sakoe-Chiba band width in samples for a window given as a fraction of the length or as a sample count.
+    """
+    return int(np.ceil(window * length)) if isinstance(window, float) else int(window)
+
+
+def lb_keogh(query, candidates, band):
+    """
+    The LB_Keogh lower bound of the DTW distance between a query and many candidates.
+
+    For every candidate sample, the query samples it can be matched to within the band lie in a box
+    (the envelope). The distance from the candidate sample to that box is a lower bound of its matching cost,
+    and every candidate sample is matched at least once.
+
+    Parameters:
+    query (np.array): A (length, 3) trajectory.
+    candidates (np.array): A (candidates, length, 3) array of trajectories.
+    band (int): The Sakoe-Chiba band width in samples.
+
+    Returns:
+    np.array: One lower bound per candidate.
+    """
+    length = len(query)
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(query, ((band, band), (0, 0)), mode='edge'), 2 * band + 1, axis=0)
+    upper = windows.max(axis=-1)[:length]
+    lower = windows.min(axis=-1)[:length]
+    outside = np.maximum(candidates - upper, 0) + np.maximum(lower - candidates, 0)
+    return np.linalg.norm(outside, axis=-1).sum(axis=-1)
+
+
+def dtw_batch(query, candidates, band, max_distance=None):
+    """
+    The banded DTW distance between a query and each of many candidates, computed together.
+
+    Parameters:
+    query (np.array): A (length, 3) trajectory.
+    candidates (np.array): A (candidates, length, 3) array of trajectories of the same length.
+    band (int): The Sakoe-Chiba band width in samples.
+    max_distance (float or np.array, optional): Early abandoning: a candidate whose distance is certainly
+                                                above this value gets np.inf.
+
+    Returns:
+    np.array: One DTW distance per candidate.
+    """
+    candidates = np.asarray(candidates, dtype=np.float64)
+    n_candidates, length = candidates.shape[:2]
+    limit = np.broadcast_to(np.inf if max_distance is None else max_distance, (n_candidates,))
+    active = np.arange(n_candidates)
+    distances = np.full(n_candidates, np.inf)
+
+    # previous holds row i - 1 of the cost matrix, with column 0 standing for j = -1
+    previous = np.full((n_candidates, length + 1), np.inf)
+    previous[:, 0] = 0.0
+    for i in range(length):
+        low, high = max(0, i - band), min(length, i + band + 1)
+        cost = np.linalg.norm(candidates[active, low:high] - query[i], axis=-1)
+        from_above = np.minimum(previous[:, low:high], previous[:, low + 1:high + 1])
+        cumulative = np.cumsum(cost, axis=1)
+        current = np.full_like(previous, np.inf)
+        current[:, low + 1:high + 1] = cumulative + np.minimum.accumulate(from_above - (cumulative - cost), axis=1)
+        previous = current
+
+        # Every warping path crosses this row, so a row minimum above the limit abandons the candidate
+        keep = previous[:, low + 1:high + 1].min(axis=1) <= limit[active]
+        if not keep.all():
+            active, previous = active[keep], previous[keep]
+            if active.size == 0:
+                return distances
+
+    distances[active] = previous[:, length]
+    return distances
+
+
+def top_k_similar(query, trajectories, k=5, window=0.1, batch_size=32, exclude=None):
+    """
+    Find the k trajectories closest to a query by DTW distance, pruning with LB_Keogh.
+
+    Parameters:
+    query (np.array): A (length, 3) trajectory.
+    trajectories (np.array): A (cases, length, 3) array, as from load_trajectories.
+    k (int): The number of results.
+    window (float or int): The Sakoe-Chiba band, as a fraction of the length (float) or in samples (int).
+    batch_size (int): The number of candidates whose DTW is computed together.
+    exclude (int, optional): A row to leave out, normally the row of the query itself.
+
+    Returns:
+    tuple: The (k,) row indexes and DTW distances of the closest trajectories, closest first,
+           and the fraction of candidates pruned by the lower bound.
+    """
+    band = get_band(len(query), window)
+    bounds = lb_keogh(query, trajectories, band)
+    order = np.argsort(bounds, kind='stable')
+    if exclude is not None:
+        order = order[order != exclude]
+
+    best_rows = np.zeros(0, dtype=np.int64)
+    best_distances = np.zeros(0)
+    computed = 0
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        threshold = best_distances[-1] if len(best_distances) == k else np.inf
+        batch = batch[bounds[batch] <= threshold]
+        if batch.size == 0:
+            break
+        distances = dtw_batch(query, trajectories[batch], band, threshold)
+        computed += batch.size
+        rows = np.concatenate([best_rows, batch])
+        distances = np.concatenate([best_distances, distances])
+        best = np.argsort(distances, kind='stable')[:k]
+        best = best[np.isfinite(distances[best])]
+        best_rows, best_distances = rows[best], distances[best]
+
+    return best_rows, best_distances, 1 - computed / len(order) if len(order) else 0.0
+
+
+_worker_trajectories = None
+
+
+def _init_worker(trajectories):
+    global _worker_trajectories
+    _worker_trajectories = trajectories
+
+
+def _top_k_task(args):
+    row, k, window, batch_size = args
+    return top_k_similar(_worker_trajectories[row], _worker_trajectories, k, window, batch_size, exclude=row)
+
+
+def _pairwise_task(args):
+    row, window = args
+    trajectories = _worker_trajectories
+    band = get_band(trajectories.shape[1], window)
+    return row, dtw_batch(trajectories[row], trajectories[row + 1:], band)
+
+
+def top_k_similar_all(trajectories, k=5, window=0.1, batch_size=32, workers=None, chunksize=4):
+    """
+    Find the k most similar other trajectories of every trajectory, in parallel.
+
+    Parameters:
+    trajectories (np.array): A (cases, length, 3) array, as from load_trajectories.
+    k, window, batch_size: As for top_k_similar.
+    workers (int, optional): Number of worker processes. None uses all cores.
+    chunksize (int): Queries handed to a worker at a time.
+
+    Returns:
+    tuple: (cases, k) row indexes and DTW distances, and the mean fraction of candidates pruned.
+    """
+    n_cases = len(trajectories)
+    rows = np.full((n_cases, k), -1, dtype=np.int64)
+    distances = np.full((n_cases, k), np.inf)
+    pruned = []
+    tasks = [(row, k, window, batch_size) for row in range(n_cases)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(trajectories,)) as executor:
+        for row, (best_rows, best_distances, fraction) in enumerate(executor.map(_top_k_task, tasks, chunksize=chunksize)):
+            rows[row, :len(best_rows)] = best_rows
+            distances[row, :len(best_distances)] = best_distances
+            pruned.append(fraction)
+    return rows, distances, float(np.mean(pruned)) if pruned else 0.0
+
+
+def pairwise_dtw(trajectories, window=0.1, workers=None, chunksize=4):
+    """
+    Compute the full symmetric DTW distance matrix, for clustering, in parallel over rows.
+
+    Parameters:
+    trajectories (np.array): A (cases, length, 3) array, as from load_trajectories.
+    window (float or int): The Sakoe-Chiba band, as for top_k_similar.
+    workers (int, optional): Number of worker processes. None uses all cores.
+    chunksize (int): Rows handed to a worker at a time.
+
+    Returns:
+    np.array: A (cases, cases) matrix with zeros on the diagonal.
+    """
+    n_cases = len(trajectories)
+    matrix = np.zeros((n_cases, n_cases))
+    # Row r is compared with the rows after it, so the first rows are the longest and are handed out first
+    tasks = [(row, window) for row in range(n_cases - 1)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(trajectories,)) as executor:
+        for row, distances in executor.map(_pairwise_task, tasks, chunksize=chunksize):
+            matrix[row, row + 1:] = distances
+            matrix[row + 1:, row] = distances
+    return matrix
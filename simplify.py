@@ -0,0 +1,249 @@
+'''
+Error-bounded trajectory simplification with Ramer-Douglas-Peucker (RDP).
+
+RDP keeps the first and last sample, splits at the sample farthest from the chord between them and
+recurses until every dropped sample is within the tolerance of the chord of its kept neighbours. The
+split points do not depend on the tolerance, only where the recursion stops does. A single run with
+tolerance 0 therefore gives every sample an error: the largest tolerance at which RDP still keeps it.
+Keeping the samples whose error is above a tolerance gives exactly the RDP result for that tolerance,
+and keeping the max_points samples with the largest errors gives the best RDP level within a point budget.
+
+The errors are computed once per case, for every coil on its own and for all coils together, and stored as
+a level-of-detail pyramid (lod_error.npy) in the case cache directory, or in a LOD_CACHE_DIR directory beside
+the case directories when no cache directory is given. Loading a level is then one selection.
+'''
+
+import os
+import json
+import numpy as np
+import core
+
+
+# The directory beside the case directories holding the pyramids when no cache directory is given,
+# so the case directories themselves are never written to
+LOD_CACHE_DIR = 'lod_cache'
+
+
+def segment_distances(points, first, last):
+    """
+    Distance of every point to the segment between two points.
+
+    Parameters:
+    points (np.array): A (samples, ..., 3) array of positions.
+    first, last (np.array): The (..., 3) segment ends.
+
+    Returns:
+    np.array: The (samples, ...) distances.
+    """
+    direction = last - first
+    length_squared = np.sum(direction * direction, axis=-1)
+    offset = points - first
+    along = np.divide(np.sum(offset * direction, axis=-1), length_squared, out=np.zeros(offset.shape[:-1]), where=length_squared > 0)
+    closest = first + np.clip(along, 0, 1)[..., None] * direction
+    return np.linalg.norm(points - closest, axis=-1)
+
+
+def rdp_errors(points):
+    """
+    Run RDP once with tolerance 0 and return the error of every sample.
+
+    Parameters:
+    points (np.array): A (samples, 3) trajectory, or (samples, coils, 3) to simplify the coils together.
+                       Together, the distance of a sample is the largest distance over the coils.
+
+    Returns:
+    np.array: The (samples,) errors in mm. RDP with tolerance t keeps exactly the samples with error > t.
+              The first and last sample have error inf.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n_samples = len(points)
+    errors = np.zeros(n_samples)
+    if n_samples == 0:
+        return errors
+    errors[[0, -1]] = np.inf
+
+    # The recursion is run one level at a time: every segment of a level is split in the same array pass
+    kept = np.unique([0, n_samples - 1])
+    pending = np.arange(1, n_samples - 1)
+    while pending.size:
+        segment = np.searchsorted(kept, pending)
+        first, last = kept[segment - 1], kept[segment]
+        distances = segment_distances(points[pending], points[first], points[last])
+        if distances.ndim > 1:
+            distances = distances.max(axis=1)
+
+        # The farthest sample of every segment, the earliest one on ties as np.argmax
+        starts = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1]])
+        largest = np.repeat(np.maximum.reduceat(distances, starts), np.diff(np.r_[starts, pending.size]))
+        candidates = np.flatnonzero(distances == largest)
+        _, first_candidates = np.unique(segment[candidates], return_index=True)
+        splits = candidates[first_candidates]
+
+        # A sample is only reached when every split above it is kept, so its error is capped by theirs
+        caps = np.minimum(errors[first[splits]], errors[last[splits]])
+        errors[pending[splits]] = np.minimum(distances[splits], caps)
+        kept = np.union1d(kept, pending[splits])
+        pending = np.delete(pending, splits)
+    return errors
+
+
+def select_indexes(errors, tolerance=None, max_points=None):
+    """
+    Select the samples of one level of detail.
+
+    Parameters:
+    errors (np.array): The (samples,) errors from rdp_errors.
+    tolerance (float, optional): Keep the samples RDP keeps at this tolerance in mm.
+    max_points (int, optional): Keep at most this many samples, those with the largest errors. At least 2,
+                                as the first and last sample are always kept.
+
+    Returns:
+    tuple: The sorted sample indexes and the guaranteed maximum distance in mm of every dropped sample
+           to the path through the kept ones.
+    """
+    if max_points is not None and max_points < 2:
+        raise ValueError(f'max_points should be at least 2, not {max_points}')
+    keep = np.ones(len(errors), dtype=bool)
+    if tolerance is not None:
+        keep &= errors > tolerance
+    if max_points is not None and keep.sum() > max_points:
+        # Cut at the error of the sample just outside the budget, so the result is an exact RDP level
+        cutoff = np.sort(errors[keep])[::-1][max_points]
+        keep &= errors > cutoff
+    indexes = np.flatnonzero(keep)
+    dropped = errors[~keep]
+    return indexes, float(dropped.max()) if dropped.size else 0.0
+
+
+def path_error(points, indexes):
+    """
+    The largest distance of a dropped sample to the segment between the kept samples around it.
+
+    Parameters:
+    points (np.array): A (samples, 3) or (samples, coils, 3) trajectory.
+    indexes (np.array): The sorted indexes of the kept samples, including the first and last one.
+
+    Returns:
+    float: The maximum error in mm, over all coils.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    dropped = np.setdiff1d(np.arange(len(points)), indexes)
+    if dropped.size == 0:
+        return 0.0
+    right = np.searchsorted(indexes, dropped)
+    return float(segment_distances(points[dropped], points[indexes[right - 1]], points[indexes[right]]).max())
+
+
+def get_lod_dir(path, cache_dir=None):
+    """
+    Return the directory holding the level-of-detail pyramid of a case: the case cache directory
+    under cache_dir, or under LOD_CACHE_DIR in the directory holding the case when cache_dir is None.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), LOD_CACHE_DIR)
+    return core.get_case_cache_dir(path, cache_dir)
+
+
+def build_lod(path, cache_dir=None):
+    """
+    Compute the RDP errors of a case and store them next to the case data.
+
+    The errors are stored as a (coils + 1, frames) float64 array: one row per coil simplified on its own,
+    and a last row for all coils simplified together. They are not rounded, so the error bounds derived
+    from them are exact.
+
+    Parameters:
+    path (str): The base directory path of the case.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+                               The pyramid is stored there, or in LOD_CACHE_DIR beside the case when it is None.
+
+    Returns:
+    np.array: The errors.
+    """
+    lod_dir = get_lod_dir(path, cache_dir)
+    os.makedirs(lod_dir, exist_ok=True)
+    signature = core.get_source_signature(path)
+    coords = core.get_coil_array_from_path(path, cache_dir).coords
+    errors = np.array(
+        [rdp_errors(coords[:, coil]) for coil in range(coords.shape[1])] + [rdp_errors(coords)], dtype=np.float64
+    ).reshape(-1, coords.shape[0])
+
+    tmp_path = os.path.join(lod_dir, 'lod_error.tmp.npy')
+    np.save(tmp_path, errors)
+    os.replace(tmp_path, os.path.join(lod_dir, 'lod_error.npy'))
+    tmp_path = os.path.join(lod_dir, 'lod_meta.tmp.json')
+    with open(tmp_path, 'w') as file:
+        json.dump({'source': os.path.abspath(path), 'signature': signature, 'dtype': errors.dtype.str}, file)
+    os.replace(tmp_path, os.path.join(lod_dir, 'lod_meta.json'))
+    return errors
+
+
+def get_lod_errors(path, cache_dir=None):
+    """
+    Read the stored RDP errors of a case, building them if they are missing, older than the coordinate files
+    or built from another case directory with the same name.
+    """
+    lod_dir = get_lod_dir(path, cache_dir)
+    try:
+        with open(os.path.join(lod_dir, 'lod_meta.json'), 'r') as file:
+            meta = json.load(file)
+        valid = (
+            meta.get('source') == os.path.abspath(path) and meta.get('signature') == core.get_source_signature(path)
+            and meta.get('dtype') == np.dtype(np.float64).str
+        )
+    except (OSError, ValueError):
+        valid = False
+    if not valid:
+        return build_lod(path, cache_dir)
+    return np.load(os.path.join(lod_dir, 'lod_error.npy'), mmap_mode='r')
+
+
+def get_simplified_lists_from_path(path, tolerance=None, max_points=None, coil=None, start=None, stop=None, cache_dir=None):
+    """
+    Read a case at a reduced level of detail, with a guaranteed maximum spatial error.
+
+    Parameters:
+    path (str): The base directory path of the case.
+    tolerance (float, optional): The maximum distance in mm of a dropped sample to the simplified path.
+    max_points (int, optional): The maximum number of samples returned.
+    coil (int, optional): Simplify for this coil only (0 for the tip plots). None simplifies all coils together.
+    start (int, optional): The first frame to consider, such as a landmark index.
+    stop (int, optional): The frame after the last one to consider.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+
+    Returns:
+    dict: 'X', 'Y', 'Z' as (samples, coils) arrays, 'T' as a (samples,) array, 'frames' holding the original
+          frame index of every sample and 'error', the maximum distance in mm of a dropped sample to the kept path.
+    """
+    X, Y, Z, T = (np.asarray(values) for values in core.get_all_lists_from_path(path, cache_dir))
+    errors = np.array(get_lod_errors(path, cache_dir)[-1 if coil is None else coil], dtype=np.float64)
+    frames = np.arange(len(T))[slice(start, stop)]
+    if frames.size == len(T):
+        indexes, error = select_indexes(errors, tolerance, max_points)
+    elif frames.size == 0:
+        indexes, error = frames, 0.0
+    else:
+        # The window ends are kept, but they are not RDP splits of the whole case. Only the first and last
+        # span can exceed the tolerance because of that, so those two spans (one when only the ends are kept)
+        # are simplified again on their own.
+        points = np.stack([X[frames], Y[frames], Z[frames]], axis=-1)
+        points = points if coil is None else points[:, coil]
+        errors = errors[frames]
+        errors[[0, -1]] = np.inf
+        indexes, _ = select_indexes(errors, tolerance, max_points)
+        if tolerance is not None and indexes.size >= 2:
+            for first, last in {(indexes[0], indexes[1]), (indexes[-2], indexes[-1])}:
+                span_indexes, _ = select_indexes(rdp_errors(points[first:last + 1]), tolerance)
+                indexes = np.union1d(indexes, first + span_indexes)
+        error = path_error(points, indexes)
+    frames = frames[indexes]
+    return {'X': X[frames], 'Y': Y[frames], 'Z': Z[frames], 'T': T[frames], 'frames': frames, 'error': error}
+
+
+def update_cohort_lod(source_path, meta_path='SIMMETA.txt', cache_dir=None):
+    """
+    Build the level-of-detail pyramid of every case in SIMMETA.txt that does not have an up-to-date one.
+    """
+    for case_ids in core.read_simmeta(meta_path).values():
+        for case_id in case_ids:
+            get_lod_errors(os.path.join(source_path, case_id), cache_dir)
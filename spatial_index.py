@@ -0,0 +1,365 @@
+'''
+A persistent spatial index over the tip (and optionally coil) samples of the cohort.
+
+Every entry is one sample: its position, the case it belongs to, its frame, its coil and its phase
+(0 for insertion, before cecum_index, and 1 for withdrawal, from cecum_index on). Samples are kept in
+KD-trees (scipy.spatial.cKDTree), one per phase and segment. Adding cases creates a new small segment
+instead of rebuilding the whole index; segments are merged once there are more than max_segments.
+
+Typical questions:
+
+- which cases passed within 10 mm of a point: index.cases_within(point, 10)
+- all samples inside a box during withdrawal: index.query_box(low, high, phase='withdrawal')
+- the k samples or k cases closest to a point: index.query_knn(point, k), index.nearest_cases(point, k)
+'''
+
+import os
+import json
+import numpy as np
+from scipy.spatial import cKDTree
+import core
+from dataset import LANDMARK_NAMES
+
+
+PHASES = {'insertion': 0, 'withdrawal': 1}
+FIELDS = ('points', 'case', 'frame', 'coil')
+
+
+class _Segment:
+    """
+    The samples of one phase added in one batch, with their KD-tree.
+    """
+
+    def __init__(self, points, case, frame, coil):
+        self.points = points
+        self.case = case
+        self.frame = frame
+        self.coil = coil
+        self.tree = cKDTree(points)
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def empty(cls):
+        """
+        A segment without samples or tree, giving the field types of empty query results.
+        """
+        segment = cls.__new__(cls)
+        segment.points = np.zeros((0, 3))
+        segment.case = np.zeros(0, dtype=np.int32)
+        segment.frame = np.zeros(0, dtype=np.int32)
+        segment.coil = np.zeros(0, dtype=np.int8)
+        return segment
+
+    @classmethod
+    def merge(cls, segments):
+        return cls(*(np.concatenate([getattr(segment, name) for segment in segments]) for name in FIELDS))
+
+
+class SpatialIndex:
+    """
+    Radius, box and k-nearest queries over the samples of many cases.
+
+    Parameters:
+    coils (tuple): The coils indexed for every case, 0 being the tip.
+    max_segments (int): Merge the segments of a phase into one when there are more than this many.
+    window (tuple, optional): The first and last landmark of the indexed frames of every case, as recorded
+                              by update_spatial_index. None when the cases were added with other windows.
+    """
+
+    def __init__(self, coils=(0,), max_segments=8, window=None):
+        self.coils = tuple(coils)
+        self.max_segments = max_segments
+        self.window = None if window is None else tuple(window)
+        self.case_ids = []
+        self._case_numbers = {}
+        self._segments = {phase: [] for phase in PHASES.values()}
+        self._pending = {phase: [] for phase in PHASES.values()}
+
+    def __len__(self):
+        self._flush()
+        return sum(len(segment) for segments in self._segments.values() for segment in segments)
+
+    def __contains__(self, case_id):
+        return case_id in self._case_numbers
+
+    def add_case(self, case_id, X, Y, Z, cecum_index, start=None, stop=None):
+        """
+        Add the samples of a case. They become searchable at the next query.
+
+        Parameters:
+        case_id (str): The case ID. A case already in the index is not added again.
+        X, Y, Z (list or np.array): The (frames, coils) coordinates.
+        cecum_index (int): The frame of the cecum; earlier frames are insertion, later ones withdrawal.
+        start (int, optional): The first frame to index, such as the start landmark.
+        stop (int, optional): The frame after the last one to index, such as the end landmark.
+        """
+        if case_id in self._case_numbers:
+            return
+        case_number = len(self.case_ids)
+        self.case_ids.append(case_id)
+        self._case_numbers[case_id] = case_number
+
+        frames = np.arange(len(X))[slice(start, stop)]
+        for coil in self.coils:
+            points = np.column_stack([np.asarray(values)[frames, coil] for values in (X, Y, Z)]).astype(np.float64)
+            for phase, selected in ((0, frames < cecum_index), (1, frames >= cecum_index)):
+                if selected.any():
+                    self._pending[phase].append((
+                        points[selected],
+                        np.full(selected.sum(), case_number, dtype=np.int32),
+                        frames[selected].astype(np.int32),
+                        np.full(selected.sum(), coil, dtype=np.int8)
+                    ))
+
+    def _flush(self):
+        """
+        Build a segment of the pending samples of every phase and merge segments when there are too many.
+        """
+        for phase, pending in self._pending.items():
+            if not pending:
+                continue
+            segments = self._segments[phase]
+            segments.append(_Segment(*(np.concatenate(arrays) for arrays in zip(*pending))))
+            pending.clear()
+            if len(segments) > self.max_segments:
+                self._segments[phase] = [_Segment.merge(segments)]
+
+    def compact(self):
+        """
+        Merge all segments of every phase into one, for the fastest queries.
+        """
+        self._flush()
+        for phase, segments in self._segments.items():
+            if len(segments) > 1:
+                self._segments[phase] = [_Segment.merge(segments)]
+
+    def _get_segments(self, phase):
+        self._flush()
+        if phase is None:
+            return [(number, segment) for number in PHASES.values() for segment in self._segments[number]]
+        number = PHASES[phase]
+        return [(number, segment) for segment in self._segments[number]]
+
+    def _result(self, parts, distances=None):
+        """
+        Turn (phase, segment, positions) parts into a result dictionary of arrays.
+        """
+        parts = [(phase, segment, np.asarray(positions, dtype=np.int64)) for phase, segment, positions in parts]
+        empty = _Segment.empty()
+
+        def gather(field):
+            return np.concatenate([getattr(empty, field)] + [getattr(segment, field)[positions] for _, segment, positions in parts])
+
+        result = {
+            'case_id': np.array(self.case_ids + [''], dtype=str)[gather('case')],
+            'frame': gather('frame'),
+            'coil': gather('coil'),
+            'phase': np.concatenate([np.zeros(0, dtype=np.int8)] + [np.full(len(positions), phase, dtype=np.int8) for phase, _, positions in parts]),
+            'point': gather('points')
+        }
+        if distances is not None:
+            result['distance'] = distances
+        return result
+
+    def query_radius(self, point, radius, phase=None, coil=None):
+        """
+        Return every sample within radius of a point.
+
+        Parameters:
+        point (array-like): The (3,) X, Y, Z position in mm.
+        radius (float): The search radius in mm.
+        phase (str, optional): 'insertion' or 'withdrawal'. None searches both.
+        coil (int, optional): Only return samples of this coil.
+
+        Returns:
+        dict: Arrays 'case_id', 'frame', 'coil', 'phase' (0 insertion, 1 withdrawal), 'point' and 'distance',
+              one entry per sample.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        parts = []
+        for number, segment in self._get_segments(phase):
+            positions = np.asarray(segment.tree.query_ball_point(point, radius), dtype=np.int64)
+            if coil is not None:
+                positions = positions[segment.coil[positions] == coil]
+            parts.append((number, segment, positions))
+        result = self._result(parts)
+        result['distance'] = np.linalg.norm(result['point'] - point, axis=1)
+        return result
+
+    def query_box(self, low, high, phase=None, coil=None):
+        """
+        Return every sample inside an axis-aligned box.
+
+        Parameters:
+        low, high (array-like): The (3,) lower and upper corners in mm.
+        phase (str, optional): 'insertion' or 'withdrawal'. None searches both.
+        coil (int, optional): Only return samples of this coil.
+
+        Returns:
+        dict: Arrays 'case_id', 'frame', 'coil', 'phase' and 'point', as for query_radius.
+        """
+        low = np.asarray(low, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        center = (low + high) / 2
+        half_width = float(np.max(high - low)) / 2
+        parts = []
+        for number, segment in self._get_segments(phase):
+            # The Chebyshev ball around the centre is the smallest cube holding the box; trim it to the box
+            positions = np.asarray(segment.tree.query_ball_point(center, half_width, p=np.inf), dtype=np.int64)
+            inside = np.all((segment.points[positions] >= low) & (segment.points[positions] <= high), axis=1)
+            if coil is not None:
+                inside &= segment.coil[positions] == coil
+            parts.append((number, segment, positions[inside]))
+        return self._result(parts)
+
+    def query_knn(self, point, k=1, phase=None, coil=None):
+        """
+        Return the k samples closest to a point, closest first.
+
+        Parameters:
+        point (array-like): The (3,) X, Y, Z position in mm.
+        k (int): The number of samples.
+        phase (str, optional): 'insertion' or 'withdrawal'. None searches both.
+        coil (int, optional): Only return samples of this coil.
+
+        Returns:
+        dict: Arrays 'case_id', 'frame', 'coil', 'phase', 'point' and 'distance', as for query_radius.
+        """
+        point = np.asarray(point, dtype=np.float64)
+        candidates = []
+        for number, segment in self._get_segments(phase):
+            # With a coil filter, ask for more neighbours until k of that coil are found or the segment is exhausted
+            wanted = k
+            while True:
+                count = min(wanted, len(segment))
+                distances, positions = segment.tree.query(point, k=count)
+                distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+                if coil is not None:
+                    keep = segment.coil[positions] == coil
+                    distances, positions = distances[keep], positions[keep]
+                if len(positions) >= k or count == len(segment):
+                    break
+                wanted *= 4
+            candidates.extend((distance, number, segment, position) for distance, position in zip(distances[:k], positions[:k]))
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        candidates = candidates[:k]
+        parts = [(number, segment, [position]) for _, number, segment, position in candidates]
+        return self._result(parts, np.array([candidate[0] for candidate in candidates]))
+
+    def cases_within(self, point, radius, phase=None, coil=None):
+        """
+        Return the sorted IDs of the cases with at least one sample within radius of a point.
+        """
+        return sorted(set(self.query_radius(point, radius, phase, coil)['case_id'].tolist()))
+
+    def nearest_cases(self, point, k=1, phase=None, coil=None):
+        """
+        Return the k cases whose paths come closest to a point.
+
+        Returns:
+        list: (case_id, distance, frame) tuples, closest first, with the frame of the closest sample of each case.
+        """
+        n_samples = k
+        total = len(self)
+        while True:
+            result = self.query_knn(point, n_samples, phase, coil)
+            closest = {}
+            for case_id, distance, frame in zip(result['case_id'].tolist(), result['distance'].tolist(), result['frame'].tolist()):
+                if case_id not in closest:
+                    closest[case_id] = (case_id, distance, frame)
+            if len(closest) >= k or n_samples >= total:
+                return list(closest.values())[:k]
+            n_samples = min(n_samples * 4, total)
+
+    def save(self, path):
+        """
+        Save to a directory holding one .npy file per phase and field and a meta.json. The trees are rebuilt on load.
+        """
+        self.compact()
+        os.makedirs(path, exist_ok=True)
+        for name, number in PHASES.items():
+            segments = self._segments[number]
+            for field in FIELDS:
+                np.save(os.path.join(path, f'{name}_{field}.npy'), getattr(segments[0] if segments else _Segment.empty(), field))
+        tmp_path = os.path.join(path, 'meta.tmp.json')
+        with open(tmp_path, 'w') as file:
+            json.dump({
+                'case_ids': self.case_ids, 'coils': list(self.coils), 'max_segments': self.max_segments,
+                'window': None if self.window is None else list(self.window)
+            }, file)
+        os.replace(tmp_path, os.path.join(path, 'meta.json'))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load an index saved with save().
+        """
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            meta = json.load(file)
+        index = cls(meta['coils'], meta['max_segments'], meta.get('window'))
+        index.case_ids = meta['case_ids']
+        index._case_numbers = {case_id: number for number, case_id in enumerate(index.case_ids)}
+        for name, number in PHASES.items():
+            arrays = [np.load(os.path.join(path, f'{name}_{field}.npy')) for field in FIELDS]
+            if len(arrays[0]):
+                index._segments[number] = [_Segment(*arrays)]
+        return index
+
+
+def update_spatial_index(source_path, meta_path='SIMMETA.txt', index_path=None, coils=(0,), cache_dir=None,
+                         window=('start', 'end')):
+    """
+    Build the spatial index of the cohort, or update a saved one with the cases it does not hold yet.
+
+    Only the samples between the two window landmarks of each case are indexed, both included.
+
+    Parameters:
+    source_path (str): The base directory containing the case directories.
+    meta_path (str): The path of SIMMETA.txt.
+    index_path (str, optional): The directory of a saved index to update and save back. It must have been
+                                built with the same coils and window, otherwise a ValueError is raised.
+    coils (tuple): The coils to index, 0 being the tip.
+    cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    window (tuple): The first and last landmark to index, from dataset.LANDMARK_NAMES. None for the first
+                    or last frame of the case.
+
+    Returns:
+    SpatialIndex: The cohort index.
+    """
+    coils = tuple(coils)
+    window = tuple(window)
+    for name in window:
+        if name is not None and name not in LANDMARK_NAMES:
+            raise ValueError(f'Unknown landmark {name!r}, expected one of {LANDMARK_NAMES}')
+
+    if index_path is not None and os.path.exists(os.path.join(index_path, 'meta.json')):
+        index = SpatialIndex.load(index_path)
+        if index.coils != coils:
+            raise ValueError(f'{index_path} indexes coils {index.coils}, not {coils}')
+        if index.window != window:
+            raise ValueError(f'{index_path} indexes the window {index.window}, not {window}')
+    else:
+        index = SpatialIndex(coils, window=window)
+
+    added = False
+    for case_ids in core.read_simmeta(meta_path).values():
+        for case_id in case_ids:
+            if case_id in index:
+                continue
+            path = os.path.join(source_path, case_id)
+            X, Y, Z, T = core.get_all_lists_from_path(path, cache_dir)
+            landmarks = dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(path, T)))
+            start_index = None if window[0] is None else landmarks[window[0]]
+            stop_index = None if window[1] is None else landmarks[window[1]] + 1
+            if start_index is not None and stop_index is not None and stop_index <= start_index + 1:
+                # A missing or earlier last landmark indexes the case to its last frame
+                stop_index = None
+            index.add_case(case_id, X, Y, Z, landmarks['cecum'], start_index, stop_index)
+            added = True
+
+    if index_path is not None and added:
+        index.save(index_path)
+    return index
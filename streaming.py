@@ -0,0 +1,361 @@
+'''
+Streaming mode: smooth coil positions and align log events while samples arrive.
+
+Samples come in one csv line at a time from a file being written (tail_lines), a local socket
+(socket_lines) or a recorded csv replayed at real-time or faster speed (replay_csv). Each line is
+parsed, pushed through a ring-buffer running average per coil and emitted as a smoothed frame.
+
+The running average equals pre_processing.running_average (np.convolve with mode='same') on the
+whole recording. The centred window needs (window - 1) // 2 later samples, so a frame is emitted
+that many samples after it arrives; flush() emits the last frames when the stream ends.
+'''
+
+import socket
+import time
+from collections import deque
+import numpy as np
+
+
+def parse_time_us(timestr):
+    """
+    Parse one '%H:%M:%S:%f' time string into microseconds since midnight, as sensor_io.parse_time_array does.
+    """
+    hours, minutes, seconds, fraction = timestr.split(':')
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 10**6 + int(fraction.strip().ljust(6, '0'))
+
+
+def make_csv_parser(columns):
+    """
+    Return a parser for raw sensor csv lines.
+
+    Parameters:
+    columns (list): The file columns holding the coil coordinates, as X, Y, Z of coil 0, then coil 1, and so on.
+                    Column 0 is the timestamp.
+
+    Returns:
+    callable: A function turning a line into (time in microseconds, (coils, 3) float array),
+              or None for a line that is not a sample (such as the header).
+    """
+    columns = list(columns)
+
+    def parse(line):
+        fields = line.rstrip('\n').split(',')
+        try:
+            time_us = parse_time_us(fields[0])
+            values = np.array([float(fields[column]) for column in columns])
+        except (ValueError, IndexError):
+            return None
+        return time_us, values.reshape(-1, 3)
+
+    return parse
+
+
+class RunningAverage:
+    """
+    A centred running average over all coils, updated in O(1) per coil and sample with a ring buffer.
+
+    Parameters:
+    window_size (int): The number of samples averaged, as in pre_processing.running_average.
+    n_coils (int): The number of coils.
+    resum_every (int): Recompute the running sum from the buffer every this many samples, so
+                       floating point error does not accumulate over long procedures.
+    """
+
+    def __init__(self, window_size, n_coils, resum_every=4096):
+        self.window_size = window_size
+        self.delay = (window_size - 1) // 2
+        self.buffer = np.zeros((window_size, n_coils, 3))
+        self.total = np.zeros((n_coils, 3))
+        self.position = 0
+        self.count = 0
+        self.resum_every = resum_every
+
+    def push(self, values):
+        """
+        Add one (coils, 3) sample.
+
+        Returns:
+        np.array or None: The smoothed (coils, 3) position of the sample delay samples back,
+                          or None while fewer than delay + 1 samples have arrived.
+        """
+        slot = self.position
+        self.total += values - self.buffer[slot]
+        self.buffer[slot] = values
+        self.position = (slot + 1) % self.window_size
+        self.count += 1
+        if self.count % self.resum_every == 0:
+            self.total = self.buffer.sum(axis=0)
+        if self.count <= self.delay:
+            return None
+        return self.total / self.window_size
+
+    def flush(self):
+        """
+        Emit the smoothed positions of the samples not emitted yet, padding with zeros as np.convolve does.
+
+        A stream shorter than the delay emits one position per sample, averaged over the samples available.
+
+        Returns:
+        list: The remaining (coils, 3) smoothed positions, in order, one per sample still waiting.
+        """
+        zeros = np.zeros_like(self.total)
+        remaining = []
+        for _ in range(self.delay):
+            smoothed = self.push(zeros)
+            if smoothed is not None:
+                remaining.append(smoothed)
+        return remaining
+
+
+class LiveAligner:
+    """
+    Aligns log events to frames while the procedure runs.
+
+    Offline, ps.align_event_times relates log times to sample times through the shared end of the
+    recording. Live, the end is unknown, so the offset between the clocks is taken from the first event:
+    it is aligned to the latest frame received when it arrives. Later events use the same offset.
+
+    Parameters:
+    offset_ms (float, optional): A known offset (sample time minus log time, in ms).
+    """
+
+    LANDMARKS = {
+        'Endoscopy started': 'start',
+        'Fleksur L': 'flexur_L',
+        'Fleksur R': 'flexur_R',
+        'Cecum': 'cecum',
+        'Endoscopy ended': 'end',
+        'Recording ended': 'end'
+    }
+
+    def __init__(self, offset_ms=None):
+        self.offset_ms = offset_ms
+        self.times = np.zeros(1024)
+        self.frame_count = 0
+        self.landmarks = {}
+
+    def add_frame(self, time_ms):
+        """
+        Record the time of the next received frame (amortized O(1)).
+        """
+        if self.frame_count == self.times.size:
+            self.times = np.concatenate([self.times, np.zeros(self.times.size)])
+        self.times[self.frame_count] = time_ms
+        self.frame_count += 1
+
+    def add_event(self, line):
+        """
+        Align one 'time;event;' log line to a received frame.
+
+        Returns:
+        dict or None: 'event', 'landmark' (or None), 'frame' and 'time' (log time in seconds), or None if
+                      the line cannot be parsed or no frame has arrived yet.
+        """
+        parts = line.split(';')
+        try:
+            event_time = float(parts[0])
+            event = parts[1]
+        except (ValueError, IndexError):
+            return None
+        if self.frame_count == 0:
+            return None
+
+        times = self.times[:self.frame_count]
+        if self.offset_ms is None:
+            self.offset_ms = times[-1] - event_time * 1000
+        target = event_time * 1000 + self.offset_ms
+        index = min(int(np.searchsorted(times, target)), self.frame_count - 1)
+        if index > 0 and abs(times[index - 1] - target) <= abs(times[index] - target):
+            index -= 1
+
+        landmark = next((name for text, name in self.LANDMARKS.items() if text in event), None)
+        if landmark == 'cecum' and 'cecum' in self.landmarks:
+            landmark = None
+        if landmark is not None:
+            self.landmarks[landmark] = index
+        return {'event': event, 'landmark': landmark, 'frame': index, 'time': event_time}
+
+
+class StreamingPipeline:
+    """
+    Turns raw sample lines into smoothed frames with bounded latency.
+
+    Parameters:
+    parser (callable): A function from a line to (time in microseconds, (coils, 3) array) or None, see make_csv_parser.
+    n_coils (int): The number of coils.
+    window_size (int): The running average window, as in pre_processing.averager_coils.
+    """
+
+    def __init__(self, parser, n_coils, window_size):
+        self.parser = parser
+        self.average = RunningAverage(window_size, n_coils)
+        self.aligner = LiveAligner()
+        self.first_time_us = None
+        self.pending = deque()
+        self.frame_count = 0
+
+    def _emit(self, smoothed):
+        frame_time, received = self.pending.popleft()
+        output = {'frame': self.frame_count, 'time': frame_time, 'position': smoothed, 'received': received, 'emitted': time.perf_counter()}
+        self.frame_count += 1
+        return output
+
+    def push_line(self, line, received=None):
+        """
+        Parse and smooth one sample line.
+
+        Parameters:
+        line (str): The raw line.
+        received (float, optional): When the line arrived (time.perf_counter()), for latency measurement.
+
+        Returns:
+        dict or None: A smoothed frame with 'frame', 'time' (ms since the first sample), 'position'
+                      ((coils, 3) array), 'received' and 'emitted', or None while the window fills.
+        """
+        sample = self.parser(line)
+        if sample is None:
+            return None
+        time_us, values = sample
+        if self.first_time_us is None:
+            self.first_time_us = time_us
+        time_ms = ((time_us - self.first_time_us) / 10**6) * 1000
+        self.pending.append((time_ms, time.perf_counter() if received is None else received))
+        self.aligner.add_frame(time_ms)
+
+        smoothed = self.average.push(values)
+        return None if smoothed is None else self._emit(smoothed)
+
+    def push_event(self, line):
+        """
+        Align one LogFile line to the frames received so far, see LiveAligner.add_event.
+        """
+        return self.aligner.add_event(line)
+
+    def flush(self):
+        """
+        Emit the frames still waiting for later samples, at the end of the stream.
+        """
+        return [self._emit(smoothed) for smoothed in self.average.flush()]
+
+    def run(self, lines):
+        """
+        Process an iterable of lines (or (line, received) pairs) and yield smoothed frames, flushing at the end.
+        """
+        for item in lines:
+            line, received = item if isinstance(item, tuple) else (item, None)
+            output = self.push_line(line, received)
+            if output is not None:
+                yield output
+        yield from self.flush()
+
+
+def tail_lines(path, poll_interval=0.05, timeout=None):
+    """
+    Yield lines appended to a file as it is being written, like tail -f.
+
+    Parameters:
+    path (str): The file to follow, read from its beginning.
+    poll_interval (float): Seconds to wait before checking for new data.
+    timeout (float, optional): Stop after this many seconds without new data.
+    """
+    with open(path, 'r') as file:
+        partial = ''
+        idle_since = time.perf_counter()
+        while True:
+            chunk = file.readline()
+            if chunk:
+                partial += chunk
+                if partial.endswith('\n'):
+                    yield partial
+                    partial = ''
+                idle_since = time.perf_counter()
+            elif timeout is not None and time.perf_counter() - idle_since > timeout:
+                return
+            else:
+                time.sleep(poll_interval)
+
+
+def socket_lines(host='127.0.0.1', port=5555, buffer_size=65536):
+    """
+    Yield lines received on a TCP connection, a local stand-in for the device output.
+    """
+    with socket.create_connection((host, port)) as connection:
+        partial = b''
+        while True:
+            data = connection.recv(buffer_size)
+            if not data:
+                break
+            partial += data
+            *lines, partial = partial.split(b'\n')
+            for line in lines:
+                yield line.decode() + '\n'
+
+
+def replay_csv(path, speed=1.0):
+    """
+    Replay a recorded sensor csv at real-time (speed=1), faster (speed>1) or unthrottled (speed=inf).
+
+    Yields:
+    tuple: (line, scheduled) where scheduled is the time.perf_counter() at which the line was due.
+           The header line is yielded first, without waiting.
+    """
+    with open(path, 'r') as file:
+        lines = file.readlines()
+    if not lines:
+        return
+    yield lines[0], time.perf_counter()
+
+    start = time.perf_counter()
+    first_time = None
+    for line in lines[1:]:
+        time_us = parse_time_us(line.split(',', 1)[0])
+        if first_time is None:
+            first_time = time_us
+        scheduled = start + (time_us - first_time) / 10**6 / speed if np.isfinite(speed) else time.perf_counter()
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield line, scheduled
+
+
+def serve_replay(path, port=5555, speed=1.0, host='127.0.0.1'):
+    """
+    Serve a recorded csv on a local TCP port at the given speed, for one client, to stand in for the device.
+    """
+    with socket.create_server((host, port)) as server:
+        connection, _ = server.accept()
+        with connection:
+            for line, _ in replay_csv(path, speed):
+                connection.sendall(line.encode())
+
+
+def benchmark_replay(path, columns, window_size, speed=float('inf')):
+    """
+    Replay a recorded csv through the streaming pipeline and report latency and throughput.
+
+    Latency is the time from when a sample was due to when its smoothed frame was emitted, so it includes
+    the (window_size - 1) // 2 samples the centred window waits for.
+
+    Parameters:
+    path (str): The recorded sensor csv.
+    columns (list): The coil coordinate columns, see make_csv_parser.
+    window_size (int): The running average window.
+    speed (float): The replay speed, see replay_csv.
+
+    Returns:
+    dict: 'frames', 'seconds', 'frames_per_second' and latency 'mean', 'p50', 'p99' and 'max' in ms.
+    """
+    pipeline = StreamingPipeline(make_csv_parser(columns), len(columns) // 3, window_size)
+    start = time.perf_counter()
+    latencies = [(frame['emitted'] - frame['received']) * 1000 for frame in pipeline.run(replay_csv(path, speed))]
+    seconds = time.perf_counter() - start
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'frames': len(latencies),
+        'seconds': seconds,
+        'frames_per_second': len(latencies) / seconds if seconds > 0 else float('inf'),
+        'mean': float(latencies.mean()),
+        'p50': float(np.percentile(latencies, 50)),
+        'p99': float(np.percentile(latencies, 99)),
+        'max': float(latencies.max())
+    }
@@ -0,0 +1,189 @@
+import os
+import datetime
+import numpy as np
+
+
+LANDMARK_FRACTIONS = {
+    'Endoscopy started': 0.02,
+    'Fleksur L': 0.15,
+    'Fleksur R': 0.3,
+    'Cecum': 0.45,
+    'Endoscopy ended': 0.97
+}
+EVENT_NAMES = ['Flush', 'Biopsy', 'Polyp', 'Polypectomi']
+
+
+def generate_colon_path(n_points, rng):
+    """
+    Generate a smooth 3D centre line loosely shaped like a colon, from the rectum to the cecum.
+
+    Parameters:
+    n_points (int): The number of points on the line.
+    rng (np.random.Generator): The random generator.
+
+    Returns:
+    np.array: A (n_points, 3) array of X, Y, Z coordinates in millimetres.
+    """
+    s = np.linspace(0, 1, n_points)
+    x = 120 * np.sin(2.2 * np.pi * s + rng.uniform(-0.3, 0.3)) * (0.6 + 0.4 * s)
+    y = 150 * np.cos(1.6 * np.pi * s + rng.uniform(-0.3, 0.3)) - 40 * s
+    z = 80 + 320 * s + 30 * np.sin(5 * np.pi * s)
+    return np.column_stack([x, y, z])
+
+
+def generate_case(n_samples=3000, n_coils=8, rng=None, coil_spacing=40):
+    """
+    Generate the coordinates and times of one synthetic procedure.
+
+    The tip advances along a colon-like path to the cecum and is then withdrawn, with jitter
+    and short back-and-forth movements. The other coils trail behind the tip along the same path.
+
+    Parameters:
+    n_samples (int): The number of samples.
+    n_coils (int): The number of coils, coil 0 being the tip.
+    rng (np.random.Generator, optional): The random generator.
+    coil_spacing (int): The distance between coils, in path points.
+
+    Returns:
+    tuple: X, Y, Z as (n_samples, n_coils) arrays rounded to 2 decimals and T as an (n_samples,)
+           array of milliseconds with irregular spacing around 200 ms.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    path = generate_colon_path(2000, rng)
+
+    # Depth of the tip along the path: insertion to the cecum, then withdrawal, with small reversals
+    cecum_sample = int(LANDMARK_FRACTIONS['Cecum'] * n_samples)
+    depth = np.concatenate([
+        np.linspace(0, 1, cecum_sample),
+        np.linspace(1, 0.05, n_samples - cecum_sample)
+    ])
+    depth += 0.01 * np.sin(np.linspace(0, 60 * np.pi, n_samples)) + rng.normal(0, 0.002, n_samples)
+    tip_position = np.clip(depth, 0, 1) * (len(path) - 1)
+
+    coil_positions = np.clip(tip_position[:, np.newaxis] - coil_spacing * np.arange(n_coils), 0, len(path) - 1)
+    coil_positions = np.round(coil_positions).astype(int)
+    coords = path[coil_positions] + rng.normal(0, 0.8, (n_samples, n_coils, 3))
+    coords = np.round(coords, 2)
+
+    T = np.round(np.cumsum(rng.uniform(180, 220, n_samples)) - 200, 1)
+    return coords[..., 0], coords[..., 1], coords[..., 2], T
+
+
+def generate_log(T, n_events=12, rng=None):
+    """
+    Generate LogFile_P.txt lines for a synthetic procedure.
+
+    Log times are in seconds. The last line is 'Recording ended' at the time of the last sample,
+    which is how ps.align_event_times relates the log to the coordinates.
+
+    Parameters:
+    T (np.array): The sample times in milliseconds.
+    n_events (int): The number of Flush/Biopsy/Polyp/Polypectomi events, placed during withdrawal.
+    rng (np.random.Generator, optional): The random generator.
+
+    Returns:
+    list: The log lines, each ending with ';\\n'.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    log_start = rng.uniform(5, 60)
+    duration = (T[-1] - T[0]) / 1000
+
+    entries = [(log_start, 'Recording started')]
+    for name, fraction in LANDMARK_FRACTIONS.items():
+        entries.append((log_start + fraction * duration, name))
+    cecum_time = log_start + LANDMARK_FRACTIONS['Cecum'] * duration
+    end_time = log_start + LANDMARK_FRACTIONS['Endoscopy ended'] * duration
+    for event_time in rng.uniform(cecum_time, end_time, n_events):
+        entries.append((event_time, str(rng.choice(EVENT_NAMES))))
+
+    entries.sort()
+    entries.append((log_start + duration, 'Recording ended'))
+    return [f'{event_time:.3f};{name};\n' for event_time, name in entries]
+
+
+def write_txt(path, values):
+    """
+    Write a (frames, coils) array in the semicolon-separated format read by ps.get_list_from_txt.
+    """
+    values = np.atleast_2d(values)
+    with open(path, 'w') as file:
+        for row in values:
+            file.write(''.join(f'{value};' for value in row) + '\n')
+
+
+def write_case(case_dir, n_samples=3000, n_coils=8, n_events=12, rng=None):
+    """
+    Write a synthetic processed case directory with X.txt, Y.txt, Z.txt, T.txt and LogFile_P.txt.
+
+    Parameters:
+    case_dir (str): The directory to write, created if needed.
+    n_samples (int): The number of samples.
+    n_coils (int): The number of coils.
+    n_events (int): The number of logged Flush/Biopsy/Polyp/Polypectomi events.
+    rng (np.random.Generator, optional): The random generator.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    os.makedirs(case_dir, exist_ok=True)
+    X, Y, Z, T = generate_case(n_samples, n_coils, rng)
+    write_txt(os.path.join(case_dir, 'X.txt'), X)
+    write_txt(os.path.join(case_dir, 'Y.txt'), Y)
+    write_txt(os.path.join(case_dir, 'Z.txt'), Z)
+    write_txt(os.path.join(case_dir, 'T.txt'), np.repeat(T[:, np.newaxis], n_coils, axis=1))
+    with open(os.path.join(case_dir, 'LogFile_P.txt'), 'w') as file:
+        file.writelines(generate_log(T, n_events, rng))
+
+
+def write_dataset(out_dir, n_cases=10, n_samples=3000, n_coils=8, n_groups=2, n_events=12, seed=0):
+    """
+    Write a synthetic processed delivery: case directories under out_dir/SimBatch and a matching out_dir/SIMMETA.txt.
+
+    Parameters:
+    out_dir (str): The directory to write.
+    n_cases (int): The number of cases, spread round-robin over the groups.
+    n_samples (int): The number of samples per case.
+    n_coils (int): The number of coils.
+    n_groups (int): The number of group keys (G01, G02, ...).
+    n_events (int): The number of logged events per case.
+    seed (int): The random seed.
+
+    Returns:
+    tuple: The source path holding the case directories and the path of SIMMETA.txt.
+    """
+    rng = np.random.default_rng(seed)
+    source_path = os.path.join(out_dir, 'SimBatch')
+    meta_path = os.path.join(out_dir, 'SIMMETA.txt')
+    os.makedirs(source_path, exist_ok=True)
+
+    with open(meta_path, 'w') as metafile:
+        for case_no in range(n_cases):
+            case_id = f'case{case_no:08d}'
+            root = f'/synthetic//Unprocessed/G{case_no % n_groups + 1:02d}'
+            dst_dir = os.path.join(source_path, case_id) + os.sep
+            write_case(dst_dir, n_samples, n_coils, n_events, rng)
+            metafile.write(f'{root};sensor_{case_no}.csv;{case_id};{dst_dir};\n')
+
+    return source_path, meta_path
+
+
+def write_sensor_csv(path, n_samples=3000, n_columns=24, rng=None, start='09:30:00'):
+    """
+    Write a synthetic raw sensor csv: a header, then a '%H:%M:%S:%f' timestamp and n_columns values per line,
+    each line ending with a trailing comma.
+
+    Parameters:
+    path (str): The file to write.
+    n_samples (int): The number of lines after the header.
+    n_columns (int): The number of value columns.
+    rng (np.random.Generator, optional): The random generator.
+    start (str): The time of the first sample, as '%H:%M:%S'.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    first_time = datetime.datetime.strptime(start, '%H:%M:%S')
+    offsets = np.cumsum(rng.integers(180000, 220000, n_samples))
+    values = np.round(rng.normal(0, 100, (n_samples, n_columns)), 3)
+
+    with open(path, 'w') as file:
+        file.write('Time,' + ','.join(f'S{column}' for column in range(n_columns)) + ',\n')
+        for offset, row in zip(offsets, values):
+            timestamp = (first_time + datetime.timedelta(microseconds=int(offset))).strftime('%H:%M:%S:%f')
+            file.write(timestamp + ',' + ','.join(str(value) for value in row) + ',\n')
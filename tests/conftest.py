@@ -0,0 +1,26 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core
+import synthetic_data
+
+
+@pytest.fixture(scope='session')
+def delivery(tmp_path_factory):
+    """
+    A small synthetic processed delivery: (source_path, meta_path, case_ids).
+    """
+    out_dir = tmp_path_factory.mktemp('delivery')
+    source_path, meta_path = synthetic_data.write_dataset(str(out_dir), n_cases=4, n_samples=600, n_coils=3, n_events=6, seed=3)
+    case_ids = [case_id for ids in core.read_simmeta(meta_path).values() for case_id in ids]
+    return source_path, meta_path, case_ids
+
+
+@pytest.fixture(autouse=True)
+def fresh_timeline_cache():
+    core.clear_timeline_cache()
+    yield
+    core.clear_timeline_cache()
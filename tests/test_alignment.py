@@ -0,0 +1,111 @@
+import os
+import shutil
+import numpy as np
+import pytest
+
+import core
+
+
+def baseline_index(T_list, adjusted_time):
+    """
+    The lookup of the original loaders: the closest value by a full scan, then its first index.
+    """
+    closest_value = min(T_list, key=lambda x: abs(x - adjusted_time))
+    return T_list.index(closest_value)
+
+
+def baseline_landmark_indexes(path, T_list):
+    """
+    The original get_landmark_indexes, one log line and one full scan at a time.
+    """
+    landmarks = {'Cecum': 0, 'Fleksur L': 0, 'Fleksur R': 0, 'Start': 0, 'End': 0}
+    cecum_found = False
+    with open(os.path.join(path, 'LogFile_P.txt'), 'r') as file:
+        lines = file.readlines()
+    end_coordinates_time = T_list[-1]
+    end_time = float(lines[-1].split(';')[0]) * 1000
+
+    def index(timestamp):
+        return baseline_index(T_list, end_coordinates_time - (end_time - (float(timestamp) * 1000)))
+
+    for line in lines:
+        timestamp, event = line.split(';')[0], line.split(';')[1]
+        if 'Endoscopy started' in event:
+            landmarks['Start'] = index(timestamp)
+        if 'Cecum' in event and not cecum_found:
+            cecum_found = True
+            landmarks['Cecum'] = index(timestamp)
+        if 'Fleksur L' in event and not cecum_found:
+            landmarks['Fleksur L'] = index(timestamp)
+        if 'Fleksur R' in event and not cecum_found:
+            landmarks['Fleksur R'] = index(timestamp)
+        if 'Recording ended' in event or 'Endoscopy ended' in event:
+            landmarks['End'] = index(timestamp)
+    return (landmarks['Cecum'], landmarks['Fleksur L'], landmarks['Fleksur R'], landmarks['End'], landmarks['Start'])
+
+
+def baseline_event_indexes(path, T_list):
+    """
+    The original get_event_indexes.
+    """
+    event_lists = {'Flush': [], 'Biopsy': [], 'Polyp': [], 'Polypectomi': []}
+    with open(os.path.join(path, 'LogFile_P.txt'), 'r') as file:
+        lines = file.readlines()
+    end_coordinates_time = T_list[-1]
+    end_time = float(lines[-1].split(';')[0]) * 1000
+    for line in lines[1:]:
+        timestamp, event = line.split(';')[:2]
+        if event in event_lists:
+            event_lists[event].append(baseline_index(T_list, end_coordinates_time - (end_time - (float(timestamp) * 1000))))
+    return [[event, indexes] for event, indexes in event_lists.items()]
+
+
+def test_nearest_time_indexes_matches_full_scan():
+    rng = np.random.default_rng(0)
+    T_list = list(np.round(np.cumsum(rng.uniform(0, 20, 500)), 0))
+    # Repeated values, ties halfway between samples and times outside the recording
+    times = np.concatenate([rng.uniform(-100, T_list[-1] + 100, 300), (np.array(T_list[:-1]) + np.array(T_list[1:])) / 2, T_list[::7]])
+    expected = [baseline_index(T_list, time) for time in times]
+    np.testing.assert_array_equal(core.nearest_time_indexes(T_list, times), expected)
+
+
+def test_nearest_time_indexes_unsorted_times():
+    rng = np.random.default_rng(1)
+    T_list = list(rng.uniform(0, 1000, 200))
+    times = rng.uniform(-10, 1010, 100)
+    np.testing.assert_array_equal(core.nearest_time_indexes(T_list, times), [baseline_index(T_list, time) for time in times])
+
+
+def test_landmarks_and_events_match_baseline(delivery):
+    source_path, _, case_ids = delivery
+    for case_id in case_ids:
+        path = os.path.join(source_path, case_id)
+        T_list = core.get_all_lists_from_path(path)[3]
+        assert core.get_landmark_indexes(path, T_list) == baseline_landmark_indexes(path, T_list)
+        assert core.get_event_indexes(path, T_list) == baseline_event_indexes(path, T_list)
+
+
+def test_timeline_cache_is_keyed_on_every_time(delivery):
+    source_path, _, case_ids = delivery
+    path = os.path.join(source_path, case_ids[0])
+    T = np.asarray(core.get_all_lists_from_path(path)[3], dtype=np.float64)
+    shifted = T.copy()
+    # Same length and end points, different samples in between
+    shifted[1:-1] = T[0] + (T[1:-1] - T[0]) * 0.5
+
+    first = core.get_case_timeline(path, T)
+    second = core.get_case_timeline(path, shifted)
+    assert not np.array_equal(first['frame'], second['frame'])
+    np.testing.assert_array_equal(core.get_case_timeline(path, T)['frame'], first['frame'])
+
+    first['frame'][:] = -5
+    assert (core.get_case_timeline(path, T)['frame'] != -5).any()
+
+
+def test_log_without_end_time_raises(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    shutil.copy(os.path.join(source_path, case_ids[0], 'LogFile_P.txt'), tmp_path)
+    with open(tmp_path / 'LogFile_P.txt', 'a') as file:
+        file.write('not a time;Note;\n')
+    with pytest.raises(ValueError):
+        core.read_log_file(str(tmp_path))
@@ -0,0 +1,28 @@
+import os
+import numpy as np
+
+import benchmarks
+import core
+import synthetic_data
+
+
+def test_synthetic_dataset_is_deterministic(tmp_path):
+    first = synthetic_data.write_dataset(str(tmp_path / 'first'), n_cases=2, n_samples=100, n_coils=2, seed=7)
+    second = synthetic_data.write_dataset(str(tmp_path / 'second'), n_cases=2, n_samples=100, n_coils=2, seed=7)
+    assert core.read_simmeta(first[1]) == core.read_simmeta(second[1])
+    for case_id in os.listdir(first[0]):
+        for a, b in zip(core.get_all_lists_from_path(os.path.join(first[0], case_id)), core.get_all_lists_from_path(os.path.join(second[0], case_id))):
+            np.testing.assert_array_equal(np.asarray(a), np.asarray(b))
+
+
+def test_every_benchmark_runs(delivery, tmp_path):
+    source_path, meta_path, case_ids = delivery
+    sensor_path = str(tmp_path / 'sensor.csv')
+    synthetic_data.write_sensor_csv(sensor_path, n_samples=200, n_columns=9, rng=np.random.default_rng(0))
+
+    names = []
+    for name, unit, items, function in benchmarks.get_benchmarks(source_path, case_ids, str(tmp_path / 'cache'), sensor_path, os.path.dirname(meta_path)):
+        seconds, peak = benchmarks.measure(function, repeat=1)
+        assert items > 0 and seconds >= 0 and peak >= 0
+        names.append(name)
+    assert 'preprocessing: CoilArray.from_rows' in names and 'preprocessing: smooth_coil_array' in names
@@ -0,0 +1,92 @@
+import os
+import shutil
+import numpy as np
+import pytest
+
+import case_index
+import core
+import usage_examples
+
+
+def write_meta(meta_path, entries):
+    with open(meta_path, 'w') as file:
+        for group_key, case_id, case_dir in entries:
+            file.write(f'/raw//Unprocessed/{group_key};sensor_{case_id}.csv;{case_id};{case_dir};\n')
+
+
+@pytest.fixture
+def cohort(delivery, tmp_path):
+    """
+    The delivery cases under random-looking case IDs, listed in SIMMETA.txt in neither sorted nor grouped order.
+    """
+    source_path, _, case_ids = delivery
+    new_source = tmp_path / 'SimBatch'
+    rng = np.random.default_rng(0)
+    entries = []
+    for case_id, group_key in zip(case_ids, ['G02', 'G01', 'G02', 'G01']):
+        new_id = ''.join(rng.choice(list('abcdefghijklmnopqrstuvwxyzABCDEFGHIJ0123456789'), 12))
+        shutil.copytree(os.path.join(source_path, case_id), new_source / new_id)
+        entries.append((group_key, new_id, str(new_source / new_id)))
+    meta_path = str(tmp_path / 'SIMMETA.txt')
+    write_meta(meta_path, entries)
+    return str(new_source), meta_path, entries
+
+
+def test_index_matches_the_cases(cohort, tmp_path):
+    source_path, meta_path, entries = cohort
+    db_path = str(tmp_path / 'index.db')
+    assert case_index.build_case_index(db_path, source_path, meta_path) == {'indexed': 4, 'unchanged': 0, 'removed': 0, 'failed': 0}
+    assert case_index.get_groups(db_path) == core.read_simmeta(meta_path)
+
+    for row in case_index.query_cases(db_path):
+        path = os.path.join(source_path, row['case_id'])
+        T_list = core.get_all_lists_from_path(path)[3]
+        assert row['samples'] == len(T_list)
+        assert row['duration_ms'] == T_list[-1] - T_list[0]
+        landmarks = core.get_landmark_indexes(path, T_list)
+        assert (row['cecum_index'], row['flexur_L_index'], row['flexur_R_index'], row['end_index'], row['start_index']) == landmarks
+
+    longest = max(row['duration_ms'] for row in case_index.query_cases(db_path))
+    assert [row['case_id'] for row in case_index.query_cases(db_path, min_duration=longest)] == [
+        row['case_id'] for row in case_index.query_cases(db_path) if row['duration_ms'] == longest
+    ]
+    assert case_index.build_case_index(db_path, source_path, meta_path)['unchanged'] == 4
+
+
+def test_changed_simmeta_lines_are_reindexed(cohort, tmp_path):
+    source_path, meta_path, entries = cohort
+    db_path = str(tmp_path / 'index.db')
+    case_index.build_case_index(db_path, source_path, meta_path)
+
+    entries[0] = ('G09',) + entries[0][1:]
+    entries[1], entries[2] = entries[2], entries[1]
+    write_meta(meta_path, entries)
+    counts = case_index.build_case_index(db_path, source_path, meta_path)
+    assert counts['indexed'] == 3 and counts['unchanged'] == 1
+    assert case_index.get_groups(db_path) == core.read_simmeta(meta_path)
+    assert case_index.query_cases(db_path, group='G09')[0]['case_id'] == entries[0][1]
+
+
+def test_unreadable_cases_are_removed_and_reported(cohort, tmp_path):
+    source_path, meta_path, entries = cohort
+    db_path = case_index.get_default_db_path(meta_path)
+    case_index.build_case_index(db_path, source_path, meta_path)
+    broken = entries[1][1]
+    os.remove(os.path.join(source_path, broken, 'T.txt'))
+
+    with pytest.warns(UserWarning, match=broken):
+        selected = usage_examples.select_cohort(source_path, meta_path=meta_path)
+    assert os.path.exists(os.path.join(os.path.dirname(meta_path), case_index.DEFAULT_DB_NAME))
+    assert broken not in [case_id for case_ids in selected.values() for case_id in case_ids]
+    assert [failure['case_id'] for failure in case_index.get_failures(db_path)] == [broken]
+    assert case_index.get_case_events(db_path, broken) == []
+
+
+def test_select_cohort_keeps_simmeta_order(cohort, monkeypatch, tmp_path):
+    source_path, meta_path, entries = cohort
+    monkeypatch.chdir(tmp_path)
+    os.mkdir('elsewhere')
+    monkeypatch.chdir('elsewhere')
+    assert usage_examples.select_cohort(source_path, meta_path=meta_path) == core.read_simmeta(meta_path)
+    assert usage_examples.select_cohort(source_path, meta_path=meta_path, filters={'group': 'G01'}) == {'G01': core.read_simmeta(meta_path)['G01']}
+    assert os.listdir('.') == []
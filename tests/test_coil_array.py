@@ -0,0 +1,62 @@
+import os
+import numpy as np
+import pytest
+
+import core
+from coil_array import CoilArray
+
+
+def test_layouts_round_trip():
+    rng = np.random.default_rng(0)
+    coords = rng.normal(size=(50, 4, 3))
+    coils = CoilArray(coords, np.arange(50) * 10.0)
+
+    datadict = coils.to_dict()
+    assert sorted(datadict) == [0, 1, 2, 3]
+    assert datadict[2]['Y'] == coords[:, 2, 1].tolist()
+    np.testing.assert_array_equal(CoilArray.from_dict(datadict).coords, coords)
+
+    rows = np.column_stack([coils.time, coords.reshape(50, -1)])
+    from_rows = CoilArray.from_rows(rows, list(range(1, 13)), time_column=0)
+    np.testing.assert_array_equal(from_rows.coords, coords)
+    np.testing.assert_array_equal(from_rows.time, coils.time)
+
+
+def test_views_share_memory():
+    coils = CoilArray(np.zeros((20, 3, 3)), np.arange(20.0))
+    assert np.shares_memory(coils.tip, coils.coords)
+    assert np.shares_memory(coils.axis('Z'), coils.coords)
+    window = coils.frames(5, 10)
+    assert np.shares_memory(window.coords, coils.coords) and len(window) == 5
+    coils.axis('X')[:, 1] = 7.0
+    assert np.all(coils.coil(1)[:, 0] == 7.0)
+
+
+def test_loader_matches_the_lists(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    path = os.path.join(source_path, case_ids[0])
+    X, Y, Z, T = core.get_all_lists_from_path(path)
+    for cache_dir in (None, str(tmp_path)):
+        coils = core.get_coil_array_from_path(path, cache_dir)
+        np.testing.assert_array_equal(coils.axis('X'), np.asarray(X))
+        np.testing.assert_array_equal(coils.axis('Y'), np.asarray(Y))
+        np.testing.assert_array_equal(coils.axis('Z'), np.asarray(Z))
+        np.testing.assert_array_equal(coils.time, np.asarray(T))
+
+    half = core.get_coil_array_from_path(path, str(tmp_path), dtype=np.float32)
+    assert half.coords.dtype == np.float32 and half.nbytes < coils.nbytes
+
+
+def test_save_and_load(tmp_path):
+    coils = CoilArray(np.random.default_rng(1).normal(size=(10, 2, 3)), np.arange(10.0))
+    coils.save(str(tmp_path / 'case.npz'))
+    loaded = CoilArray.load(str(tmp_path / 'case.npz'))
+    np.testing.assert_array_equal(loaded.coords, coils.coords)
+    np.testing.assert_array_equal(loaded.time, coils.time)
+
+
+def test_bad_shapes_raise():
+    with pytest.raises(ValueError):
+        CoilArray(np.zeros((10, 3)), np.arange(10.0))
+    with pytest.raises(ValueError):
+        CoilArray(np.zeros((10, 2, 3)), np.arange(9.0))
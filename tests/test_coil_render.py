@@ -0,0 +1,42 @@
+import os
+import numpy as np
+
+import coil_render
+from coil_array import CoilArray
+
+
+def coil_array(n_frames=12, n_coils=4, seed=0):
+    rng = np.random.default_rng(seed)
+    coords = np.stack([rng.uniform(-200, 200, (n_frames, n_coils)), rng.uniform(-200, 200, (n_frames, n_coils)), rng.uniform(20, 480, (n_frames, n_coils))], axis=-1)
+    return CoilArray(coords, np.arange(n_frames) * 100.0)
+
+
+def test_to_pixels_maps_the_limits_to_the_panel_edges():
+    np.testing.assert_array_equal(coil_render.to_pixels(np.array([-250.0, 250.0]), (-250, 250), 500), [0, 499])
+    np.testing.assert_array_equal(coil_render.to_pixels(np.array([-250.0, 250.0]), (-250, 250), 500, flip=True), [499, 0])
+
+
+def test_coil_array_and_dict_render_the_same_frames():
+    coils = coil_array()
+    from_array = [frame.copy() for frame in coil_render.rasterize_frames(coils, panel_size=200, step=3)]
+    from_dict = [frame.copy() for frame in coil_render.rasterize_frames(coils.to_dict(), panel_size=200, step=3)]
+    assert len(from_array) == 4
+    for a, b in zip(from_array, from_dict):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_frames_show_the_coils():
+    coils = coil_array()
+    background = coil_render.draw_background(200)
+    for frame_no, frame in enumerate(coil_render.rasterize_frames(coils, panel_size=200)):
+        # Every coil of the XY panel, with Y drawn upwards
+        x = coil_render.to_pixels(coils.axis('X')[frame_no], (-250, 250), 200)
+        y = coil_render.to_pixels(-coils.axis('Y')[frame_no], (-250, 250), 200, flip=True)
+        assert np.all(frame[y, x] != background[y, x])
+
+
+def test_render_without_ffmpeg_writes_png_frames(tmp_path, monkeypatch):
+    monkeypatch.setattr(coil_render.shutil, 'which', lambda name: None)
+    stats = coil_render.render_animation(coil_array(), str(tmp_path / 'animation.mp4'), step=2, panel_size=101, verbose=False)
+    assert stats['frames'] == 6
+    assert sorted(os.listdir(stats['output'])) == [f'frame_{index:06d}.png' for index in range(6)]
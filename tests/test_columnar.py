@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import pytest
+
+import columnar
+import core
+
+
+@pytest.fixture(scope='module')
+def store(delivery, tmp_path_factory):
+    source_path, meta_path, _ = delivery
+    path = str(tmp_path_factory.mktemp('columnar') / 'cohort.col')
+    columnar.export_columnar(source_path, path, meta_path, dtype=np.float64, verbose=False)
+    return columnar.ColumnarReader(path)
+
+
+def test_cases_match_the_text_files(delivery, store):
+    source_path, meta_path, case_ids = delivery
+    assert store.groups == core.read_simmeta(meta_path)
+    assert sorted(store.case_ids) == sorted(case_ids)
+    for case_id in case_ids:
+        path = os.path.join(source_path, case_id)
+        X, Y, Z, T = core.get_all_lists_from_path(path)
+        for stored, values in zip(store.read_case(case_id), (X, Y, Z, T)):
+            np.testing.assert_array_equal(stored, np.asarray(values))
+        assert store.get_landmark_indexes(case_id) == tuple(core.get_landmark_indexes(path, T))
+
+        timeline = core.get_case_timeline(path, T)
+        events = store.get_events(case_id)
+        np.testing.assert_array_equal(events['time'], timeline['time'])
+        np.testing.assert_array_equal(events['event'], timeline['event'])
+        np.testing.assert_array_equal(events['frame'], timeline['frame'])
+
+
+def test_read_selects_columns_and_cases(store):
+    group_key = sorted(store.groups)[1]
+    selected = store.groups[group_key]
+    result = store.read(['X0', 'T'], groups=[group_key])
+    assert sorted(result) == ['T', 'X0', 'offsets']
+    assert len(result['offsets']) == len(selected) + 1
+    for number, case_id in enumerate(selected):
+        X, _, _, T = store.read_case(case_id, coils=[0])
+        window = slice(result['offsets'][number], result['offsets'][number + 1])
+        np.testing.assert_array_equal(result['X0'][window], X[:, 0])
+        np.testing.assert_array_equal(result['T'][window], T)
+
+    empty = store.read(['X0'], case_ids=[])
+    assert empty['X0'].size == 0 and list(empty['offsets']) == [0]
+
+
+def test_float32_store_and_bad_files(delivery, tmp_path):
+    source_path, meta_path, case_ids = delivery
+    path = str(tmp_path / 'small.col')
+    columnar.export_columnar(source_path, path, meta_path, verbose=False)
+    reader = columnar.ColumnarReader(path)
+    X = np.asarray(core.get_all_lists_from_path(os.path.join(source_path, case_ids[0]))[0])
+    assert reader.column('X0').dtype == np.float32 and reader.column('T').dtype == np.float64
+    np.testing.assert_allclose(reader.read_case(case_ids[0])[0], X, rtol=1e-6)
+    assert os.listdir(tmp_path) == ['small.col']
+
+    with open(path, 'rb') as file:
+        data = file.read()
+    (tmp_path / 'truncated.col').write_bytes(data[:-4])
+    with pytest.raises(ValueError):
+        columnar.ColumnarReader(str(tmp_path / 'truncated.col'))
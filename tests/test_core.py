@@ -0,0 +1,82 @@
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+import core
+
+
+def test_cache_matches_text_loader(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    for case_id in case_ids:
+        path = os.path.join(source_path, case_id)
+        text = core.get_all_lists_from_path(path)
+        cached = core.get_all_lists_from_path(path, str(tmp_path))
+        for text_values, cached_values in zip(text, cached):
+            np.testing.assert_array_equal(np.asarray(text_values), cached_values)
+
+
+def test_cache_is_rebuilt_when_a_source_file_changes(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    path = os.path.join(source_path, case_ids[0])
+    core.get_all_lists_from_path(path, str(tmp_path))
+    assert core.is_case_cache_valid(path, str(tmp_path))
+
+    T_path = core.get_all_coord_paths(path)[3]
+    stat = os.stat(T_path)
+    os.utime(T_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    try:
+        assert not core.is_case_cache_valid(path, str(tmp_path))
+        core.get_all_lists_from_path(path, str(tmp_path))
+        assert core.is_case_cache_valid(path, str(tmp_path))
+    finally:
+        os.utime(T_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_cases_with_the_same_name_do_not_share_a_cache(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    first = os.path.join(source_path, case_ids[0])
+    second = str(tmp_path / 'other_root' / case_ids[0])
+    shutil.copytree(os.path.join(source_path, case_ids[1]), second)
+    cache_dir = str(tmp_path / 'cache')
+
+    assert core.get_case_cache_dir(first, cache_dir) != core.get_case_cache_dir(second, cache_dir)
+    for path in (first, second, first):
+        np.testing.assert_array_equal(core.get_all_lists_from_path(path, cache_dir)[0], np.asarray(core.get_all_lists_from_path(path)[0]))
+    assert core.is_case_cache_valid(first, cache_dir) and core.is_case_cache_valid(second, cache_dir)
+
+
+def test_cache_of_another_source_is_not_valid(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    path = os.path.join(source_path, case_ids[0])
+    case_cache = core.build_case_cache(path, str(tmp_path))
+    other = str(tmp_path / 'moved')
+    shutil.copytree(path, other, copy_function=shutil.copy2)
+    shutil.copytree(case_cache, core.get_case_cache_dir(other, str(tmp_path)))
+    # Same file times and sizes, but built from another directory
+    assert not core.is_case_cache_valid(other, str(tmp_path))
+
+
+def test_landmark_without_timestamp_raises(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    path = str(tmp_path / case_ids[0])
+    shutil.copytree(os.path.join(source_path, case_ids[0]), path)
+    with open(os.path.join(path, 'LogFile_P.txt'), 'r') as file:
+        lines = file.readlines()
+    position = next(index for index, line in enumerate(lines) if 'Cecum' in line)
+    lines[position] = 'unknown;' + lines[position].split(';', 1)[1]
+    with open(os.path.join(path, 'LogFile_P.txt'), 'w') as file:
+        file.writelines(lines)
+
+    T_list = core.get_all_lists_from_path(path)[3]
+    with pytest.raises(ValueError):
+        core.get_landmark_indexes(path, T_list)
+
+
+def test_core_does_not_import_the_plotting_stack():
+    code = 'import sys, core; print(sorted(name for name in ("matplotlib", "cv2", "scipy") if name in sys.modules))'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
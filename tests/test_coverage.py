@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+import coverage
+
+
+def test_samples_and_arrays_agree():
+    points = np.random.default_rng(0).uniform(-50, 50, (1000, 3))
+    one_by_one = coverage.VoxelGrid(5.0)
+    for x, y, z in points:
+        one_by_one.add_sample(x, y, z, dwell=2.0)
+    together = coverage.VoxelGrid(5.0)
+    together.add_samples(points, np.full(len(points), 2.0))
+    assert one_by_one.voxels == together.voxels
+
+
+def test_empty_grid_projects_to_an_empty_image():
+    image, extent = coverage.VoxelGrid().project('x')
+    assert image.shape == (0, 0)
+    assert extent == (0.0, 0.0, 0.0, 0.0)
+
+
+def test_saved_grid_keeps_its_phase(delivery, tmp_path):
+    source_path, meta_path, _ = delivery
+    grid_path = str(tmp_path / 'grid.npz')
+    grid = coverage.update_cohort_grid(source_path, meta_path, grid_path, phase='insertion')
+    assert coverage.VoxelGrid.load(grid_path).voxels == grid.voxels
+
+    with pytest.raises(ValueError):
+        coverage.update_cohort_grid(source_path, meta_path, grid_path, phase='withdrawal')
+    with pytest.raises(ValueError):
+        coverage.update_cohort_grid(source_path, meta_path, grid_path, voxel_size=2.0)
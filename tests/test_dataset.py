@@ -0,0 +1,70 @@
+import os
+import threading
+import numpy as np
+import pytest
+
+import core
+import dataset
+
+
+def test_case_loads_lazily_and_matches_the_loader(delivery):
+    source_path, meta_path, case_ids = delivery
+    cases = dataset.Dataset(source_path, meta_path)
+    assert list(cases.groups.values()) == list(core.read_simmeta(meta_path).values())
+    case = cases[case_ids[0]]
+    assert not case.is_loaded
+    X, Y, Z, T = core.get_all_lists_from_path(case.path)
+    np.testing.assert_array_equal(case.X, np.asarray(X))
+    np.testing.assert_array_equal(case.T, np.asarray(T))
+    assert case.is_loaded and cases.loaded_bytes == case.nbytes
+
+
+def test_lru_budget_survives_direct_unloads(delivery):
+    source_path, meta_path, case_ids = delivery
+    cases = dataset.Dataset(source_path, meta_path)
+    cases[case_ids[0]].load()
+    size = cases[case_ids[0]].nbytes
+    cases.memory_budget = 2 * size
+
+    for case in cases:
+        case.load()
+    assert len(cases._loaded) == 2
+    assert cases.loaded_bytes == sum(case.nbytes for case in cases)
+
+    cases[case_ids[-1]].unload()
+    assert cases.loaded_bytes == sum(case.nbytes for case in cases)
+    for case in cases:
+        case.load()
+        case.unload()
+    assert cases.loaded_bytes == 0
+
+
+def test_concurrent_loads_read_a_case_once(delivery, monkeypatch):
+    source_path, meta_path, case_ids = delivery
+    cases = dataset.Dataset(source_path, meta_path)
+    reads = []
+    read = core.get_all_lists_from_path
+    monkeypatch.setattr(core, 'get_all_lists_from_path', lambda *args, **kwargs: reads.append(args[0]) or read(*args, **kwargs))
+
+    threads = [threading.Thread(target=cases[case_ids[0]].load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(reads) == 1
+    assert cases.loaded_bytes == cases[case_ids[0]].nbytes
+
+
+def test_prefetch_keeps_order_and_reports_errors(delivery):
+    source_path, meta_path, case_ids = delivery
+    cases = dataset.Dataset(source_path, meta_path)
+    assert [case.case_id for case in cases.prefetch(depth=3, workers=3, memory_cap=1)] == case_ids
+    assert all(case.is_loaded for case in cases)
+
+    missing = dataset.Case('missing', os.path.join(source_path, 'missing'))
+    loaded = []
+    with pytest.raises(OSError):
+        for case in dataset.prefetch_cases([cases[case_ids[0]], missing, cases[case_ids[1]]], depth=2):
+            loaded.append(case.case_id)
+    assert loaded == [case_ids[0]]
+
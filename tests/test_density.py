@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import density
+
+
+def test_binned_kde_matches_exact_kde():
+    rng = np.random.default_rng(0)
+    points = np.concatenate([rng.normal(0, 30, (2000, 2)), rng.normal(80, 10, (1000, 2))])
+    binned, extent = density.kde_grid(points[:, 0], points[:, 1], gridsize=120)
+    exact, exact_extent = density.kde_grid(points[:, 0], points[:, 1], gridsize=120, exact=True)
+
+    assert extent == exact_extent
+    assert binned.shape == exact.shape
+    # Binning moves every point by at most half a grid step, far less than the bandwidth
+    assert np.abs(binned - exact).max() < 0.02 * exact.max()
+
+
+def test_points_outside_an_explicit_extent_still_count():
+    rng = np.random.default_rng(1)
+    points = rng.normal(0, 30, (3000, 2))
+    # Half of the points lie outside the extent, their tails reach into it
+    extent = (0.0, 60.0, -30.0, 30.0)
+    binned, _ = density.kde_grid(points[:, 0], points[:, 1], gridsize=100, extent=extent)
+    exact, _ = density.kde_grid(points[:, 0], points[:, 1], gridsize=100, extent=extent, exact=True)
+    assert np.abs(binned - exact).max() < 0.02 * exact.max()
+    assert np.abs(binned[0] - exact[0]).max() < 0.02 * exact.max()
+
+
+def test_gridsize_below_two_raises():
+    with pytest.raises(ValueError):
+        density.kde_grid([0.0, 1.0, 2.0], [0.0, 2.0, 1.0], gridsize=1)
+    with pytest.raises(ValueError):
+        density.kde_grid([0.0, 1.0, 2.0], [0.0, 2.0, 1.0], gridsize=(10, 1))
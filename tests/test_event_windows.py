@@ -0,0 +1,52 @@
+import os
+import numpy as np
+import pytest
+
+import case_index
+import columnar
+import core
+import event_windows
+
+
+@pytest.fixture(scope='module')
+def db_path(delivery, tmp_path_factory):
+    source_path, meta_path, _ = delivery
+    path = str(tmp_path_factory.mktemp('index') / 'cases.sqlite')
+    case_index.build_case_index(path, source_path, meta_path, verbose=False)
+    return path
+
+
+def test_windows_match_interpolation_of_each_case(delivery, db_path):
+    source_path, _, _ = delivery
+    result = event_windows.extract_event_windows(db_path, contains='Polyp', before_s=3.0, after_s=2.0, step_ms=100.0, coils=(0, 2))
+    rows = [row for row in case_index.query_events(db_path, contains='Polyp') if row['frame'] is not None and row['frame'] >= 0]
+    assert len(rows) > 0 and result['coords'].shape == (len(rows), 51, 2, 3)
+    assert list(result['case_id']) == [row['case_id'] for row in rows]
+    np.testing.assert_allclose(result['offsets'], np.arange(-3000, 2001, 100.0))
+
+    for number, row in enumerate(rows):
+        X, Y, Z, T = (np.asarray(values, dtype=np.float64) for values in core.get_all_lists_from_path(os.path.join(source_path, row['case_id'])))
+        times = T[row['frame']] + result['offsets']
+        covered = (times >= T[0]) & (times <= T[-1])
+        np.testing.assert_array_equal(result['mask'][number], covered)
+        assert np.all(np.isnan(result['coords'][number][~covered]))
+        for column, coil in enumerate((0, 2)):
+            for axis, values in enumerate((X, Y, Z)):
+                np.testing.assert_allclose(result['coords'][number, covered, column, axis], np.interp(times[covered], T, values[:, coil]))
+
+
+def test_columnar_reader_and_filters(delivery, db_path, tmp_path):
+    source_path, meta_path, _ = delivery
+    path = str(tmp_path / 'cohort.col')
+    columnar.export_columnar(source_path, path, meta_path, dtype=np.float64, verbose=False)
+    from_files = event_windows.extract_event_windows(db_path, event='Flush', coils=None, cache_dir=str(tmp_path / 'cache'))
+    from_reader = event_windows.extract_event_windows(db_path, event='Flush', coils=None, reader=columnar.ColumnarReader(path))
+    np.testing.assert_array_equal(from_reader['coords'], from_files['coords'])
+    assert len(from_files['event']) > 0 and from_files['coords'].shape[2] == 3 and set(from_files['event']) <= {'Flush'}
+
+    group_key = sorted(core.read_simmeta(meta_path))[0]
+    grouped = event_windows.extract_event_windows(db_path, event='Flush', group=group_key)
+    assert set(grouped['case_id']) <= set(core.read_simmeta(meta_path)[group_key])
+
+    none = event_windows.extract_event_windows(db_path, event='No such event', step_ms=500.0)
+    assert none['coords'].shape == (0, 21, 1, 3) and none['mask'].shape == (0, 21)
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import filters
+
+
+def convolve(data, window_size, mode):
+    return np.convolve(data, np.ones(window_size) / window_size, mode=mode)
+
+
+@pytest.mark.parametrize('window_size', [1, 4, 5, 30, 101])
+def test_moving_average_matches_convolve(window_size):
+    data = np.random.default_rng(0).normal(0, 100, 500)
+    np.testing.assert_allclose(filters.moving_average(data, window_size, edge='zeros'), convolve(data, window_size, 'same'), rtol=0, atol=1e-9)
+    np.testing.assert_allclose(filters.moving_average(data, window_size, edge='valid'), convolve(data, window_size, 'valid'), rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('length', [1, 3, 4, 7])
+@pytest.mark.parametrize('edge, mode', [('valid', 'valid'), ('zeros', 'same')])
+def test_moving_average_of_short_data_matches_convolve(length, edge, mode):
+    data = np.random.default_rng(1).normal(size=length)
+    np.testing.assert_allclose(filters.moving_average(data, 8, edge=edge), convolve(data, 8, mode), atol=1e-12)
+
+
+def test_moving_average_of_a_block_matches_each_column():
+    block = np.random.default_rng(2).normal(size=(300, 4, 3))
+    smoothed = filters.moving_average(block, 9, edge='zeros')
+    for coil in range(4):
+        for axis in range(3):
+            np.testing.assert_allclose(smoothed[:, coil, axis], convolve(block[:, coil, axis], 9, 'same'), atol=1e-12)
+
+
+def sequential_exponential(data, weights):
+    smoothed = np.empty_like(data)
+    smoothed[0] = data[0]
+    for index in range(1, len(data)):
+        smoothed[index] = smoothed[index - 1] + weights[index - 1] * (data[index] - smoothed[index - 1])
+    return smoothed
+
+
+def test_exponential_matches_recursion():
+    rng = np.random.default_rng(3)
+    data = rng.normal(0, 100, (2000, 2, 3))
+    T = np.cumsum(rng.uniform(5, 15, 2000))
+    T[1000:] += 5000
+    weights = 1 - np.exp(-np.diff(T) / 80)
+    np.testing.assert_allclose(filters.exponential(data, tau_ms=80, T=T), sequential_exponential(data, weights), atol=1e-9)
+    np.testing.assert_allclose(filters.exponential(data, alpha=0.2), sequential_exponential(data, np.full(1999, 0.2)), atol=1e-9)
+
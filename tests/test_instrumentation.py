@@ -0,0 +1,111 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+
+import instrumentation
+
+
+@pytest.fixture
+def profiling():
+    instrumentation.pop_records()
+    instrumentation.enable(trace_memory=True)
+    yield
+    instrumentation.disable()
+    instrumentation.pop_records()
+
+
+def run_stage(name):
+    with instrumentation.stage(name):
+        np.ones(1000)
+    return instrumentation.pop_records()
+
+
+def test_disabled_stage_records_nothing():
+    instrumentation.pop_records()
+    with instrumentation.stage('off') as stage:
+        stage.add_bytes(10)
+    assert instrumentation.get_records() == []
+
+
+def test_stage_records_time_and_memory(profiling):
+    with instrumentation.stage('allocate', case='c1') as stage:
+        data = np.ones(10**6)
+        stage.add_bytes(123)
+    del data
+    (entry,) = instrumentation.pop_records()
+    assert entry['stage'] == 'allocate' and entry['case'] == 'c1' and entry['bytes_read'] == 123
+    assert entry['peak_bytes'] >= 8 * 10**6
+    assert entry['wall_s'] >= 0 and entry['cpu_s'] >= 0
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='needs the fork start method')
+def test_forked_workers_do_not_return_parent_records(profiling):
+    with instrumentation.stage('parent'):
+        pass
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('fork'), initializer=instrumentation.init_worker) as executor:
+        records = executor.submit(run_stage, 'worker').result()
+    assert [entry['stage'] for entry in records] == ['worker']
+    assert [entry['stage'] for entry in instrumentation.get_records()] == ['parent']
+
+
+def test_overlapping_stages_report_no_peak(profiling):
+    started = threading.Event()
+    release = threading.Event()
+
+    def background():
+        with instrumentation.stage('background'):
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    started.wait(5)
+    with instrumentation.stage('foreground'):
+        np.ones(10**5)
+    release.set()
+    thread.join()
+
+    with instrumentation.stage('outer'):
+        with instrumentation.stage('inner'):
+            pass
+    with instrumentation.stage('alone'):
+        np.ones(10**5)
+
+    peaks = {entry['stage']: entry['peak_bytes'] for entry in instrumentation.pop_records()}
+    assert peaks['background'] is None and peaks['foreground'] is None
+    assert peaks['outer'] is None and peaks['inner'] is None
+    assert peaks['alone'] >= 8 * 10**5
+
+
+def test_cpu_time_is_per_thread(profiling):
+    done = threading.Event()
+
+    def busy():
+        while not done.is_set():
+            sum(range(1000))
+
+    thread = threading.Thread(target=busy)
+    thread.start()
+    try:
+        with instrumentation.stage('sleep'):
+            time.sleep(0.3)
+    finally:
+        done.set()
+        thread.join()
+    (entry,) = instrumentation.pop_records()
+    assert entry['cpu_s'] < 0.1 < entry['wall_s']
+
+
+def test_summary_totals_runs():
+    records = [
+        {'stage': 'a', 'wall_s': 1.0, 'cpu_s': 0.5, 'bytes_read': 10, 'peak_bytes': None, 'max_rss_bytes': 5},
+        {'stage': 'a', 'wall_s': 2.0, 'cpu_s': 0.5, 'bytes_read': 5, 'peak_bytes': 7, 'max_rss_bytes': 9},
+        {'stage': 'b', 'wall_s': 0.5, 'cpu_s': 0.1, 'bytes_read': 0, 'peak_bytes': None, 'max_rss_bytes': None},
+    ]
+    assert instrumentation.summarize(records) == [
+        {'stage': 'a', 'runs': 2, 'wall_s': 3.0, 'cpu_s': 1.0, 'bytes_read': 15, 'peak_bytes': 7, 'max_rss_bytes': 9},
+        {'stage': 'b', 'runs': 1, 'wall_s': 0.5, 'cpu_s': 0.1, 'bytes_read': 0, 'peak_bytes': None, 'max_rss_bytes': None},
+    ]
@@ -0,0 +1,80 @@
+import csv
+import math
+import os
+import shutil
+import numpy as np
+import pytest
+
+import core
+import metrics
+
+
+def loop_path_length(points):
+    return sum(math.dist(a, b) for a, b in zip(points[:-1], points[1:]))
+
+
+def test_case_metrics_of_a_known_path():
+    # The tip moves 2 mm per 100 ms along X, the proximal coil 4 mm per 100 ms
+    T = np.arange(101) * 100.0
+    X = np.column_stack([np.arange(101) * 2.0, np.arange(101) * 4.0])
+    Y = np.zeros((101, 2))
+    Z = np.zeros((101, 2))
+    X[60:, 0] = X[60, 0] - (np.arange(41) * 2.0)
+    landmarks = (60, 0, 0, 100, 10)
+
+    result = metrics.compute_case_metrics(X, Y, Z, T, landmarks)
+    assert result['samples'] == 101
+    assert result['duration_s'] == pytest.approx(10.0)
+    assert result['time_to_cecum_s'] == pytest.approx(5.0)
+    assert result['insertion_time_s'] == pytest.approx(5.0)
+    assert result['withdrawal_time_s'] == pytest.approx(4.0)
+    assert result['insertion_path_mm'] == pytest.approx(100.0)
+    assert result['insertion_tip_shaft_ratio'] == pytest.approx(0.5)
+    assert result['withdrawal_path_mm'] == pytest.approx(80.0)
+    assert result['withdrawal_tip_tortuosity'] == pytest.approx(1.0)
+    assert result['tip_speed_p50'] == pytest.approx(20.0)
+
+
+def test_missing_landmarks_give_nan():
+    T = np.arange(20) * 100.0
+    coords = np.random.default_rng(0).normal(size=(20, 2))
+    result = metrics.compute_case_metrics(coords, coords, coords, T, (0, 0, 0, 0, 0))
+    for name in ('time_to_cecum_s', 'insertion_time_s', 'withdrawal_time_s', 'insertion_tip_shaft_ratio', 'tip_speed_mean'):
+        assert math.isnan(result[name])
+
+
+def test_case_metrics_match_loops(delivery):
+    source_path, _, case_ids = delivery
+    for case_id in case_ids:
+        path = os.path.join(source_path, case_id)
+        X, Y, Z, T = core.get_all_lists_from_path(path)
+        cecum, _, _, end, start = core.get_landmark_indexes(path, T)
+        tip = [(x[0], y[0], z[0]) for x, y, z in zip(X, Y, Z)]
+        proximal = [(x[-1], y[-1], z[-1]) for x, y, z in zip(X, Y, Z)]
+
+        result = metrics.compute_metrics_from_path(path)
+        assert result['time_to_cecum_s'] == pytest.approx((T[cecum] - T[start]) / 1000)
+        assert result['insertion_path_mm'] == pytest.approx(loop_path_length(tip[start:cecum + 1]))
+        assert result['insertion_tip_shaft_ratio'] == pytest.approx(loop_path_length(tip[start:cecum + 1]) / loop_path_length(proximal[start:cecum + 1]))
+        assert result['withdrawal_path_mm'] == pytest.approx(loop_path_length(tip[cecum:end + 1]))
+
+
+def test_cohort_metrics_report_failures_per_case(delivery, tmp_path):
+    source_path, meta_path, case_ids = delivery
+    copy = tmp_path / 'SimBatch'
+    shutil.copytree(source_path, copy)
+    os.remove(copy / case_ids[1] / 'T.txt')
+
+    output_path = str(tmp_path / 'metrics.csv')
+    serial = metrics.compute_cohort_metrics(str(copy), meta_path, output_path, workers=1)
+    parallel = metrics.compute_cohort_metrics(str(copy), meta_path, workers=2)
+    assert [row['case_id'] for row in serial] == case_ids
+    assert [bool(row['error']) for row in serial] == [case_id == case_ids[1] for case_id in case_ids]
+    for a, b in zip(serial, parallel):
+        assert a.keys() == b.keys()
+        assert all(a[key] == b[key] or (a[key] != a[key] and b[key] != b[key]) for key in a)
+
+    with open(output_path, newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [row['case_id'] for row in rows] == case_ids
+    assert float(rows[0]['insertion_path_mm']) == pytest.approx(serial[0]['insertion_path_mm'])
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import numpy as np
+import pytest
+
+import core
+import resampling
+
+
+def test_times_only_loader(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    path = os.path.join(source_path, case_ids[0])
+    T = np.asarray(core.get_all_lists_from_path(path)[3])
+    np.testing.assert_array_equal(core.get_times_from_path(path), T)
+    np.testing.assert_array_equal(core.get_times_from_path(path, str(tmp_path)), T)
+
+
+def test_interpolation_matches_np_interp():
+    rng = np.random.default_rng(0)
+    T = np.cumsum(rng.uniform(0, 50, 200))
+    T[50] = T[49]
+    coords = rng.normal(size=(200, 2, 3))
+    times = np.linspace(T[0] - 100, T[-1] + 100, 500)
+
+    output, mask = resampling.interpolate_frames(coords, T, times)
+    assert np.array_equal(mask, (times >= T[0]) & (times <= T[-1]))
+    assert np.all(np.isnan(output[~mask]))
+    for coil in range(2):
+        for axis in range(3):
+            np.testing.assert_allclose(output[mask, coil, axis], np.interp(times[mask], T, coords[:, coil, axis]))
+
+
+def test_phase_places_the_anchors_evenly():
+    T = np.array([0.0, 100.0, 300.0, 400.0, 1000.0])
+    phase = resampling.get_phase(T, [1, 2, 4])
+    np.testing.assert_allclose(phase, [-0.25, 0.0, 0.5, 0.5 + 1 / 14, 1.0])
+    assert resampling.get_phase(T, [2, 1, 4]) is None
+
+
+def test_cohort_tensor_matches_each_case(delivery, tmp_path):
+    source_path, meta_path, case_ids = delivery
+    tensor = resampling.build_cohort_tensor(source_path, meta_path, out_dir=str(tmp_path / 'tensor'), dtype=np.float64)
+    assert tensor.case_ids == case_ids and tensor.errors == [''] * len(case_ids)
+
+    path = os.path.join(source_path, case_ids[2])
+    coil_array = core.get_coil_array_from_path(path)
+    start = core.get_landmark_indexes(path, coil_array.time)[4]
+    expected, mask = resampling.interpolate_frames(coil_array.coords, coil_array.time - coil_array.time[start], tensor.grid)
+    np.testing.assert_array_equal(tensor.mask[2], mask)
+    np.testing.assert_allclose(tensor.coords[2][mask], expected[mask])
+
+    loaded = resampling.TrajectoryTensor.load(str(tmp_path / 'tensor'))
+    np.testing.assert_array_equal(loaded.coords, tensor.coords)
+    assert loaded.case_ids == case_ids and loaded.errors == tensor.errors
+
+
+@pytest.mark.parametrize('kind', ['time', 'phase'])
+def test_unreadable_case_is_reported_not_raised(delivery, tmp_path, kind):
+    source_path, meta_path, case_ids = delivery
+    copy = tmp_path / 'SimBatch'
+    shutil.copytree(source_path, copy)
+    os.remove(copy / case_ids[0] / 'T.txt')
+
+    tensor = resampling.build_cohort_tensor(str(copy), meta_path, kind=kind, out_dir=str(tmp_path / 'tensor'))
+    assert tensor.case_ids == case_ids
+    assert [bool(error) for error in tensor.errors] == [True] + [False] * (len(case_ids) - 1)
+    assert np.all(np.isnan(tensor.coords[0])) and not tensor.mask[0].any()
+    assert tensor.mask[1:].any(axis=1).all()
+    assert resampling.TrajectoryTensor.load(str(tmp_path / 'tensor')).errors == tensor.errors
+
+
+def test_rebuild_removes_the_stale_meta_first(delivery, tmp_path, monkeypatch):
+    source_path, meta_path, _ = delivery
+    out_dir = str(tmp_path / 'tensor')
+    resampling.build_cohort_tensor(source_path, meta_path, out_dir=out_dir)
+    assert os.path.exists(os.path.join(out_dir, 'meta.json'))
+
+    def interrupted(*args, **kwargs):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(resampling, 'resample_case', interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        resampling.build_cohort_tensor(source_path, meta_path, out_dir=out_dir)
+    assert not os.path.exists(os.path.join(out_dir, 'meta.json'))
+    with pytest.raises(FileNotFoundError):
+        resampling.TrajectoryTensor.load(out_dir)
+
+
+def test_old_meta_without_errors_loads(tmp_path):
+    tensor = resampling.TrajectoryTensor(np.zeros((1, 3, 1, 3)), np.ones((1, 3), dtype=bool), np.arange(3.0), ['c'], ['G'])
+    tensor.save(str(tmp_path))
+    meta_path = tmp_path / 'meta.json'
+    meta = json.loads(meta_path.read_text())
+    del meta['errors']
+    meta_path.write_text(json.dumps(meta))
+    assert resampling.TrajectoryTensor.load(str(tmp_path)).errors == ['']
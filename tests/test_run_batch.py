@@ -0,0 +1,50 @@
+import os
+import pytest
+
+try:
+    import pre_processing
+except SyntaxError:
+    # The published pre_processing.py is redacted pseudo-code, runnable only with the device constants filled in
+    pytest.skip('pre_processing.py is redacted and cannot be imported', allow_module_level=True)
+
+
+def fake_process_sensor_file(root, filename, outdir, random_string, render_step=1):
+    if 'broken' in filename:
+        raise ValueError('unreadable csv')
+    os.mkdir(os.path.join(outdir, random_string))
+    return f"{root};{filename};{random_string};{outdir}{os.sep}{random_string}{os.sep};\n"
+
+
+@pytest.fixture
+def raw_tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(pre_processing, 'process_sensor_file', fake_process_sensor_file)
+    indir = tmp_path / 'raw'
+    for group, names in {'G02': ['sensor_b.csv', 'sensor_broken.csv'], 'G01': ['sensor_a.csv', 'notes.csv']}.items():
+        (indir / group).mkdir(parents=True)
+        for name in names:
+            (indir / group / name).write_text('')
+    return str(indir)
+
+
+def run(raw_tree, tmp_path, name, workers):
+    outdir = tmp_path / name
+    outdir.mkdir()
+    meta_path = str(tmp_path / f'{name}.txt')
+    failures = pre_processing.run_batch(raw_tree, str(outdir), workers=workers, seed=11, meta_path=meta_path)
+    with open(meta_path) as file:
+        return file.readlines(), failures
+
+
+def test_sensor_files_are_found_in_a_fixed_order(raw_tree):
+    found = pre_processing.find_sensor_files(raw_tree)
+    assert [filename for _, filename in found] == ['sensor_a.csv', 'sensor_b.csv', 'sensor_broken.csv']
+
+
+def test_batch_is_reproducible_and_skips_failures(raw_tree, tmp_path):
+    serial_lines, serial_failures = run(raw_tree, tmp_path, 'serial', workers=1)
+    parallel_lines, parallel_failures = run(raw_tree, tmp_path, 'parallel', workers=2)
+
+    assert [line.split(';')[1] for line in serial_lines] == ['sensor_a.csv', 'sensor_b.csv']
+    assert [line.split(';')[2] for line in serial_lines] == [line.split(';')[2] for line in parallel_lines]
+    assert [failure[1] for failure in serial_failures] == ['sensor_broken.csv']
+    assert [failure[1] for failure in parallel_failures] == ['sensor_broken.csv']
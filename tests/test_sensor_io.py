@@ -0,0 +1,58 @@
+import datetime
+import numpy as np
+
+import sensor_io
+import synthetic_data
+
+
+def parse_time(timestr):
+    return datetime.datetime.strptime(timestr, '%H:%M:%S:%f')
+
+
+def test_parse_time_array_matches_strptime():
+    timestrs = ['09:30:00:000000', '09:30:00:5', '23:59:59:999999', '00:00:00:12', '12:01:02:0450']
+    expected = [
+        ((parsed.hour * 60 + parsed.minute) * 60 + parsed.second) * 10**6 + parsed.microsecond
+        for parsed in map(parse_time, timestrs)
+    ]
+    np.testing.assert_array_equal(sensor_io.parse_time_array(timestrs), expected)
+
+
+def test_relative_time_matches_timedelta():
+    rng = np.random.default_rng(0)
+    microseconds = 34200 * 10**6 + np.cumsum(rng.integers(1, 250000, 2000))
+    first = datetime.timedelta(microseconds=int(microseconds[0]))
+    expected = [(datetime.timedelta(microseconds=int(value)) - first).total_seconds() * 1000 for value in microseconds]
+    np.testing.assert_array_equal(sensor_io.relative_time_ms(microseconds), expected)
+
+
+def test_round_coordinates_matches_string_formatting():
+    rng = np.random.default_rng(1)
+    # Random values, and values on (or next to) a rounding tie
+    ties = np.round(rng.uniform(-500, 500, 500), 2) + 0.005
+    values = np.concatenate([rng.uniform(-500, 500, 2000), ties, np.nextafter(ties, np.inf), np.nextafter(ties, -np.inf)])
+    expected = [float(f'{value:.2f}') for value in values]
+    np.testing.assert_array_equal(sensor_io.round_coordinates(values), expected)
+
+
+def test_transform_matches_row_loop():
+    rng = np.random.default_rng(2)
+    coordinates = rng.normal(0, 100, (500, 6))
+    expected = [[float(f'{coord:.2f}') for coord in row * 1.05 + 12.5] for row in coordinates]
+    np.testing.assert_array_equal(sensor_io.transform_coordinates(coordinates, 1.05, 12.5), expected)
+
+
+def test_load_sensor_csv_matches_line_parser(tmp_path):
+    path = str(tmp_path / 'sensor.csv')
+    synthetic_data.write_sensor_csv(path, n_samples=300, n_columns=9, rng=np.random.default_rng(3))
+
+    # The original reader: split every line after the header, dropping the field after the trailing comma
+    with open(path, 'r') as file:
+        rows = [line.split(',')[:-1] for line in file.readlines()[1:]]
+
+    data = sensor_io.load_sensor_csv(path)
+    assert data.shape == (300, 10)
+    first = parse_time(rows[0][0])
+    expected_times = [(parse_time(row[0]) - first).total_seconds() * 1000 for row in rows]
+    np.testing.assert_array_equal(sensor_io.relative_time_ms(data[:, 0].astype(np.int64)), expected_times)
+    np.testing.assert_array_equal(data[:, 1:], [[float(value) for value in row[1:]] for row in rows])
@@ -0,0 +1,48 @@
+import numpy as np
+
+import similarity
+
+
+def full_dtw(query, candidate, band):
+    """
+    The O(n^2) DTW recursion over the whole cost matrix, limited to the Sakoe-Chiba band.
+    """
+    length = len(query)
+    cost = np.full((length + 1, length + 1), np.inf)
+    cost[0, 0] = 0.0
+    for i in range(1, length + 1):
+        for j in range(max(1, i - band), min(length, i + band) + 1):
+            distance = np.linalg.norm(query[i - 1] - candidate[j - 1])
+            cost[i, j] = distance + min(cost[i - 1, j], cost[i, j - 1], cost[i - 1, j - 1])
+    return cost[length, length]
+
+
+def random_walks(count, length, seed):
+    return np.cumsum(np.random.default_rng(seed).normal(size=(count, length, 3)), axis=1)
+
+
+def test_dtw_batch_matches_full_recursion():
+    query = random_walks(1, 40, 0)[0]
+    candidates = random_walks(6, 40, 1)
+    for band in (0, 3, 40):
+        expected = [full_dtw(query, candidate, band) for candidate in candidates]
+        np.testing.assert_allclose(similarity.dtw_batch(query, candidates, band), expected)
+
+
+def test_lb_keogh_is_a_lower_bound():
+    query = random_walks(1, 40, 2)[0]
+    candidates = random_walks(20, 40, 3)
+    bounds = similarity.lb_keogh(query, candidates, 4)
+    assert np.all(bounds <= similarity.dtw_batch(query, candidates, 4) + 1e-9)
+
+
+def test_top_k_matches_brute_force():
+    trajectories = random_walks(30, 32, 4)
+    query = trajectories[0] + np.random.default_rng(5).normal(0, 0.1, (32, 3))
+    band = similarity.get_band(32, 0.1)
+    distances = similarity.dtw_batch(query, trajectories, band)
+
+    rows, best, pruned = similarity.top_k_similar(query, trajectories, k=5, window=0.1, batch_size=7)
+    np.testing.assert_array_equal(np.sort(rows), np.sort(np.argsort(distances)[:5]))
+    np.testing.assert_allclose(best, np.sort(distances)[:5])
+    assert 0 <= pruned < 1
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pytest
+
+import core
+import simplify
+
+
+def recursive_rdp(points, tolerance):
+    """
+    Textbook Ramer-Douglas-Peucker: keep the farthest sample from the chord while it is above the tolerance.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = simplify.segment_distances(points[first + 1:last], points[first], points[last])
+        if distances.ndim > 1:
+            distances = distances.max(axis=1)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack += [(first, split), (split, last)]
+    return np.flatnonzero(keep)
+
+
+@pytest.mark.parametrize('tolerance', [0.1, 0.5, 2.0, 10.0])
+def test_errors_give_recursive_rdp(tolerance):
+    points = np.cumsum(np.random.default_rng(0).normal(size=(800, 3)), axis=0)
+    indexes, error = simplify.select_indexes(simplify.rdp_errors(points), tolerance)
+    np.testing.assert_array_equal(indexes, recursive_rdp(points, tolerance))
+    assert error <= tolerance
+    assert simplify.path_error(points, indexes) == pytest.approx(error)
+
+
+def test_errors_of_several_coils_give_recursive_rdp():
+    points = np.cumsum(np.random.default_rng(1).normal(size=(400, 3, 3)), axis=0)
+    indexes, _ = simplify.select_indexes(simplify.rdp_errors(points), 1.0)
+    np.testing.assert_array_equal(indexes, recursive_rdp(points, 1.0))
+
+
+def test_point_budget():
+    errors = simplify.rdp_errors(np.cumsum(np.random.default_rng(2).normal(size=(500, 3)), axis=0))
+    indexes, _ = simplify.select_indexes(errors, max_points=50)
+    assert 2 <= len(indexes) <= 50
+    with pytest.raises(ValueError):
+        simplify.select_indexes(errors, max_points=1)
+
+
+def test_simplified_window_stays_within_tolerance(delivery, tmp_path):
+    source_path, _, case_ids = delivery
+    path = os.path.join(source_path, case_ids[0])
+    X, Y, Z, T = (np.asarray(values) for values in core.get_all_lists_from_path(path))
+    landmarks = core.get_landmark_indexes(path, T)
+    start, stop = landmarks[4], landmarks[0]
+
+    result = simplify.get_simplified_lists_from_path(path, tolerance=1.5, coil=0, start=start, stop=stop, cache_dir=str(tmp_path))
+    tip = np.column_stack([X[start:stop, 0], Y[start:stop, 0], Z[start:stop, 0]])
+    assert result['frames'][0] == start and result['frames'][-1] == stop - 1
+    assert result['error'] <= 1.5
+    assert simplify.path_error(tip, result['frames'] - start) == result['error']
+    assert simplify.get_lod_errors(path, str(tmp_path)).dtype == np.float64
+
+
+def test_random_windows_stay_within_tolerance(monkeypatch):
+    points = np.cumsum(np.random.default_rng(3).normal(size=(300, 3)), axis=0) * 5
+    X, Y, Z = (points[:, [axis]] for axis in range(3))
+    monkeypatch.setattr(core, 'get_all_lists_from_path', lambda path, cache_dir=None: (X, Y, Z, np.arange(300) * 100.0))
+    monkeypatch.setattr(simplify, 'get_lod_errors', lambda path, cache_dir=None: simplify.rdp_errors(points)[None])
+
+    rng = np.random.default_rng(4)
+    windows = [(70, 293, 20.0)] + [(*sorted(rng.choice(301, 2, replace=False).tolist()), rng.uniform(1, 30)) for _ in range(200)]
+    for start, stop, tolerance in windows:
+        result = simplify.get_simplified_lists_from_path('case', tolerance=tolerance, coil=0, start=start, stop=stop)
+        assert result['error'] <= tolerance
+        assert simplify.path_error(points[start:stop], result['frames'] - start) == result['error']
+
+
+def test_pyramid_is_stored_beside_the_case_without_a_cache_dir(delivery, tmp_path, monkeypatch):
+    source_path, _, case_ids = delivery
+    monkeypatch.chdir(tmp_path)
+    path = os.path.join(source_path, case_ids[0])
+    lod_dir = simplify.get_lod_dir(path)
+    assert os.path.dirname(lod_dir) == os.path.join(os.path.abspath(source_path), simplify.LOD_CACHE_DIR)
+    simplify.get_lod_errors(path)
+    assert os.path.exists(os.path.join(lod_dir, 'lod_error.npy'))
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import pytest
+
+import core
+import spatial_index
+from dataset import LANDMARK_NAMES
+
+
+def random_cases(n_cases=6, n_frames=200, n_coils=2, seed=0):
+    rng = np.random.default_rng(seed)
+    cases = {}
+    for number in range(n_cases):
+        coords = np.cumsum(rng.normal(scale=2.0, size=(n_frames, n_coils, 3)), axis=0)
+        cases[f'case{number}'] = (coords, int(rng.integers(20, n_frames - 20)))
+    return cases
+
+
+def build(cases, coils=(0, 1), max_segments=2):
+    index = spatial_index.SpatialIndex(coils, max_segments)
+    for case_id, (coords, cecum_index) in cases.items():
+        index.add_case(case_id, coords[..., 0], coords[..., 1], coords[..., 2], cecum_index)
+    return index
+
+
+def brute_force(cases, coils=(0, 1)):
+    rows = []
+    for case_id, (coords, cecum_index) in cases.items():
+        for frame in range(len(coords)):
+            for coil in coils:
+                rows.append((case_id, frame, coil, int(frame >= cecum_index), coords[frame, coil]))
+    return rows
+
+
+def test_radius_and_box_match_brute_force():
+    cases = random_cases()
+    index = build(cases)
+    rows = brute_force(cases)
+    point = np.array([0.0, 0.0, 0.0])
+
+    result = index.query_radius(point, 15.0, phase='withdrawal', coil=1)
+    expected = {(case_id, frame) for case_id, frame, coil, phase, position in rows
+                if coil == 1 and phase == 1 and np.linalg.norm(position - point) <= 15.0}
+    assert set(zip(result['case_id'].tolist(), result['frame'].tolist())) == expected
+    assert index.cases_within(point, 15.0, 'withdrawal', 1) == sorted({case_id for case_id, _ in expected})
+
+    low, high = np.array([-10.0, -5.0, -20.0]), np.array([10.0, 15.0, 0.0])
+    result = index.query_box(low, high)
+    expected = {(case_id, frame, coil) for case_id, frame, coil, _, position in rows if np.all((position >= low) & (position <= high))}
+    assert set(zip(result['case_id'].tolist(), result['frame'].tolist(), result['coil'].tolist())) == expected
+
+
+def test_nearest_matches_brute_force():
+    cases = random_cases()
+    index = build(cases)
+    rows = brute_force(cases)
+    point = np.array([5.0, -3.0, 2.0])
+
+    distances = sorted(np.linalg.norm(position - point) for _, _, coil, _, position in rows if coil == 0)
+    np.testing.assert_allclose(index.query_knn(point, 7, coil=0)['distance'], distances[:7])
+
+    closest = {}
+    for case_id, frame, coil, _, position in rows:
+        distance = np.linalg.norm(position - point)
+        if distance < closest.get(case_id, (np.inf,))[0]:
+            closest[case_id] = (distance, frame)
+    expected = sorted(closest.items(), key=lambda item: item[1][0])[:3]
+    nearest = index.nearest_cases(point, 3)
+    assert [case_id for case_id, _, _ in nearest] == [case_id for case_id, _ in expected]
+    np.testing.assert_allclose([distance for _, distance, _ in nearest], [distance for _, (distance, _) in expected])
+
+
+def test_save_and_load_keep_the_results(tmp_path):
+    cases = random_cases()
+    index = build(cases)
+    index.save(str(tmp_path))
+    loaded = spatial_index.SpatialIndex.load(str(tmp_path))
+    assert loaded.case_ids == index.case_ids and len(loaded) == len(index)
+    a, b = index.query_radius([0, 0, 0], 20.0), loaded.query_radius([0, 0, 0], 20.0)
+    assert sorted(zip(a['case_id'], a['frame'], a['coil'])) == sorted(zip(b['case_id'], b['frame'], b['coil']))
+
+
+def test_cohort_index_holds_the_window(delivery, tmp_path):
+    source_path, meta_path, case_ids = delivery
+    index = spatial_index.update_spatial_index(source_path, meta_path, str(tmp_path / 'index'), window=('start', 'cecum'))
+    result = index.query_radius([0, 0, 0], 1e6)
+    for case_id in case_ids:
+        path = os.path.join(source_path, case_id)
+        landmarks = dict(zip(LANDMARK_NAMES, core.get_landmark_indexes(path, core.get_times_from_path(path))))
+        frames = np.sort(result['frame'][result['case_id'] == case_id])
+        np.testing.assert_array_equal(frames, np.arange(landmarks['start'], landmarks['cecum'] + 1))
+
+    loaded = spatial_index.update_spatial_index(source_path, meta_path, str(tmp_path / 'index'), window=('start', 'cecum'))
+    assert loaded.window == ('start', 'cecum') and len(loaded) == len(index)
+
+
+def test_saved_index_with_other_coils_or_window_raises(delivery, tmp_path):
+    source_path, meta_path, _ = delivery
+    index_path = str(tmp_path / 'index')
+    spatial_index.update_spatial_index(source_path, meta_path, index_path)
+    with pytest.raises(ValueError):
+        spatial_index.update_spatial_index(source_path, meta_path, index_path, coils=(0, 1))
+    with pytest.raises(ValueError):
+        spatial_index.update_spatial_index(source_path, meta_path, index_path, window=('cecum', 'end'))
+    with pytest.raises(ValueError):
+        spatial_index.update_spatial_index(source_path, meta_path, window=('start', 'exit'))
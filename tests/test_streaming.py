@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+import filters
+import sensor_io
+import streaming
+import synthetic_data
+
+
+@pytest.mark.parametrize('n_samples', [0, 2, 5, 6, 40])
+@pytest.mark.parametrize('window_size', [1, 4, 11, 12])
+def test_streaming_running_average_matches_offline(n_samples, window_size):
+    samples = np.random.default_rng(4).normal(size=(n_samples, 2, 3))
+    average = streaming.RunningAverage(window_size, 2, resum_every=16)
+    emitted = [value for value in (average.push(sample) for sample in samples) if value is not None] + average.flush()
+    assert len(emitted) == n_samples
+    if n_samples >= window_size:
+        np.testing.assert_allclose(np.array(emitted), filters.moving_average(samples, window_size, edge='zeros'), atol=1e-9)
+    elif n_samples:
+        # The stream keeps one value per sample, the window centred on it, where the offline 'same' output is window long
+        full = np.apply_along_axis(np.convolve, 0, samples, np.ones(window_size) / window_size, mode='full')
+        delay = (window_size - 1) // 2
+        np.testing.assert_allclose(np.array(emitted), full[delay:delay + n_samples], atol=1e-9)
+
+
+def test_pipeline_matches_the_offline_csv_smoothing(tmp_path):
+    path = str(tmp_path / 'sensor.csv')
+    synthetic_data.write_sensor_csv(path, n_samples=300, n_columns=9, rng=np.random.default_rng(0))
+    data = sensor_io.load_sensor_csv(path)
+
+    pipeline = streaming.StreamingPipeline(streaming.make_csv_parser(range(1, 10)), 3, 7)
+    frames = list(pipeline.run(streaming.replay_csv(path, speed=float('inf'))))
+    assert [frame['frame'] for frame in frames] == list(range(300))
+    np.testing.assert_allclose([frame['time'] for frame in frames], sensor_io.relative_time_ms(data[:, 0].astype(np.int64)))
+    expected = filters.moving_average(data[:, 1:].reshape(300, 3, 3), 7, edge='zeros')
+    np.testing.assert_allclose(np.array([frame['position'] for frame in frames]), expected, atol=1e-9)
+
+
+def test_live_aligner_uses_the_offset_of_the_first_event():
+    aligner = streaming.LiveAligner()
+    for time_ms in np.arange(0, 10000, 100.0):
+        aligner.add_frame(time_ms)
+    first = aligner.add_event('100.0;Endoscopy started;')
+    assert first['frame'] == 99 and first['landmark'] == 'start'
+    # Two seconds earlier in the log is twenty frames earlier
+    assert aligner.add_event('98.0;Cecum;')['frame'] == 79
+    assert aligner.add_event('98.5;Cecum;')['landmark'] is None
+    assert aligner.landmarks == {'start': 99, 'cecum': 79}
+    assert aligner.add_event('no time;Note;') is None
+
+
+def test_tail_lines_returns_complete_lines(tmp_path):
+    path = tmp_path / 'growing.csv'
+    path.write_text('a,1\nb,2\npartial')
+    assert list(streaming.tail_lines(str(path), poll_interval=0.01, timeout=0.05)) == ['a,1\n', 'b,2\n']
@@ -0,0 +1,92 @@
+import os
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection, PathCollection
+
+import core
+import tip_plots
+import usage_examples
+
+
+def render(draw):
+    fig = Figure(figsize=(4, 3), dpi=50)
+    ax = fig.subplots()
+    draw(ax)
+    ax.set_xlim(-5, 105)
+    ax.set_ylim(-5, 105)
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def original_group_plot(case_ids, source_path, save_path, dpi):
+    """
+    The per-group body of the original plot_multiple_case_tip_paths.
+    """
+    colormaps = [plt.cm.Reds, plt.cm.Greens, plt.cm.Blues, plt.cm.Greys, plt.cm.magma]
+    fig, ax = plt.subplots(figsize=(15, 10))
+    ax_position = ax.get_position()
+    ax.set_position([ax_position.x0, ax_position.y0, ax_position.width, ax_position.height])
+    for index, i in enumerate(case_ids):
+        path = os.path.join(source_path, i)
+        X_list, Y_list, Z_list, T_list = core.get_all_lists_from_path(path)
+        cecum_index, _, _, closest_end_index, closest_start_index = core.get_landmark_indexes(path, T_list)
+        negated_Y_value = [-z[0] for z in Y_list[closest_start_index:cecum_index]]
+        negated_z_value = [-z[0] for z in Z_list[closest_start_index:cecum_index]]
+        cmap = colormaps[index % len(colormaps)]
+        colors = cmap(np.linspace(0, 1, len(negated_z_value)))
+        ax.scatter(negated_z_value, negated_Y_value, color=colors, label=f'Set {index+1}')
+        colorbar_ax = fig.add_axes([ax_position.x1 + 0.01, ax_position.y0 + 0.7 - index * (0.07 + 0.1), 0.08, 0.07])
+        cbar = plt.colorbar(plt.cm.ScalarMappable(cmap=cmap), cax=colorbar_ax, orientation='horizontal')
+        cbar.set_label(f'Set {index+1}')
+    ax.set_xlabel('Z')
+    ax.set_ylabel('Y')
+    ax.set_xlim([-500, 0])
+    ax.set_ylim([-250, 300])
+    ax.set_title('Scope Tip Intubation Path')
+    plt.savefig(save_path, format='png', dpi=dpi)
+    plt.close()
+
+
+def test_default_drawing_matches_the_original_scatter():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 100, 200), rng.uniform(0, 100, 200)
+    original = render(lambda ax: ax.scatter(x, y, color=plt.cm.Blues(np.linspace(0, 1, 200)), label='Set 1'))
+    np.testing.assert_array_equal(render(lambda ax: tip_plots.draw_time_colored_path(ax, x, y, plt.cm.Blues, label='Set 1')), original)
+
+
+def test_group_figure_matches_the_original(delivery, tmp_path):
+    source_path, meta_path, _ = delivery
+    case_ids = core.read_simmeta(meta_path)['G01']
+    original_group_plot(case_ids, source_path, str(tmp_path / 'original.png'), dpi=40)
+    usage_examples.plot_group_tip_paths('G01', case_ids, source_path, str(tmp_path), dpi=40)
+    np.testing.assert_array_equal(plt.imread(str(tmp_path / 'G01_tip_path.png')), plt.imread(str(tmp_path / 'original.png')))
+
+
+def test_line_mode_draws_segments_and_short_paths_as_markers():
+    fig = Figure()
+    ax = fig.subplots()
+    assert isinstance(tip_plots.draw_time_colored_path(ax, [0, 1, 2], [0, 1, 0], plt.cm.Reds, mode='line'), LineCollection)
+    single = tip_plots.draw_time_colored_path(ax, [5.0], [5.0], plt.cm.Reds, mode='line')
+    assert isinstance(single, PathCollection) and len(single.get_offsets()) == 1
+
+
+def test_decimation_keeps_the_ends():
+    assert list(tip_plots.decimate_indexes(5)) == [0, 1, 2, 3, 4]
+    indexes = tip_plots.decimate_indexes(1000, 10)
+    assert indexes[0] == 0 and indexes[-1] == 999 and len(indexes) <= 10
+    assert np.all(np.diff(indexes) > 0)
+
+
+def test_parallel_figures_match_serial(delivery, tmp_path):
+    source_path, meta_path, _ = delivery
+    usage_examples.plot_multiple_case_tip_paths(source_path, str(tmp_path / 'serial'), workers=1, meta_path=meta_path)
+    usage_examples.plot_multiple_case_tip_paths(source_path, str(tmp_path / 'parallel'), workers=2, meta_path=meta_path)
+    names = sorted(os.listdir(tmp_path / 'serial'))
+    assert names == ['G01_tip_path.png', 'G02_tip_path.png'] == sorted(os.listdir(tmp_path / 'parallel'))
+    for name in names:
+        np.testing.assert_array_equal(plt.imread(str(tmp_path / 'serial' / name)), plt.imread(str(tmp_path / 'parallel' / name)))
@@ -0,0 +1,59 @@
+import numpy as np
+from matplotlib.collections import LineCollection
+
+
+# Diameter in points of a default scatter marker (markersize 6), used as the width of path lines
+MARKER_DIAMETER = 6.0
+
+
+def decimate_indexes(n, max_points=None):
+    """
+    Pick evenly spread sample indexes for level-of-detail drawing, always keeping the first and last sample.
+
+    Parameters:
+    n (int): The number of samples.
+    max_points (int, optional): The maximum number of samples to keep. None keeps all.
+
+    Returns:
+    np.array: The sorted indexes to draw.
+    """
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    return np.unique(np.round(np.linspace(0, n - 1, max(max_points, 2))).astype(np.int64))
+
+
+def draw_time_colored_path(ax, x, y, cmap, mode='scatter', max_points=None, label=None, positions=None):
+    """
+    Draw a path coloured from the start to the end of a colormap in a single artist.
+
+    Parameters:
+    ax (matplotlib.axes.Axes): The axes to draw in.
+    x, y (list or np.array): The path coordinates.
+    cmap (matplotlib.colors.Colormap): The colormap, sampled evenly over the full path.
+    mode (str): 'scatter' draws one marker per sample, as plot_multiple_case_tip_paths originally did, so the
+                figures look the same as before. 'line' draws the path as one LineCollection of segments as wide
+                as the markers, which renders much faster in PNG output but looks different (a continuous stroke
+                instead of separate dots). A path of fewer than two samples is always drawn as a scatter.
+    max_points (int, optional): Draw at most this many samples. Colours keep their position on the full path.
+    label (str, optional): The legend label.
+    positions (np.array, optional): The position of every sample along the full path, from 0 to 1, used for
+                                    its colour when the path was simplified beforehand. Defaults to evenly spaced.
+
+    Returns:
+    The matplotlib artist that was added.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    colors = cmap(np.linspace(0, 1, len(x)) if positions is None else np.asarray(positions, dtype=np.float64))
+    keep = decimate_indexes(len(x), max_points)
+    x, y, colors = x[keep], y[keep], colors[keep]
+
+    if mode == 'line' and len(x) >= 2:
+        points = np.column_stack([x, y])
+        segments = np.stack([points[:-1], points[1:]], axis=1)
+        collection = LineCollection(segments, colors=colors[:-1], linewidths=MARKER_DIAMETER, capstyle='round', label=label)
+        ax.add_collection(collection)
+        return collection
+    if mode in ('line', 'scatter'):
+        return ax.scatter(x, y, color=colors, label=label)
+    raise ValueError("mode should be 'scatter' or 'line'")
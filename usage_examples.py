@@ -1,117 +1,191 @@
-import plot_scripts as ps
 import os
+import warnings
 import matplotlib.pyplot as plt
-import numpy as np
-from scipy.stats import gaussian_kde
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+import case_index
+import dataset
+import density
+import simplify
+import tip_plots
 
 
-def plot_multiple_case_tip_paths(source_path, save_dir):
+def select_cohort(source_path, db_path=None, meta_path='SIMMETA.txt', filters=None):
+    """
+    Selects the cases to plot from the SQLite case index, after bringing the index up to date with SIMMETA.txt.
+
+    Cases listed in SIMMETA.txt that cannot be read are left out with a warning naming them.
+
+    Parameters:
+    - source_path (str): The base directory containing the data files.
+    - db_path (str, optional): The case index file, next to meta_path by default. It is created on the first call,
+                               later calls only re-index changed cases.
+    - meta_path (str): The path of SIMMETA.txt.
+    - filters (dict, optional): Selection passed to case_index.query_cases, such as {'group': 'G01', 'has_event': 'Polyp'}.
+
+    Returns:
+    - dict: The selected case IDs per group key, with groups and cases in SIMMETA.txt order as in core.read_simmeta.
+    """
+    if db_path is None:
+        db_path = case_index.get_default_db_path(meta_path)
+    case_index.build_case_index(db_path, source_path, meta_path, verbose=False)
+
+    failures = case_index.get_failures(db_path)
+    if failures:
+        warnings.warn(
+            f"{len(failures)} cases of {meta_path} could not be read and are left out: "
+            + ', '.join(f"{failure['case_id']} ({failure['error']})" for failure in failures)
+        )
+
+    results = {}
+    for row in case_index.query_cases(db_path, **(filters or {})):
+        results.setdefault(row['group_key'], []).append(row['case_id'])
+    return results
+
+
+def plot_group_tip_paths(key_check, case_ids, source_path, save_dir, cache_dir=None, mode='scatter', max_points=None, tolerance=None, dpi=300, prefetch=2):
+    """
+    Plots the tip paths of the cases of one group in a single figure and saves it as <key_check>_tip_path.png.
+
+    Uses a standalone Figure instead of pyplot state, so groups can be drawn in parallel worker processes.
+
+    Parameters:
+    - key_check (str): The group key, used in the file name.
+    - case_ids (list): The case IDs of the group.
+    - source_path (str): The base directory containing the data files.
+    - save_dir (str): The directory where the plot will be saved.
+    - cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    - mode (str): How each path is drawn, see tip_plots.draw_time_colored_path.
+    - max_points (int, optional): Level of detail: draw at most this many samples per case.
+    - tolerance (float, optional): Draw the tip path simplified with RDP, within this many mm of the full path.
+    - dpi (int): Resolution of the saved PNG.
+    - prefetch (int): Number of cases read ahead in background threads while a case is drawn, see dataset.prefetch_cases.
+
+    Outputs:
+    - A PNG file saved in the specified directory.
+    """
+    colormaps = [plt.cm.Reds, plt.cm.Greens, plt.cm.Blues, plt.cm.Greys, plt.cm.magma]
+
+    fig = Figure(figsize=(15, 10))
+    ax = fig.subplots()
+    colorbar_height = 0.07  # Height of each colorbar
+    colorbar_width = 0.08  # Width of each colorbar
+    spacing = 0.1  # Space between colorbars
+
+    # Adjust main axis to fit colorbars
+    ax_position = ax.get_position()
+    ax.set_position([
+        ax_position.x0,
+        ax_position.y0,
+        ax_position.width,
+        ax_position.height
+    ])
+
+    cases = (dataset.Case(i, os.path.join(source_path, i), cache_dir=cache_dir) for i in case_ids)
+    for index, case in enumerate(dataset.prefetch_cases(cases, depth=prefetch)):
+        path = case.path
+        Y_list, Z_list = case.Y, case.Z
+        cecum_index, closest_start_index = case.landmarks['cecum'], case.landmarks['start']
+        negated_Y_value = [-z[0] for z in Y_list[closest_start_index:cecum_index]]
+        negated_z_value = [-z[0] for z in Z_list[closest_start_index:cecum_index]]
+        positions = None
+        if tolerance is not None:
+            simplified = simplify.get_simplified_lists_from_path(path, tolerance, coil=0, start=closest_start_index, stop=cecum_index, cache_dir=cache_dir)
+            negated_Y_value = -simplified['Y'][:, 0]
+            negated_z_value = -simplified['Z'][:, 0]
+            positions = (simplified['frames'] - closest_start_index) / max(cecum_index - closest_start_index - 1, 1)
+
+        # Colour each path from start to end of its colormap, drawn as a single artist
+        cmap = colormaps[index % len(colormaps)]
+        tip_plots.draw_time_colored_path(ax, negated_z_value, negated_Y_value, cmap, mode=mode, max_points=max_points, label=f'Set {index+1}', positions=positions)
+
+        # Create a separate axis for each colorbar
+        colorbar_ax = fig.add_axes([
+            ax_position.x1 + 0.01,
+            ax_position.y0 + 0.7 - index * (colorbar_height + spacing),  # Position each colorbar
+            colorbar_width,
+            colorbar_height
+        ])
+        cbar = fig.colorbar(plt.cm.ScalarMappable(cmap=cmap), cax=colorbar_ax, orientation='horizontal')
+        cbar.set_label(f'Set {index+1}')
+
+    # Configure plot aesthetics
+    ax.set_xlabel('Z')
+    ax.set_ylabel('Y')
+    ax.set_xlim([-500, 0])  # Adjust these limits if necessary
+    ax.set_ylim([-250, 300])
+    ax.set_title('Scope Tip Intubation Path')
+    fig.savefig(os.path.join(save_dir, key_check + '_tip_path.png'), format='png', dpi=dpi)
+
+
+def plot_multiple_case_tip_paths(source_path, save_dir, cache_dir=None, workers=None, mode='scatter', max_points=None, tolerance=None, prefetch=2,
+                                 meta_path='SIMMETA.txt', db_path=None, filters=None):
     """
     Plots the tip paths for multiple cases, each with annotated events, and saves the plots in the specified directory.
 
     Parameters:
     - source_path (str): The base directory containing the data files.
     - save_dir (str): The directory where the generated plots will be saved.
+    - cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    - workers (int, optional): Number of processes drawing groups in parallel, one group per process.
+                               None uses one process per group, up to the number of cores. 1 draws every group in this process.
+    - mode (str): How each path is drawn, see tip_plots.draw_time_colored_path.
+    - max_points (int, optional): Level of detail: draw at most this many samples per case.
+    - tolerance (float, optional): Draw the tip paths simplified with RDP, within this many mm of the full paths.
+    - prefetch (int): Number of cases read ahead in background threads while a case is drawn, see dataset.prefetch_cases.
+    - meta_path (str): The path of SIMMETA.txt.
+    - db_path (str, optional): The SQLite case index the cases are selected from, next to meta_path by default, see select_cohort.
+    - filters (dict, optional): Plot only the cases matching these case_index.query_cases filters.
 
     Outputs:
     - Multiple PNG files saved in the specified directory, each representing the tip path for a case with annotated events.
     """
-    results = {}
-
-    # File path to your text file
-    file_path = 'SIMMETA.txt'
-
-    # Read the file and process each line
-    with open(file_path, 'r') as file:
-        for line in file:
-            key = line.strip().split(';')[0].split('//')[-1][-3:]
-            value = ps.process_line(line)
-            if key and value:
-                if key not in results:
-                    results[key] = []  # create a new list if key doesn't exist
-                results[key].append(value)  # append the new value to the list under the key
+    # Case IDs per group key, from the case index
+    results = select_cohort(source_path, db_path, meta_path, filters)
     print(results)
 
     if not os.path.exists(save_dir):
         os.makedirs(save_dir, exist_ok=True)
 
-    for key_check in results.keys():
-        colormaps = [plt.cm.Reds, plt.cm.Greens, plt.cm.Blues, plt.cm.Greys, plt.cm.magma]
-
-        fig, ax = plt.subplots(figsize=(15, 10))
-        num_datasets = len(results[key_check])
-        colorbar_height = 0.07  # Height of each colorbar
-        colorbar_width = 0.08  # Width of each colorbar
-        spacing = 0.1  # Space between colorbars
-
-        # Adjust main axis to fit colorbars
-        ax_position = ax.get_position()
-        ax.set_position([
-            ax_position.x0,
-            ax_position.y0,
-            ax_position.width,
-            ax_position.height
-        ])
-
-        for index, i in enumerate(results[key_check]):
-            path = os.path.join(source_path, i)
-            X_list, Y_list, Z_list, T_list = ps.get_all_lists_from_path(path)
-            cecum_index, _, _, closest_end_index, closest_start_index = ps.get_landmark_indexes(path, T_list)
-            negated_X_value = [-z[0] for z in X_list[closest_start_index:cecum_index]]
-            negated_Y_value = [-z[0] for z in Y_list[closest_start_index:cecum_index]]
-            negated_z_value = [-z[0] for z in Z_list[closest_start_index:cecum_index]]
-
-            # Calculate colors for each point in the current dataset
-            cmap = colormaps[index % len(colormaps)]
-            colors = cmap(np.linspace(0, 1, len(negated_z_value)))
-
-            ax.scatter(negated_z_value, negated_Y_value, color=colors, label=f'Set {index+1}')
-
-            # Create a separate axis for each colorbar
-            colorbar_ax = fig.add_axes([
-                ax_position.x1 + 0.01,
-                ax_position.y0 + 0.7 - index * (colorbar_height + spacing),  # Position each colorbar
-                colorbar_width,
-                colorbar_height
-            ])
-            cbar = plt.colorbar(plt.cm.ScalarMappable(cmap=cmap), cax=colorbar_ax, orientation='horizontal')
-            cbar.set_label(f'Set {index+1}')
+    if workers is None:
+        workers = min(len(results), os.cpu_count() or 1)
+    if workers <= 1:
+        for key_check, case_ids in results.items():
+            plot_group_tip_paths(key_check, case_ids, source_path, save_dir, cache_dir, mode, max_points, tolerance, prefetch=prefetch)
+        return
 
-        # Configure plot aesthetics
-        ax.set_xlabel('Z')
-        ax.set_ylabel('Y')
-        ax.set_xlim([-500, 0])  # Adjust these limits if necessary
-        ax.set_ylim([-250, 300])
-        ax.set_title('Scope Tip Intubation Path')
-        plt.savefig(os.path.join(save_dir, key_check + '_tip_path.png'), format='png', dpi=300)
-        plt.close()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(plot_group_tip_paths, key_check, case_ids, source_path, save_dir, cache_dir, mode, max_points, tolerance, prefetch=prefetch)
+            for key_check, case_ids in results.items()
+        ]
+        for future in futures:
+            future.result()
 
 
-def zeroed_plot_multiple_case_tip_paths(source_path, save_dir):
+def zeroed_plot_multiple_case_tip_paths(source_path, save_dir, cache_dir=None, gridsize=400, bw_method=None, extent=None, exact=False, prefetch=2,
+                                        meta_path='SIMMETA.txt', db_path=None, filters=None):
     """
     Plots heatmaps for multiple cases with zeroed reference points and saves the plots in the specified directory.
 
     Parameters:
     - source_path (str): The base directory containing the data files.
     - save_dir (str): The directory where the generated plots will be saved.
+    - cache_dir (str, optional): Directory for the binary case cache, see core.get_all_lists_from_path.
+    - gridsize (int): Number of heatmap grid nodes per axis.
+    - bw_method (str or float, optional): KDE bandwidth, as for scipy.stats.gaussian_kde.
+    - extent (tuple, optional): Heatmap (x_min, x_max, y_min, y_max). Defaults to the range of the pooled points.
+    - exact (bool): Evaluate the exact KDE on every grid node, for validation.
+    - prefetch (int): Number of cases read ahead in background threads, see dataset.prefetch_cases.
+    - meta_path (str): The path of SIMMETA.txt.
+    - db_path (str, optional): The SQLite case index the cases are selected from, next to meta_path by default, see select_cohort.
+    - filters (dict, optional): Plot only the cases matching these case_index.query_cases filters.
 
     Outputs:
     - Multiple PNG files saved in the specified directory, each representing a heatmap for a case.
     """
-    results = {}
-
-    # File path to your text file
-    file_path = 'SIMMETA.txt'
-
-    # Read the file and process each line
-    with open(file_path, 'r') as file:
-        for line in file:
-            key = line.strip().split(';')[0].split('//')[-1][-3:]
-            value = ps.process_line(line)
-            if key and value:
-                if key not in results:
-                    results[key] = []  # create a new list if key doesn't exist
-                results[key].append(value)  # append the new value to the list under the key
+    # Case IDs per group key, from the case index
+    results = select_cohort(source_path, db_path, meta_path, filters)
 
     print(results)
 
@@ -124,10 +198,10 @@ def zeroed_plot_multiple_case_tip_paths(source_path, save_dir):
         all_adjusted_Z = []
         all_adjusted_Y = []
 
-        for index, i in enumerate(results[key_check]):
-            path = os.path.join(source_path, i)
-            X_list, Y_list, Z_list, T_list = ps.get_all_lists_from_path(path)
-            cecum_index, _, _, closest_end_index, closest_start_index = ps.get_landmark_indexes(path, T_list)
+        cases = (dataset.Case(i, os.path.join(source_path, i), key_check, cache_dir) for i in results[key_check])
+        for index, case in enumerate(dataset.prefetch_cases(cases, depth=prefetch)):
+            X_list, Y_list, Z_list, T_list = case.X, case.Y, case.Z, case.T
+            cecum_index, closest_start_index = case.landmarks['cecum'], case.landmarks['start']
             negated_X_value = [-z[0] for z in X_list[closest_start_index + 5:cecum_index]]
             negated_Y_value = [-z[0] for z in Y_list[closest_start_index + 5:cecum_index]]
             negated_z_value = [-z[0] for z in Z_list[closest_start_index + 5:cecum_index]]
@@ -137,15 +211,10 @@ def zeroed_plot_multiple_case_tip_paths(source_path, save_dir):
             all_adjusted_Z.extend(adjusted_Z)
             all_adjusted_Y.extend(adjusted_Y)
 
-        # Create heatmap using gaussian_kde for smoother density estimate
-        xy = np.vstack([all_adjusted_Z, all_adjusted_Y])
-        kde = gaussian_kde(xy, bw_method=0.1)
-
-        # Create grid for plotting
-        x_min, x_max = min(all_adjusted_Z), max(all_adjusted_Z)
-        y_min, y_max = min(all_adjusted_Y), max(all_adjusted_Y)
-        x_grid, y_grid = np.mgrid[x_min:x_max:400j, y_min:y_max:400j]
-        z_grid = np.reshape(gaussian_kde(xy).evaluate(np.vstack([x_grid.ravel(), y_grid.ravel()])), x_grid.shape)
+        # Create heatmap from a binned, FFT-convolved Gaussian KDE (exact=True evaluates gaussian_kde instead)
+        z_grid, (x_min, x_max, y_min, y_max) = density.kde_grid(
+            all_adjusted_Z, all_adjusted_Y, gridsize=gridsize, bw_method=bw_method, extent=extent, exact=exact
+        )
 
         # Plot heatmap
         cax = ax.imshow(z_grid.T, extent=[x_min, x_max, y_min, y_max], origin='lower', cmap='inferno', aspect='auto')